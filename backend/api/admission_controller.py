@@ -0,0 +1,94 @@
+""" Module for admission controller. """
+
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from backend.api.exceptions import InferenceOverloadedError
+from backend.api.metrics import get_counter, get_gauge
+
+
+class AdmissionController:
+    """Class for shedding requests whose projected wait exceeds the latency objective."""
+
+    def __init__(self, max_wait_seconds: float, ewma_alpha: float):
+        self.max_wait_seconds = max_wait_seconds
+        self.ewma_alpha = ewma_alpha
+        self.in_flight = 0
+        # moving estimate of the time the system takes per request when busy
+        self.service_seconds: float | None = None
+        self._busy_since: float = None
+        self._last_completed_at: float = None
+        self._admitted_counter = get_counter(
+            "admission_control_admitted_total", "Inference requests admitted"
+        )
+        self._shed_counter = get_counter(
+            "admission_control_shed_total",
+            "Inference requests rejected as their projected wait exceeded the objective",
+        )
+        self._in_flight_gauge = get_gauge(
+            "admission_control_in_flight",
+            "Admitted inference requests waiting or being served",
+        )
+        self._service_seconds_gauge = get_gauge(
+            "admission_control_service_seconds",
+            "Moving estimate of the service time per inference request",
+        )
+        self._projected_wait_gauge = get_gauge(
+            "admission_control_projected_wait_seconds",
+            "Wait projected for the most recent inference request",
+        )
+
+    @property
+    def projected_wait_seconds(self) -> float:
+        """Wait a new request is projected to have before it is served."""
+
+        # requests ahead drain at one per service time, with no estimate yet
+        # nothing can be projected
+        if self.service_seconds is None:
+            return 0.0
+        return self.in_flight * self.service_seconds
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """Admit request for the duration of the context, or reject it if overloaded."""
+
+        projected_wait_seconds = self.projected_wait_seconds
+        self._projected_wait_gauge.set(projected_wait_seconds)
+        if projected_wait_seconds > self.max_wait_seconds:
+            self._shed_counter.inc()
+            raise InferenceOverloadedError(
+                f"Projected wait of {projected_wait_seconds:.1f} seconds exceeds "
+                f"{self.max_wait_seconds} seconds",
+                retry_after_seconds=projected_wait_seconds - self.max_wait_seconds,
+            )
+
+        self._admitted_counter.inc()
+        if self.in_flight == 0:
+            self._busy_since = time.monotonic()
+        self.in_flight += 1
+        self._in_flight_gauge.set(self.in_flight)
+        completed = False
+        try:
+            yield
+            completed = True
+        finally:
+            self._complete(completed)
+
+    def _complete(self, completed: bool) -> None:
+        now = time.monotonic()
+        if completed:
+            # only time spent busy counts, idle gaps between requests do not
+            started_at = max(self._busy_since, self._last_completed_at or 0)
+            service_seconds = now - started_at
+            self.service_seconds = (
+                service_seconds
+                if self.service_seconds is None
+                else self.ewma_alpha * service_seconds
+                + (1 - self.ewma_alpha) * self.service_seconds
+            )
+            self._service_seconds_gauge.set(self.service_seconds)
+            self._last_completed_at = now
+
+        self.in_flight -= 1
+        self._in_flight_gauge.set(self.in_flight)
@@ -4,6 +4,7 @@ from pydantic.dataclasses import dataclass
 
 from backend.api.enum import (
     DataRepositoryType,
+    InferenceExecutorType,
     InferenceProviderType,
     MessagingProviderType,
 )
@@ -37,12 +38,97 @@ class Config:
 
     # messsaging
     messaging_provider_type: MessagingProviderType
+    messaging_max_concurrent_messages: int
+    messaging_progressive_replies_enabled: bool
+    messaging_progressive_reply_min_chars: int
+
+    # message ordering
+    message_ordering_enabled: bool
+    message_ordering_max_queue_size: int
 
     # whatsapp for business
     whatsapp_for_business_api_token: str
+    whatsapp_for_business_api_base_url: str
+    whatsapp_for_business_http2_enabled: bool
+    whatsapp_for_business_max_connections: int
+    whatsapp_for_business_keepalive_seconds: float
+    whatsapp_for_business_timeout_seconds: float
+    whatsapp_for_business_connect_timeout_seconds: float
+    whatsapp_for_business_messages_per_second: float
+    whatsapp_for_business_burst_size: int
+    whatsapp_for_business_max_attempts: int
+    whatsapp_for_business_retry_backoff_seconds: float
+    whatsapp_for_business_max_retry_queue_size: int
 
     # inference
     inference_provider_type: InferenceProviderType
+    prompt_template_id: str
+    inference_deadline_seconds: float
+    inference_executor_type: InferenceExecutorType
+    inference_executor_max_workers: int
+    inference_batch_max_size: int
+    inference_batch_max_wait_ms: int
+    inference_batch_max_queue_size: int
+    # replies to /chat follow the caller session history, skipping the response
+    # caches, streamed replies have no session and are answered on their own
+    session_kv_cache_enabled: bool
+    session_kv_cache_max_bytes: int
+    session_kv_cache_idle_seconds: int
+    inference_cpu_intra_op_threads: int
+    inference_cpu_inter_op_threads: int
+    inference_draft_model_id: str | None
+    inference_num_assistant_tokens: int
+    inference_warm_up_enabled: bool
+    inference_warm_up_max_new_tokens: int
+    inference_compile_enabled: bool
+
+    # openai compatible inference
+    openai_compatible_base_url: str
+    openai_compatible_api_key: str | None
+    openai_compatible_model_id: str
+    openai_compatible_max_tokens: int
+    openai_compatible_max_connections: int
+    openai_compatible_keepalive_seconds: float
+    openai_compatible_timeout_seconds: float
+    openai_compatible_connect_timeout_seconds: float
+    openai_compatible_max_retries: int
+    openai_compatible_retry_backoff_seconds: float
+    openai_compatible_stream_enabled: bool
+
+    # webhook queue
+    webhook_queue_enabled: bool
+    webhook_queue_workers: int
+    webhook_queue_visibility_timeout_seconds: float
+    webhook_queue_max_attempts: int
+    webhook_queue_retry_backoff_seconds: float
+    webhook_queue_poll_interval_seconds: float
+
+    # message deduplication
+    message_dedup_enabled: bool
+    message_dedup_ttl_seconds: float
+    message_dedup_max_entries: int
+    message_dedup_compaction_interval_seconds: float
+
+    # admission control
+    admission_control_enabled: bool
+    admission_control_max_wait_seconds: float
+    admission_control_ewma_alpha: float
+
+    # request coalescing
+    request_coalescing_enabled: bool
+
+    # response cache
+    response_cache_enabled: bool
+    response_cache_max_entries: int
+    response_cache_ttl_seconds: int
+    response_cache_persistent: bool
+
+    # semantic cache
+    semantic_cache_enabled: bool
+    semantic_cache_model_id: str
+    semantic_cache_similarity_threshold: float
+    semantic_cache_max_entries: int
+    semantic_cache_path: str
 
 
 CONFIG: Config = None
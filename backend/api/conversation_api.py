@@ -1,12 +1,16 @@
 """ Module for conversation api. """
 
-from typing import Annotated
+import asyncio
+import json
+import math
+from contextlib import asynccontextmanager
+from typing import Annotated, AsyncIterator
 
 import uvicorn
 from authlib.jose import JoseError, JsonWebKey, jwt
 from authlib.jose.errors import ExpiredTokenError
 from fastapi import Depends, FastAPI, HTTPException, Request, Security, status
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 
 # from fastapi.security import APIKeyHeader
@@ -14,13 +18,30 @@ from structlog import get_logger
 
 from backend.api import config, main
 from backend.api.entities import Caller, ChatInputModel
+from backend.api.exceptions import InferenceRejectedError, InferenceUnavailableError
+from backend.api.metrics import get_metrics_snapshot
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Lifespan of conversation api."""
+
+    if not config.CONFIG:
+        # imported by a uvicorn reload worker, or another server, without init
+        # having run, which is off the event loop as it runs the db migrations
+        await asyncio.to_thread(main.init)
+    await main.startup()
+    yield
+    await main.shutdown()
+
 
 app = (
     FastAPI(
         title="Personal AI Assistant API",
+        lifespan=lifespan,
     )
     if config.CONFIG
-    else FastAPI()
+    else FastAPI(lifespan=lifespan)
 )
 
 
@@ -35,6 +56,31 @@ async def get_root() -> dict[str, str]:
     return {"msg": "Welcome to the Personal AI Assistant API!"}
 
 
+@app.get("/healthz")
+async def get_healthz() -> dict[str, str]:
+    """Get liveness."""
+
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def get_readyz() -> dict[str, str]:
+    """Get readiness, which requires the model to be loaded and warmed up."""
+
+    if not main.is_ready():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Not ready"
+        )
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+async def get_metrics() -> dict[str, dict]:
+    """Get metrics."""
+
+    return get_metrics_snapshot()
+
+
 # async def get_caller(
 #     api_key_header: str = Security(APIKeyHeader(name="WEBHOOK_VERIFY_TOKEN")),
 # ) -> Caller:
@@ -109,12 +155,61 @@ async def post_chat(
     logger = get_logger()
     logger.info("Starting post chat - '/chat' from conversation api")
 
-    chat_output = await main.process_chat(chat_input, caller)
+    try:
+        chat_output = await main.process_chat(chat_input, caller)
+    except InferenceRejectedError as error:
+        logger.warning("Failed post chat - '/chat' from conversation api")
+        # no Retry-After, the request would be rejected again
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(error))
+    except InferenceUnavailableError as error:
+        logger.warning("Rejected post chat - '/chat' from conversation api")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(error),
+            headers={"Retry-After": str(math.ceil(error.retry_after_seconds))},
+        )
 
     logger.info("Completed post chat - '/chat' from conversation api")
     return chat_output
 
 
+@app.post("/chat/stream")
+async def post_chat_stream(
+    chat_input: ChatInputModel, caller: Annotated[Caller, Depends(get_caller)]
+) -> StreamingResponse:
+    """Post chat and stream the reply as server-sent events."""
+
+    logger = get_logger()
+    logger.info("Starting post chat stream - '/chat/stream' from conversation api")
+
+    # wait for the first chunk so unavailable inference is still reported as a 503
+    chunks = main.stream_chat(chat_input, caller)
+    try:
+        first_chunk = await anext(chunks, None)
+    except InferenceRejectedError as error:
+        logger.warning("Failed post chat stream - '/chat/stream' from conversation api")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(error))
+    except InferenceUnavailableError as error:
+        logger.warning(
+            "Rejected post chat stream - '/chat/stream' from conversation api"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(error),
+            headers={"Retry-After": str(math.ceil(error.retry_after_seconds))},
+        )
+
+    async def events() -> AsyncIterator[str]:
+        if first_chunk is not None:
+            yield f"data: {json.dumps(first_chunk)}\n\n"
+        async for chunk in chunks:
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "event: done\ndata: \n\n"
+        logger.info("Completed post chat stream - '/chat/stream' from conversation api")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @app.get("/webhook", response_class=PlainTextResponse)
 async def get_webhook(request: Request) -> str:
     """Get webhook."""
@@ -140,8 +235,21 @@ async def post_webhook(request: Request) -> dict[str, str]:
 
     body = await request.json()
 
+    try:
+        response = await main.receive_incoming_message(body)
+    except InferenceRejectedError as error:
+        logger.warning("Failed post webhook - '/webhook' from conversation api")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(error))
+    except InferenceUnavailableError as error:
+        logger.warning("Rejected post webhook - '/webhook' from conversation api")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(error),
+            headers={"Retry-After": str(math.ceil(error.retry_after_seconds))},
+        )
+
     logger.info("Completed post webhook - '/webhook' from conversation api")
-    return await main.process_incoming_message(body)
+    return response
 
 
 def init() -> None:
@@ -2,6 +2,7 @@
 
 import json
 import re
+from datetime import datetime
 
 from bson import json_util
 from pymongo import MongoClient
@@ -9,6 +10,10 @@ from structlog import get_logger
 
 from backend.api import config
 from backend.api.data_repository import Caller, DataRepository
+from backend.api.entities import ResponseCacheEntry, WebhookJob
+from backend.api.enum import WebhookJobStatus
+
+NOT_SUPPORTED = "Not supported by the mongo db data repository"
 
 
 class MongoDB(DataRepository):
@@ -35,6 +40,62 @@ class MongoDB(DataRepository):
         logger.info("Completed load caller")
         return caller
 
+    # response caching and the webhook queue are backed by sqlite only
+    async def load_response_cache_entry(
+        self, cache_key: str
+    ) -> ResponseCacheEntry | None:
+        raise NotImplementedError(NOT_SUPPORTED)
+
+    async def save_response_cache_entry(self, entry: ResponseCacheEntry) -> None:
+        raise NotImplementedError(NOT_SUPPORTED)
+
+    async def save_webhook_job(self, webhook_job: WebhookJob) -> None:
+        raise NotImplementedError(NOT_SUPPORTED)
+
+    async def claim_webhook_job(
+        self, visibility_timeout_seconds: float, claimed_by: str, max_attempts: int
+    ) -> WebhookJob | None:
+        raise NotImplementedError(NOT_SUPPORTED)
+
+    async def fail_exhausted_webhook_jobs(
+        self, max_attempts: int, last_error: str
+    ) -> int:
+        raise NotImplementedError(NOT_SUPPORTED)
+
+    async def extend_webhook_job_claim(
+        self, webhook_job: WebhookJob, visibility_timeout_seconds: float
+    ) -> bool:
+        raise NotImplementedError(NOT_SUPPORTED)
+
+    async def delete_webhook_job(self, webhook_job: WebhookJob) -> None:
+        raise NotImplementedError(NOT_SUPPORTED)
+
+    async def release_webhook_job(
+        self,
+        webhook_job: WebhookJob,
+        status: WebhookJobStatus,
+        visible_at: datetime,
+        last_error: str,
+    ) -> None:
+        raise NotImplementedError(NOT_SUPPORTED)
+
+    async def release_claimed_webhook_jobs(self, claimed_by: str) -> int:
+        raise NotImplementedError(NOT_SUPPORTED)
+
+    async def insert_processed_message(
+        self,
+        message_id: str,
+        expires_at: datetime,
+        webhook_job: WebhookJob | None = None,
+    ) -> bool:
+        raise NotImplementedError(NOT_SUPPORTED)
+
+    async def delete_processed_message(self, message_id: str) -> None:
+        raise NotImplementedError(NOT_SUPPORTED)
+
+    async def delete_expired_processed_messages(self) -> int:
+        raise NotImplementedError(NOT_SUPPORTED)
+
     def _clean_document(self, document):
         document = json_util.dumps(document)
         document = self._replace_oid(document)
@@ -1,7 +1,17 @@
 """ Module for sqlite. """
 
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, or_, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.future import select
+
 from backend.api import config
 from backend.api.data_repository import DataRepository
+from backend.api.entities import ProcessedMessage, ResponseCacheEntry, WebhookJob
+from backend.api.enum import WebhookJobStatus
+from backend.api.lib import now_utc
 
 
 class SQLite(DataRepository):
@@ -13,3 +23,245 @@ class SQLite(DataRepository):
             config.CONFIG.debug_mode,
             config.CONFIG.run_db_migrations,
         )
+
+    async def load_response_cache_entry(
+        self, cache_key: str
+    ) -> ResponseCacheEntry | None:
+        """Load unexpired response cache entry from data repository."""
+
+        async_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with async_session() as session:
+            result = await session.execute(
+                select(ResponseCacheEntry).filter(
+                    ResponseCacheEntry.cache_key == cache_key,
+                    ResponseCacheEntry.expires_at > now_utc(),
+                )
+            )
+            return result.scalar_one_or_none()
+
+    async def save_response_cache_entry(self, entry: ResponseCacheEntry) -> None:
+        """Save response cache entry to data repository."""
+
+        async_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with async_session() as session:
+            await session.merge(entry)
+            await session.commit()
+
+    async def save_webhook_job(self, webhook_job: WebhookJob) -> None:
+        """Save webhook job to data repository."""
+
+        async_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with async_session() as session:
+            session.add(webhook_job)
+            await session.commit()
+
+    async def claim_webhook_job(
+        self, visibility_timeout_seconds: float, claimed_by: str, max_attempts: int
+    ) -> WebhookJob | None:
+        """Claim the oldest visible pending webhook job, hiding it until the timeout."""
+
+        now = now_utc()
+        async_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with async_session() as session:
+            result = await session.execute(
+                select(WebhookJob)
+                .filter(
+                    WebhookJob.status == WebhookJobStatus.PENDING,
+                    WebhookJob.visible_at <= now,
+                    WebhookJob.attempts < max_attempts,
+                    self._is_unclaimed(now),
+                )
+                .order_by(WebhookJob.first_created)
+                .limit(1)
+            )
+            webhook_job = result.scalar_one_or_none()
+            if webhook_job is None:
+                return None
+
+            # the attempt count doubles as a version, so only one worker wins a job
+            claimed_until = now + timedelta(seconds=visibility_timeout_seconds)
+            claimed = await session.execute(
+                update(WebhookJob)
+                .where(
+                    WebhookJob.webhook_job_id == webhook_job.webhook_job_id,
+                    WebhookJob.attempts == webhook_job.attempts,
+                )
+                .values(
+                    claimed_until=claimed_until,
+                    claimed_by=claimed_by,
+                    attempts=webhook_job.attempts + 1,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            if claimed.rowcount == 0:
+                return None
+            webhook_job.claimed_until = claimed_until
+            webhook_job.claimed_by = claimed_by
+            webhook_job.attempts += 1
+            return webhook_job
+
+    async def extend_webhook_job_claim(
+        self, webhook_job: WebhookJob, visibility_timeout_seconds: float
+    ) -> bool:
+        """Extend claim on webhook job, false if the claim was lost."""
+
+        async_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with async_session() as session:
+            result = await session.execute(
+                update(WebhookJob)
+                .where(*self._is_claim_of(webhook_job))
+                .values(
+                    claimed_until=now_utc()
+                    + timedelta(seconds=visibility_timeout_seconds)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            return result.rowcount > 0
+
+    async def delete_webhook_job(self, webhook_job: WebhookJob) -> None:
+        """Delete completed webhook job from data repository, if still claimed."""
+
+        async_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with async_session() as session:
+            await session.execute(
+                delete(WebhookJob).where(*self._is_claim_of(webhook_job))
+            )
+            await session.commit()
+
+    async def release_webhook_job(
+        self,
+        webhook_job: WebhookJob,
+        status: WebhookJobStatus,
+        visible_at: datetime,
+        last_error: str,
+    ) -> None:
+        """Release claimed webhook job, to be retried once visible or kept as failed."""
+
+        async_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with async_session() as session:
+            await session.execute(
+                update(WebhookJob)
+                .where(*self._is_claim_of(webhook_job))
+                .values(
+                    status=status,
+                    visible_at=visible_at,
+                    claimed_until=None,
+                    claimed_by=None,
+                    last_error=last_error,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+    async def release_claimed_webhook_jobs(self, claimed_by: str) -> int:
+        """Release webhook jobs claimed by the queue instance, when it stops."""
+
+        async_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with async_session() as session:
+            result = await session.execute(
+                update(WebhookJob)
+                .where(
+                    WebhookJob.status == WebhookJobStatus.PENDING,
+                    WebhookJob.claimed_by == claimed_by,
+                )
+                .values(claimed_until=None, claimed_by=None)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            return result.rowcount
+
+    async def fail_exhausted_webhook_jobs(
+        self, max_attempts: int, last_error: str
+    ) -> int:
+        """Fail unclaimed pending webhook jobs that used up their attempts."""
+
+        # a job whose last attempt crashed the worker, or outlived its claim,
+        # is never released as failed by the worker
+        now = now_utc()
+        async_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with async_session() as session:
+            result = await session.execute(
+                update(WebhookJob)
+                .where(
+                    WebhookJob.status == WebhookJobStatus.PENDING,
+                    WebhookJob.attempts >= max_attempts,
+                    self._is_unclaimed(now),
+                )
+                .values(
+                    status=WebhookJobStatus.FAILED,
+                    claimed_until=None,
+                    claimed_by=None,
+                    last_error=last_error,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            return result.rowcount
+
+    def _is_unclaimed(self, now: datetime):
+        # a claim that expired counts as none
+        return or_(WebhookJob.claimed_until.is_(None), WebhookJob.claimed_until <= now)
+
+    def _is_claim_of(self, webhook_job: WebhookJob) -> tuple:
+        # a claim that expired may have been taken over, bumping the attempts
+        return (
+            WebhookJob.webhook_job_id == webhook_job.webhook_job_id,
+            WebhookJob.claimed_by == webhook_job.claimed_by,
+            WebhookJob.attempts == webhook_job.attempts,
+        )
+
+    async def insert_processed_message(
+        self,
+        message_id: str,
+        expires_at: datetime,
+        webhook_job: WebhookJob | None = None,
+    ) -> bool:
+        """Insert processed message unless an unexpired one exists, true if inserted.
+
+        A webhook job given is saved in the same transaction, when inserted.
+        """
+
+        now = now_utc()
+        statement = insert(ProcessedMessage).values(
+            message_id=message_id, expires_at=expires_at, first_created=now
+        )
+        # one statement, so concurrent workers can not both insert the same message
+        statement = statement.on_conflict_do_update(
+            index_elements=[ProcessedMessage.message_id],
+            set_={"expires_at": expires_at, "first_created": now},
+            where=ProcessedMessage.expires_at <= now,
+        )
+        async_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with async_session() as session:
+            result = await session.execute(statement)
+            inserted = result.rowcount > 0
+            # so the claim on a message is never kept without the job processing it
+            if inserted and webhook_job:
+                session.add(webhook_job)
+            await session.commit()
+            return inserted
+
+    async def delete_processed_message(self, message_id: str) -> None:
+        """Delete processed message from data repository."""
+
+        async_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with async_session() as session:
+            await session.execute(
+                delete(ProcessedMessage).where(
+                    ProcessedMessage.message_id == message_id
+                )
+            )
+            await session.commit()
+
+    async def delete_expired_processed_messages(self) -> int:
+        """Delete expired processed messages from data repository."""
+
+        async_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with async_session() as session:
+            result = await session.execute(
+                delete(ProcessedMessage).where(ProcessedMessage.expires_at <= now_utc())
+            )
+            await session.commit()
+            return result.rowcount
@@ -1,7 +1,8 @@
 """ Module for data repository. """
 
 import asyncio
-from abc import ABC
+from abc import ABC, abstractmethod
+from datetime import datetime
 
 from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
@@ -10,7 +11,13 @@ from sqlalchemy.orm import exc, joinedload
 from structlog import get_logger
 
 from backend.api import config
-from backend.api.entities import Caller, CallerModel
+from backend.api.entities import (
+    Caller,
+    CallerModel,
+    ResponseCacheEntry,
+    WebhookJob,
+)
+from backend.api.enum import WebhookJobStatus
 from backend.api.sql_migrations import run
 
 
@@ -54,3 +61,79 @@ class DataRepository(ABC):
 
         logger.info("Completed load caller")
         return caller
+
+    @abstractmethod
+    async def load_response_cache_entry(
+        self, cache_key: str
+    ) -> ResponseCacheEntry | None:
+        """Load unexpired response cache entry from data repository."""
+
+    @abstractmethod
+    async def save_response_cache_entry(self, entry: ResponseCacheEntry) -> None:
+        """Save response cache entry to data repository."""
+
+    @abstractmethod
+    async def save_webhook_job(self, webhook_job: WebhookJob) -> None:
+        """Save webhook job to data repository."""
+
+    @abstractmethod
+    async def claim_webhook_job(
+        self, visibility_timeout_seconds: float, claimed_by: str, max_attempts: int
+    ) -> WebhookJob | None:
+        """Claim the oldest visible pending webhook job, hiding it until the timeout."""
+
+    @abstractmethod
+    async def fail_exhausted_webhook_jobs(
+        self, max_attempts: int, last_error: str
+    ) -> int:
+        """Fail unclaimed pending webhook jobs that used up their attempts."""
+
+    @abstractmethod
+    async def extend_webhook_job_claim(
+        self, webhook_job: WebhookJob, visibility_timeout_seconds: float
+    ) -> bool:
+        """Extend claim on webhook job, false if the claim was lost."""
+
+    @abstractmethod
+    async def delete_webhook_job(self, webhook_job: WebhookJob) -> None:
+        """Delete completed webhook job from data repository, if still claimed."""
+
+    @abstractmethod
+    async def release_webhook_job(
+        self,
+        webhook_job: WebhookJob,
+        status: WebhookJobStatus,
+        visible_at: datetime,
+        last_error: str,
+    ) -> None:
+        """Release claimed webhook job, to be retried once visible or kept as failed."""
+
+    @abstractmethod
+    async def release_claimed_webhook_jobs(self, claimed_by: str) -> int:
+        """Release webhook jobs claimed by the queue instance, when it stops."""
+
+    @abstractmethod
+    async def insert_processed_message(
+        self,
+        message_id: str,
+        expires_at: datetime,
+        webhook_job: WebhookJob | None = None,
+    ) -> bool:
+        """Insert processed message unless an unexpired one exists, true if inserted.
+
+        A webhook job given is saved in the same transaction, when inserted.
+        """
+
+    @abstractmethod
+    async def delete_processed_message(self, message_id: str) -> None:
+        """Delete processed message from data repository."""
+
+    @abstractmethod
+    async def delete_expired_processed_messages(self) -> int:
+        """Delete expired processed messages from data repository."""
+
+    async def close(self) -> None:
+        """Close connections to the data repository."""
+
+        if self.engine:
+            await self.engine.dispose()
@@ -5,11 +5,21 @@ from typing import Annotated, List, Optional, Self
 from uuid import UUID, uuid4
 
 from pydantic import BaseModel, ConfigDict, Field, StringConstraints, model_validator
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped, declarative_base, mapped_column, relationship
-from sqlalchemy.types import DateTime, Enum, Float, LargeBinary, Text, Unicode, Uuid
-
-from backend.api.enum import AttachmentType, InferenceProviderType
+from sqlalchemy.types import (
+    Boolean,
+    DateTime,
+    Enum,
+    Float,
+    Integer,
+    LargeBinary,
+    Text,
+    Unicode,
+    Uuid,
+)
+
+from backend.api.enum import AttachmentType, InferenceProviderType, WebhookJobStatus
 from backend.api.lib import now_utc
 
 Base = declarative_base()
@@ -30,6 +40,7 @@ class Caller(Base):
     name: Mapped[str] = mapped_column(Unicode(100))
     idp_id: Mapped[str] = mapped_column(Unicode(100), unique=True)
     email: Mapped[str] = mapped_column(Unicode(100), unique=True)
+    inference_deadline_seconds: Mapped[Optional[float]] = mapped_column(Float())
 
     # time and duration fields
     first_created: Mapped[datetime] = mapped_column(DateTime(), default=now_utc)
@@ -70,10 +81,12 @@ class Chat(Base):
         Enum(AttachmentType)
     )
     response_attachment_bytes: Mapped[Optional[bytes]] = mapped_column(LargeBinary())
+    response_truncated: Mapped[Optional[bool]] = mapped_column(Boolean())
 
     # time and duration fields
     start_time: Mapped[Optional[datetime]] = mapped_column(DateTime())
     end_time: Mapped[Optional[datetime]] = mapped_column(DateTime())
+    inference_deadline_seconds: Mapped[Optional[float]] = mapped_column(Float())
     inference_duration_seconds: Mapped[Optional[float]] = mapped_column(Float())
     total_duration_seconds: Mapped[Optional[float]] = mapped_column(Float())
     first_created: Mapped[datetime] = mapped_column(DateTime(), default=now_utc)
@@ -91,6 +104,75 @@ class Chat(Base):
         return exclude_fields
 
 
+class ResponseCacheEntry(Base):
+    """Class for response cache entry table."""
+
+    __tablename__ = "response_cache_entry"
+
+    # primary and foreign keys
+    cache_key: Mapped[str] = mapped_column(Unicode(64), primary_key=True)
+
+    # core fields
+    model_id: Mapped[str] = mapped_column(Unicode(100))
+    response_chat_text: Mapped[str] = mapped_column(Text())
+
+    # time and duration fields
+    expires_at: Mapped[datetime] = mapped_column(DateTime())
+    first_created: Mapped[datetime] = mapped_column(DateTime(), default=now_utc)
+    last_updated: Mapped[datetime] = mapped_column(
+        DateTime(), default=now_utc, onupdate=now_utc
+    )
+
+
+class WebhookJob(Base):
+    """Class for webhook job table."""
+
+    __tablename__ = "webhook_job"
+    __table_args__ = (
+        Index("ix_webhook_job_status_visible_at", "status", "visible_at"),
+    )
+
+    # primary and foreign keys
+    webhook_job_id: Mapped[UUID] = mapped_column(
+        Uuid(), default=uuid4, primary_key=True
+    )
+
+    # core fields
+    body: Mapped[str] = mapped_column(Text())
+    status: Mapped[WebhookJobStatus] = mapped_column(
+        Enum(WebhookJobStatus), default=WebhookJobStatus.PENDING
+    )
+    attempts: Mapped[int] = mapped_column(Integer(), default=0)
+    # instance of the queue holding the claim, only it may complete or release it
+    claimed_by: Mapped[Optional[str]] = mapped_column(Unicode(64))
+    last_error: Mapped[Optional[str]] = mapped_column(Text())
+
+    # time and duration fields
+    # a job can be claimed once visible, and is hidden from other workers
+    # while claimed, the claim is extended while the job runs, so a job of a
+    # crashed worker reappears soon after its claim stops being extended
+    visible_at: Mapped[datetime] = mapped_column(DateTime(), default=now_utc)
+    claimed_until: Mapped[Optional[datetime]] = mapped_column(DateTime())
+    first_created: Mapped[datetime] = mapped_column(DateTime(), default=now_utc)
+    last_updated: Mapped[datetime] = mapped_column(
+        DateTime(), default=now_utc, onupdate=now_utc
+    )
+
+
+class ProcessedMessage(Base):
+    """Class for processed message table."""
+
+    __tablename__ = "processed_message"
+    __table_args__ = (Index("ix_processed_message_expires_at", "expires_at"),)
+
+    # primary and foreign keys
+    message_id: Mapped[str] = mapped_column(Unicode(200), primary_key=True)
+
+    # time and duration fields
+    expires_at: Mapped[datetime] = mapped_column(DateTime())
+    first_created: Mapped[datetime] = mapped_column(DateTime(), default=now_utc)
+
+
 class CallerModel(BaseModel):
     """Class for caller model."""
 
@@ -126,6 +208,7 @@ class ChatInputModel(BaseModel):
     caller_chat_text: str = Field("")
     caller_attachment_type: AttachmentType | None = Field(None)
     caller_attachment_bytes: bytes | None = Field("")
+    bypass_cache: bool = Field(False)
 
     @model_validator(mode="after")
     def check_caller_content(self) -> Self:
@@ -159,10 +242,12 @@ class ChatModel(ChatInputModel):
     ]
     response_attachment_type: AttachmentType | None
     response_attachment_bytes: bytes | None
+    response_truncated: bool | None
 
     # time and duration fields
     start_time: Mapped[Optional[datetime]] = mapped_column(DateTime())
     end_time: Mapped[Optional[datetime]] = mapped_column(DateTime())
+    inference_deadline_seconds: Mapped[Optional[float]] = mapped_column(Float())
     inference_duration_seconds: Mapped[Optional[float]] = mapped_column(Float())
     total_duration_seconds: Mapped[Optional[float]] = mapped_column(Float())
     first_created: Mapped[datetime] = mapped_column(DateTime(), default=now_utc)
@@ -14,6 +14,30 @@ class InferenceProviderType(StrEnum):
     """Class for storing inference provider type enumeration."""
 
     IN_PROCESS = auto()
+    IN_PROCESS_CPU_QUANTIZED = auto()
+    OPENAI_COMPATIBLE = auto()
+
+
+class InferencePriority(StrEnum):
+    """Class for storing inference priority class enumeration, most urgent first."""
+
+    INTERACTIVE = auto()
+    MESSAGING = auto()
+    BACKGROUND = auto()
+
+
+class InferenceExecutorType(StrEnum):
+    """Class for storing inference executor type enumeration."""
+
+    THREAD = auto()
+    PROCESS = auto()
+
+
+class WebhookJobStatus(StrEnum):
+    """Class for storing webhook job status enumeration."""
+
+    PENDING = auto()
+    FAILED = auto()
 
 
 class MessagingProviderType(StrEnum):
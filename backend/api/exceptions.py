@@ -0,0 +1,44 @@
+""" Module for exceptions. """
+
+
+class OutboundMessageError(Exception):
+    """Class for outbound message rejected by the messaging provider."""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class InferenceRejectedError(Exception):
+    """Class for inference request rejected by the upstream model server."""
+
+
+class InferenceUnavailableError(Exception):
+    """Class for inference unavailable error."""
+
+    # seconds callers are asked to wait before trying again
+    retry_after_seconds: float = 1
+
+
+class InferenceQueueFullError(InferenceUnavailableError):
+    """Class for inference queue full error."""
+
+
+class InferenceNotReadyError(InferenceUnavailableError):
+    """Class for inference not ready error."""
+
+
+class InferenceUpstreamError(InferenceUnavailableError):
+    """Class for inference upstream model server error."""
+
+
+class InferenceOverloadedError(InferenceUnavailableError):
+    """Class for inference overloaded error."""
+
+    def __init__(self, message: str, retry_after_seconds: float):
+        super().__init__(message)
+        self.retry_after_seconds = retry_after_seconds
+
+
+class KeyedQueueFullError(InferenceUnavailableError):
+    """Class for keyed queue full error."""
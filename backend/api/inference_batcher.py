@@ -0,0 +1,273 @@
+""" Module for inference batcher. """
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+from structlog import get_logger
+
+from backend.api.enum import InferencePriority
+from backend.api.exceptions import InferenceQueueFullError
+from backend.api.inference_executor import InferenceExecutor
+from backend.api.inference_scheduler import FairPriorityQueue
+from backend.api.metrics import get_counter, get_gauge, get_histogram
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+BATCH_WAIT_SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+@dataclass
+class BatchItem:
+    """Class for a prompt waiting to be batched."""
+
+    prompt: any
+    generate_kwargs: dict
+    future: asyncio.Future
+    # wall-clock time to stop generating at, which differs per prompt and so
+    # is kept out of the batch key
+    deadline: float | None = None
+    # set once the caller has gone away, so generation stops early
+    stop_event: any = None
+    priority: InferencePriority = InferencePriority.INTERACTIVE
+    caller_id: str | None = None
+    # work that can not be batched runs alone, calling its own function
+    func: callable = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def batch_key(self) -> tuple:
+        """Prompts with the same batch key can share a batch."""
+
+        if self.func:
+            return (id(self),)
+        return tuple(sorted(self.generate_kwargs.items()))
+
+
+class InferenceBatcher:
+    """Class for collecting concurrent prompts into batches for inference."""
+
+    def __init__(
+        self,
+        batch_func: callable,
+        inference_executor: InferenceExecutor,
+        max_batch_size: int,
+        max_wait_ms: int,
+        max_queue_size: int,
+    ):
+        self.batch_func = batch_func
+        self.inference_executor = inference_executor
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self._pending = FairPriorityQueue()
+        self._item_added: asyncio.Event = None
+        self._worker_slots: asyncio.Semaphore = None
+        self._task: asyncio.Task = None
+        self._batch_tasks: set[asyncio.Task] = set()
+        self._queue_depth_gauge = get_gauge(
+            "inference_batcher_queue_depth",
+            "Prompts waiting for a free worker to be collected into a batch",
+        )
+        self._rejected_counter = get_counter(
+            "inference_batcher_rejected_total",
+            "Prompts rejected as the queue was full",
+        )
+        self._batch_size_histogram = get_histogram(
+            "inference_batcher_batch_size",
+            "Number of prompts per inference batch",
+            BATCH_SIZE_BUCKETS,
+        )
+        self._batch_wait_histogram = get_histogram(
+            "inference_batcher_wait_seconds",
+            "Time a prompt waited before its batch started",
+            BATCH_WAIT_SECONDS_BUCKETS,
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        """Prompts waiting to be collected into a batch."""
+
+        return len(self._pending)
+
+    async def submit(
+        self,
+        prompt: any,
+        deadline: float | None = None,
+        stop_event: any = None,
+        priority: InferencePriority = InferencePriority.INTERACTIVE,
+        caller_id: str | None = None,
+        **generate_kwargs,
+    ) -> any:
+        """Submit prompt and await its result from a batch."""
+
+        return await self._enqueue(
+            BatchItem(
+                prompt=prompt,
+                generate_kwargs=generate_kwargs,
+                future=asyncio.get_running_loop().create_future(),
+                deadline=deadline,
+                stop_event=stop_event,
+                priority=priority,
+                caller_id=caller_id,
+            )
+        )
+
+    async def submit_unbatched(
+        self,
+        func: callable,
+        *args,
+        priority: InferencePriority = InferencePriority.INTERACTIVE,
+        caller_id: str | None = None,
+        **kwargs,
+    ) -> any:
+        """Submit work that can not be batched, scheduled like prompts."""
+
+        return await self._enqueue(
+            BatchItem(
+                prompt=args,
+                generate_kwargs=kwargs,
+                future=asyncio.get_running_loop().create_future(),
+                priority=priority,
+                caller_id=caller_id,
+                func=func,
+            )
+        )
+
+    async def close(self) -> None:
+        """Stop collecting batches and fail waiting prompts."""
+
+        if self._task:
+            self._task.cancel()
+        for task in list(self._batch_tasks):
+            task.cancel()
+        for item in self._pending.drain():
+            if not item.future.done():
+                item.future.cancel()
+
+    async def _enqueue(self, item: BatchItem) -> any:
+        if self.queue_depth >= self.max_queue_size:
+            self._rejected_counter.inc()
+            get_logger().bind(queue_depth=self.queue_depth).warning(
+                "Rejected inference request as the queue is full"
+            )
+            raise InferenceQueueFullError(
+                f"Inference batch queue is full with {self.queue_depth} waiting prompts"
+            )
+        self._ensure_started()
+
+        self._pending.push(item)
+        self._queue_depth_gauge.set(self.queue_depth)
+        self._item_added.set()
+
+        return await item.future
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._item_added = asyncio.Event()
+            self._worker_slots = asyncio.Semaphore(self.inference_executor.max_workers)
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            # only collect a batch once a worker is free, so prompts keep
+            # accumulating into bigger batches while the model is busy
+            await self._worker_slots.acquire()
+            try:
+                batch = await self._collect_batch()
+            except BaseException:
+                self._worker_slots.release()
+                raise
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _collect_batch(self) -> list[BatchItem]:
+        while not self._pending:
+            self._item_added.clear()
+            await self._item_added.wait()
+
+        deadline = time.monotonic() + self.max_wait_seconds
+        while len(self._pending) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._item_added.clear()
+            # unlike wait_for, a timeout scope never swallows a cancellation
+            # that races with a prompt being added
+            try:
+                async with asyncio.timeout(remaining):
+                    await self._item_added.wait()
+            except TimeoutError:
+                break
+
+        # the most urgent prompt picks the generation parameters, prompts with
+        # other parameters stay queued for a later batch
+        self._pending.discard_done()
+        next_item = self._pending.peek()
+        batch = (
+            self._pending.pop_batch(self.max_batch_size, next_item.batch_key)
+            if next_item
+            else []
+        )
+        self._queue_depth_gauge.set(self.queue_depth)
+        return batch
+
+    async def _run_batch(self, batch: list[BatchItem]) -> None:
+        try:
+            if not batch:
+                return
+
+            started_at = time.monotonic()
+            self._batch_size_histogram.observe(len(batch))
+            for item in batch:
+                self._batch_wait_histogram.observe(started_at - item.enqueued_at)
+
+            logger = get_logger().bind(batch_size=len(batch))
+            logger.debug("Started run inference batch")
+            if batch[0].func:
+                await self._run_unbatched(batch[0])
+                return
+
+            generate_kwargs = batch[0].generate_kwargs
+            if any(item.deadline is not None for item in batch):
+                generate_kwargs = generate_kwargs | {
+                    "deadlines": [item.deadline for item in batch]
+                }
+            if any(item.stop_event is not None for item in batch):
+                generate_kwargs = generate_kwargs | {
+                    "stop_events": [item.stop_event for item in batch]
+                }
+            try:
+                results = await self.inference_executor.submit(
+                    self.batch_func,
+                    [item.prompt for item in batch],
+                    **generate_kwargs,
+                )
+            except Exception as error:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(error)
+                return
+
+            for item, result in zip(batch, results):
+                if not item.future.done():
+                    item.future.set_result(result)
+            logger.debug(
+                "Completed run inference batch",
+                duration_seconds=time.monotonic() - started_at,
+            )
+        finally:
+            self._worker_slots.release()
+
+    async def _run_unbatched(self, item: BatchItem) -> None:
+        try:
+            result = await self.inference_executor.submit(
+                item.func, *item.prompt, **item.generate_kwargs
+            )
+        except Exception as error:
+            if not item.future.done():
+                item.future.set_exception(error)
+            return
+        if not item.future.done():
+            item.future.set_result(result)
@@ -0,0 +1,83 @@
+""" Module for inference executor. """
+
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.managers import SyncManager
+
+from backend.api.enum import InferenceExecutorType
+from backend.api.metrics import get_gauge
+
+
+class InferenceExecutor:
+    """Class for running blocking inference off the event loop."""
+
+    def __init__(
+        self,
+        executor_type: InferenceExecutorType,
+        max_workers: int,
+        initializer: callable = None,
+        initargs: tuple = (),
+    ):
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self._executor: Executor = (
+            ProcessPoolExecutor(
+                max_workers=max_workers, initializer=initializer, initargs=initargs
+            )
+            if executor_type == InferenceExecutorType.PROCESS
+            else ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix="inference",
+                initializer=initializer,
+                initargs=initargs,
+            )
+        )
+        # serves events process workers can check, started by start
+        self._manager: SyncManager = None
+        # requests wait, and are bounded, in the inference batcher, which only
+        # hands over work once a worker is free
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._in_flight_gauge = get_gauge(
+            "inference_executor_in_flight",
+            "Inference requests running on a worker",
+        )
+
+    async def submit(self, func: callable, *args, **kwargs) -> any:
+        """Submit blocking function to executor and await its result."""
+
+        with self._lock:
+            self._in_flight += 1
+            self._in_flight_gauge.set(self._in_flight)
+
+        future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def start(self) -> None:
+        """Start the manager serving events to process workers, which blocks."""
+
+        if self.executor_type == InferenceExecutorType.PROCESS and not self._manager:
+            self._manager = multiprocessing.Manager()
+
+    def create_event(self) -> threading.Event:
+        """Create event that functions running on the workers can check."""
+
+        if self.executor_type == InferenceExecutorType.PROCESS:
+            return self._manager.Event()
+        return threading.Event()
+
+    def shutdown(self) -> None:
+        """Shutdown executor and cancel waiting requests."""
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._manager:
+            self._manager.shutdown()
+
+    def _on_done(self, _future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._in_flight_gauge.set(self._in_flight)
@@ -1,14 +1,74 @@
 """ Module for inference provider wrapper. """
 
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+from backend.api.enum import InferencePriority
+
+
+@dataclass
+class InferenceResult:
+    """Class for inference result."""
+
+    text: str
+    # generation was cut short by the deadline, so the text is a partial answer
+    truncated: bool = False
 
 
 class InferenceProviderWrapper(ABC):
     """Class for inference provider wrapper."""
 
+    model_id: str = None
+    prompt_template_id: str = None
+
+    @property
+    def generation_parameters(self) -> dict:
+        """Generation parameters that change the inference result."""
+
+        return {}
+
+    @property
+    def supports_sessions(self) -> bool:
+        """Check if replies depend on the history of the caller session."""
+
+        return False
+
     @abstractmethod
     async def request_for_inference(
         self,
         instant_message: str,
-    ):
+        session_key: str | None = None,
+        deadline_seconds: float | None = None,
+        priority: InferencePriority = InferencePriority.INTERACTIVE,
+        caller_id: str | None = None,
+    ) -> InferenceResult:
         """Request for inference."""
+
+    async def stream_inference(
+        self,
+        instant_message: str,
+        deadline_seconds: float | None = None,
+        priority: InferencePriority = InferencePriority.INTERACTIVE,
+        caller_id: str | None = None,
+    ) -> AsyncIterator[str]:
+        """Stream inference, as a single chunk unless overridden."""
+
+        inference_result = await self.request_for_inference(
+            instant_message,
+            deadline_seconds=deadline_seconds,
+            priority=priority,
+            caller_id=caller_id,
+        )
+        yield inference_result.text
+
+    async def start(self) -> None:
+        """Start inference provider."""
+
+    def is_ready(self) -> bool:
+        """Check if inference provider is ready to serve requests."""
+
+        return True
+
+    async def close(self) -> None:
+        """Close inference provider."""
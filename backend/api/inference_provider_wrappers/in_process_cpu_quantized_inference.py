@@ -0,0 +1,71 @@
+""" Module for in process cpu quantized inference. """
+
+import functools
+
+import torch
+import transformers
+from structlog import get_logger
+
+from backend.api import config
+from backend.api.inference_provider_wrappers.in_process_inference import (
+    MODEL_ID,
+    InProcessInference,
+)
+
+
+def configure_torch_threads(intra_op_threads: int, inter_op_threads: int) -> None:
+    """Configure torch cpu thread pools, zero keeps the torch default."""
+
+    logger = get_logger().bind(
+        intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads
+    )
+    if intra_op_threads > 0:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads > 0:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as error:
+            # torch only allows setting it before the first parallel work runs
+            logger.warning(error)
+    logger.info(
+        "Configured torch threads",
+        num_threads=torch.get_num_threads(),
+        num_interop_threads=torch.get_num_interop_threads(),
+    )
+
+
+def load_quantized_pipeline(
+    model_id: str = MODEL_ID,
+    intra_op_threads: int = 0,
+    inter_op_threads: int = 0,
+) -> transformers.Pipeline:
+    """Load float32 text generation pipeline on cpu with dynamic int8 linear layers."""
+
+    configure_torch_threads(intra_op_threads, inter_op_threads)
+    pipeline = transformers.pipeline(
+        "text-generation",
+        model=model_id,
+        model_kwargs={"torch_dtype": torch.float32},
+        device="cpu",
+    )
+    # weights of linear layers are stored as int8, activations are quantized per batch
+    torch.ao.quantization.quantize_dynamic(
+        pipeline.model.eval(), {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+    return pipeline
+
+
+class InProcessCPUQuantizedInference(InProcessInference):
+    """Class for in process inference on cpu with a dynamic int8 quantized model."""
+
+    model_id = f"{MODEL_ID}#dynamic-int8"
+
+    def get_pipeline_loader(self) -> callable:
+        """Get picklable function loading the pipeline on inference workers."""
+
+        return functools.partial(
+            load_quantized_pipeline,
+            MODEL_ID,
+            config.CONFIG.inference_cpu_intra_op_threads,
+            config.CONFIG.inference_cpu_inter_op_threads,
+        )
@@ -1,47 +1,856 @@
 """ Module for in process inference. """
 
+import asyncio
 import os
+import threading
+import time
+from typing import AsyncIterator
 
 import torch
 import transformers
 from structlog import get_logger
 
-from backend.api.inference_provider_wrapper import InferenceProviderWrapper
+from backend.api import config
+from backend.api.enum import InferenceExecutorType, InferencePriority
+from backend.api.exceptions import InferenceNotReadyError
+from backend.api.inference_batcher import InferenceBatcher
+from backend.api.inference_executor import InferenceExecutor
+from backend.api.inference_provider_wrapper import (
+    InferenceProviderWrapper,
+    InferenceResult,
+)
+from backend.api.metrics import get_counter
+from backend.api.prompt_templates import get_prompt_template
+from backend.api.session_kv_cache import SessionKVCache, SessionState
 
 # os.environ.setdefault("PYTORCH_ENABLE_MPS_FALLBACK", "1")
 
 # https://huggingface.co/meta-llama/Meta-Llama-3.1-8B-Instruct
 MODEL_ID = "meta-llama/Meta-Llama-3.1-8B-Instruct"
-
-PIPELINE = transformers.pipeline(
-    "text-generation",
-    model=MODEL_ID,
-    model_kwargs={"torch_dtype": torch.bfloat16},
-    device_map="auto",
+MAX_NEW_TOKENS = 256
+# short and long prompts, so warm up touches the shapes requests will have
+WARM_UP_PROMPT_TEXTS = (
+    "Hello",
+    "Remind me to water the plants tomorrow morning before work.",
+    "Summarise what I have planned for the weekend and suggest what to pack "
+    "for a short trip to the beach with friends.",
 )
 
+# loaded on first use, so importing this module stays cheap
+PIPELINE: transformers.Pipeline = None
+_PIPELINE_LOCK = threading.Lock()
+
+
+def load_pipeline(model_id: str = MODEL_ID) -> transformers.Pipeline:
+    """Load bfloat16 text generation pipeline."""
+
+    return transformers.pipeline(
+        "text-generation",
+        model=model_id,
+        model_kwargs={"torch_dtype": torch.bfloat16},
+        device_map="auto",
+    )
+
+
+def load_draft_model(
+    draft_model_id: str, model: transformers.PreTrainedModel
+) -> transformers.PreTrainedModel:
+    """Load draft model proposing tokens for the model to verify."""
+
+    # the draft model has to share the tokenizer, dtype and device of the model
+    return transformers.AutoModelForCausalLM.from_pretrained(
+        draft_model_id, torch_dtype=model.dtype
+    ).to(model.device)
+
+
+# set on every inference worker, as process workers do not share globals
+PIPELINE_LOADER: callable = load_pipeline
+DRAFT_MODEL_ID: str | None = None
+NUM_ASSISTANT_TOKENS = 5
+DRAFT_MODEL: transformers.PreTrainedModel = None
+COMPILE_ENABLED = False
+
+
+def configure_inference_worker(
+    pipeline_loader: callable,
+    draft_model_id: str | None = None,
+    num_assistant_tokens: int = NUM_ASSISTANT_TOKENS,
+    compile_enabled: bool = False,
+) -> None:
+    """Configure how the models of this inference worker are loaded."""
+
+    global PIPELINE_LOADER, DRAFT_MODEL_ID, NUM_ASSISTANT_TOKENS, COMPILE_ENABLED
+    PIPELINE_LOADER = pipeline_loader
+    DRAFT_MODEL_ID = draft_model_id
+    NUM_ASSISTANT_TOKENS = num_assistant_tokens
+    COMPILE_ENABLED = compile_enabled
+
+
+def _get_pipeline() -> transformers.Pipeline:
+    global PIPELINE
+    with _PIPELINE_LOCK:
+        if PIPELINE is None:
+            pipeline = PIPELINE_LOADER()
+            # llama has no padding token, so pad batches on the left with end of sequence
+            pipeline.tokenizer.pad_token_id = pipeline.model.config.eos_token_id
+            pipeline.tokenizer.padding_side = "left"
+            if COMPILE_ENABLED:
+                # compiled lazily on the first forward pass, which warm up triggers
+                pipeline.model.forward = torch.compile(
+                    pipeline.model.forward, mode="reduce-overhead"
+                )
+            PIPELINE = pipeline
+    return PIPELINE
+
+
+def _get_static_cache_generation_kwargs() -> dict:
+    # a fixed size attention cache keeps tensor shapes stable across decoding
+    # steps, so the compiled forward pass is reused, assisted generation needs
+    # a cache it can roll back instead
+    if not COMPILE_ENABLED or DRAFT_MODEL_ID:
+        return {}
+    return {"cache_implementation": "static"}
+
+
+def _get_assisted_generation_kwargs() -> dict:
+    global DRAFT_MODEL
+    if not DRAFT_MODEL_ID:
+        return {}
+    pipeline = _get_pipeline()
+    with _PIPELINE_LOCK:
+        if DRAFT_MODEL is None:
+            DRAFT_MODEL = load_draft_model(DRAFT_MODEL_ID, pipeline.model)
+    return {
+        "assistant_model": DRAFT_MODEL,
+        "num_assistant_tokens": NUM_ASSISTANT_TOKENS,
+        "num_assistant_tokens_schedule": "constant",
+    }
+
+
+# token ids and attention state of the fixed prefix of each prompt template
+_PREFIX_CACHES: dict[str, tuple[list[int], transformers.DynamicCache] | None] = {}
+_PREFIX_CACHES_LOCK = threading.Lock()
+
+
+def _get_prefix_cache(
+    template_id: str,
+) -> tuple[list[int], transformers.DynamicCache] | None:
+    with _PREFIX_CACHES_LOCK:
+        if template_id not in _PREFIX_CACHES:
+            prefix_messages = get_prompt_template(template_id).prefix_messages
+            prefix_cache = None
+            # the compiled fast path starts every generation from an empty static
+            # cache, so it does not reuse prefix attention state
+            if prefix_messages and not COMPILE_ENABLED:
+                pipeline = _get_pipeline()
+                prefix_token_ids = pipeline.tokenizer.apply_chat_template(
+                    prefix_messages, add_generation_prompt=False
+                )
+                past_key_values = transformers.DynamicCache()
+                with torch.inference_mode():
+                    pipeline.model(
+                        torch.tensor([prefix_token_ids], device=pipeline.model.device),
+                        past_key_values=past_key_values,
+                        use_cache=True,
+                    )
+                prefix_cache = (prefix_token_ids, past_key_values)
+            _PREFIX_CACHES[template_id] = prefix_cache
+    return _PREFIX_CACHES[template_id]
+
+
+def _copy_cache(
+    past_key_values: transformers.DynamicCache, batch_size: int = 1
+) -> transformers.DynamicCache:
+    # generation appends to the cache, so shared prefixes are handed out as copies
+    copied = transformers.DynamicCache()
+    for layer_idx in range(len(past_key_values)):
+        copied.update(
+            past_key_values.key_cache[layer_idx].repeat_interleave(batch_size, dim=0),
+            past_key_values.value_cache[layer_idx].repeat_interleave(batch_size, dim=0),
+            layer_idx,
+        )
+    return copied
+
+
+class DeadlineStoppingCriteria(transformers.StoppingCriteria):
+    """Class for stopping each sequence once its wall-clock deadline has passed."""
+
+    def __init__(self, deadlines: list[float | None], eos_token_ids: set[int]):
+        self.deadlines = deadlines
+        self.eos_token_ids = eos_token_ids
+        self.truncated = [False] * len(deadlines)
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs
+    ) -> torch.BoolTensor:
+        now = time.time()
+        expired = [
+            deadline is not None and now >= deadline for deadline in self.deadlines
+        ]
+        for row, is_expired in enumerate(expired):
+            # finished sequences are padded with end of sequence, so only a
+            # sequence still generating is cut short
+            if is_expired and int(input_ids[row, -1]) not in self.eos_token_ids:
+                self.truncated[row] = True
+        return torch.tensor(expired, dtype=torch.bool, device=input_ids.device)
+
+
+class StopEventStoppingCriteria(transformers.StoppingCriteria):
+    """Class for stopping each sequence once its stop event is set."""
+
+    def __init__(self, stop_events: list[threading.Event | None]):
+        self.stop_events = stop_events
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs
+    ) -> torch.BoolTensor:
+        return torch.tensor(
+            [
+                stop_event is not None and stop_event.is_set()
+                for stop_event in self.stop_events
+            ],
+            dtype=torch.bool,
+            device=input_ids.device,
+        )
+
+
+def _get_stopping_generation_kwargs(
+    deadlines: list[float | None] | None,
+    stop_events: list[threading.Event | None] | None,
+    model: transformers.PreTrainedModel,
+) -> tuple[DeadlineStoppingCriteria | None, dict]:
+    stopping_criteria = []
+    deadline_criteria = None
+    if deadlines and any(deadline is not None for deadline in deadlines):
+        eos_token_id = model.generation_config.eos_token_id
+        deadline_criteria = DeadlineStoppingCriteria(
+            deadlines,
+            set(eos_token_id if isinstance(eos_token_id, list) else [eos_token_id]),
+        )
+        stopping_criteria.append(deadline_criteria)
+    if stop_events and any(stop_event is not None for stop_event in stop_events):
+        stopping_criteria.append(StopEventStoppingCriteria(stop_events))
+    if not stopping_criteria:
+        return None, {}
+    return deadline_criteria, {
+        "stopping_criteria": transformers.StoppingCriteriaList(stopping_criteria)
+    }
+
+
+def _load_and_warm_up(
+    template_id: str, batch_sizes: list[int], max_new_tokens: int
+) -> dict:
+    started_at = time.perf_counter()
+    _get_pipeline()
+    _get_assisted_generation_kwargs()
+    _get_prefix_cache(template_id)
+    timings = {"load_seconds": time.perf_counter() - started_at}
+
+    # generate at every batch size served, so kernels, allocator pools and
+    # compiled graphs are ready before the first request, the second run at
+    # a batch size shows the steady state
+    prompt_template = get_prompt_template(template_id)
+    for batch_size in batch_sizes:
+        conversations = [
+            prompt_template.build_conversation(
+                WARM_UP_PROMPT_TEXTS[row % len(WARM_UP_PROMPT_TEXTS)]
+            )
+            for row in range(batch_size)
+        ]
+        run_seconds = []
+        for _ in range(2):
+            started_at = time.perf_counter()
+            _generate_batch(conversations, max_new_tokens, template_id)
+            run_seconds.append(time.perf_counter() - started_at)
+        timings[f"batch_size_{batch_size}_first_seconds"] = run_seconds[0]
+        timings[f"batch_size_{batch_size}_steady_seconds"] = run_seconds[1]
+    return timings
+
+
+def _generate_batch(
+    conversations: list[list[dict]],
+    max_new_tokens: int,
+    template_id: str,
+    deadlines: list[float | None] | None = None,
+    stop_events: list[threading.Event | None] | None = None,
+) -> list[InferenceResult]:
+    # runs on an inference executor worker, so it must stay a picklable
+    # module level function for process workers
+    deadlines = deadlines or [None] * len(conversations)
+    stop_events = stop_events or [None] * len(conversations)
+    if DRAFT_MODEL_ID and len(conversations) > 1:
+        # assisted generation only supports one sequence at a time
+        return [
+            result
+            for conversation, deadline, stop_event in zip(
+                conversations, deadlines, stop_events
+            )
+            for result in _generate_batch(
+                [conversation], max_new_tokens, template_id, [deadline], [stop_event]
+            )
+        ]
+
+    prefix_cache = _get_prefix_cache(template_id)
+    if prefix_cache:
+        results = _generate_batch_with_prefix(
+            conversations,
+            max_new_tokens,
+            template_id,
+            prefix_cache,
+            deadlines,
+            stop_events,
+        )
+        if results is not None:
+            return results
+
+    pipeline = _get_pipeline()
+    deadline_criteria, stopping_kwargs = _get_stopping_generation_kwargs(
+        deadlines, stop_events, pipeline.model
+    )
+    # only the generated text is returned, as on the paths generating from
+    # token ids
+    outputs = pipeline(
+        conversations,
+        max_new_tokens=max_new_tokens,
+        batch_size=len(conversations),
+        return_full_text=False,
+        continue_final_message=get_prompt_template(
+            template_id
+        ).continues_instant_message,
+        **_get_static_cache_generation_kwargs(),
+        **_get_assisted_generation_kwargs(),
+        **stopping_kwargs,
+    )
+
+    return [
+        InferenceResult(
+            text=output[0]["generated_text"],
+            truncated=bool(deadline_criteria and deadline_criteria.truncated[row]),
+        )
+        for row, output in enumerate(outputs)
+    ]
+
+
+def _generate_batch_with_prefix(
+    conversations: list[list[dict]],
+    max_new_tokens: int,
+    template_id: str,
+    prefix_cache: tuple[list[int], transformers.DynamicCache],
+    deadlines: list[float | None],
+    stop_events: list[threading.Event | None],
+) -> list[InferenceResult] | None:
+    pipeline = _get_pipeline()
+    model, tokenizer = pipeline.model, pipeline.tokenizer
+    prefix_token_ids, prefix_past_key_values = prefix_cache
+    prefix_length = len(prefix_token_ids)
+    chat_template_kwargs = get_prompt_template(template_id).chat_template_kwargs
+
+    suffixes = []
+    for conversation in conversations:
+        token_ids = tokenizer.apply_chat_template(conversation, **chat_template_kwargs)
+        if token_ids[:prefix_length] != prefix_token_ids:
+            return None
+        suffixes.append(token_ids[prefix_length:])
+
+    # pad between the shared prefix and each suffix, so every row reuses the
+    # same prefix attention state and masked padding keeps positions intact
+    suffix_length = max(len(suffix) for suffix in suffixes)
+    input_ids, attention_mask = [], []
+    for suffix in suffixes:
+        padding = suffix_length - len(suffix)
+        input_ids.append(prefix_token_ids + [tokenizer.pad_token_id] * padding + suffix)
+        attention_mask.append([1] * prefix_length + [0] * padding + [1] * len(suffix))
+
+    past_key_values = _copy_cache(prefix_past_key_values, len(conversations))
+    deadline_criteria, stopping_kwargs = _get_stopping_generation_kwargs(
+        deadlines, stop_events, model
+    )
+    outputs = model.generate(
+        torch.tensor(input_ids, device=model.device),
+        attention_mask=torch.tensor(attention_mask, device=model.device),
+        past_key_values=past_key_values,
+        max_new_tokens=max_new_tokens,
+        pad_token_id=tokenizer.pad_token_id,
+        **_get_assisted_generation_kwargs(),
+        **stopping_kwargs,
+    )
+
+    texts = tokenizer.batch_decode(
+        outputs[:, prefix_length + suffix_length :], skip_special_tokens=True
+    )
+    return [
+        InferenceResult(
+            text=text,
+            truncated=bool(deadline_criteria and deadline_criteria.truncated[row]),
+        )
+        for row, text in enumerate(texts)
+    ]
+
+
+def _generate_stream(
+    conversation: list[dict],
+    streamer: transformers.TextStreamer,
+    max_new_tokens: int,
+    template_id: str,
+    deadline: float | None = None,
+    stop_event: threading.Event | None = None,
+) -> None:
+    pipeline = _get_pipeline()
+    _, stopping_kwargs = _get_stopping_generation_kwargs(
+        [deadline], [stop_event], pipeline.model
+    )
+    pipeline(
+        conversation,
+        max_new_tokens=max_new_tokens,
+        streamer=streamer,
+        continue_final_message=get_prompt_template(
+            template_id
+        ).continues_instant_message,
+        **_get_static_cache_generation_kwargs(),
+        **_get_assisted_generation_kwargs(),
+        **stopping_kwargs,
+    )
+
+
+def _generate_with_session(
+    conversation: list[dict],
+    cached_token_ids: torch.Tensor | None,
+    past_key_values: transformers.Cache | None,
+    max_new_tokens: int,
+    template_id: str,
+    deadline: float | None = None,
+) -> tuple[InferenceResult, torch.Tensor, transformers.Cache, int, int]:
+    pipeline = _get_pipeline()
+    model, tokenizer = pipeline.model, pipeline.tokenizer
+    input_ids = tokenizer.apply_chat_template(
+        conversation,
+        return_tensors="pt",
+        **get_prompt_template(template_id).chat_template_kwargs,
+    ).to(model.device)
+
+    # the first turn of a session starts from the prompt template prefix
+    prefix_cache = _get_prefix_cache(template_id)
+    if past_key_values is None and prefix_cache:
+        prefix_token_ids, prefix_past_key_values = prefix_cache
+        cached_token_ids = torch.tensor(prefix_token_ids, device=model.device)
+        past_key_values = _copy_cache(prefix_past_key_values)
+
+    # reuse the attention state of the longest prefix shared with the previous
+    # turn, leaving at least one new token to prefill
+    reused_tokens = 0
+    if past_key_values is not None and cached_token_ids is not None:
+        length = min(cached_token_ids.shape[-1], input_ids.shape[-1] - 1)
+        matches = cached_token_ids[:length] == input_ids[0, :length]
+        reused_tokens = int(matches.int().cumprod(0).sum())
+    if reused_tokens > 0:
+        past_key_values.crop(reused_tokens)
+    else:
+        past_key_values = transformers.DynamicCache()
+
+    deadline_criteria, stopping_kwargs = _get_stopping_generation_kwargs(
+        [deadline], None, model
+    )
+    outputs = model.generate(
+        input_ids,
+        attention_mask=torch.ones_like(input_ids),
+        past_key_values=past_key_values,
+        max_new_tokens=max_new_tokens,
+        pad_token_id=tokenizer.pad_token_id,
+        return_dict_in_generate=True,
+        **_get_assisted_generation_kwargs(),
+        **stopping_kwargs,
+    )
+    sequence = outputs.sequences[0]
+    inference_result = InferenceResult(
+        text=tokenizer.decode(
+            sequence[input_ids.shape[-1] :], skip_special_tokens=True
+        ),
+        truncated=bool(deadline_criteria and deadline_criteria.truncated[0]),
+    )
+
+    # the last generated token has not been fed through the model yet
+    token_ids = sequence[: outputs.past_key_values.get_seq_length()]
+    return (
+        inference_result,
+        token_ids,
+        outputs.past_key_values,
+        reused_tokens,
+        input_ids.shape[-1],
+    )
+
+
+class AsyncTextStreamer(transformers.TextStreamer):
+    """Class for handing decoded text from a generation thread to the event loop."""
+
+    def __init__(
+        self,
+        tokenizer: transformers.PreTrainedTokenizerBase,
+        loop: asyncio.AbstractEventLoop,
+        text_queue: asyncio.Queue,
+    ):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.loop = loop
+        self.text_queue = text_queue
+
+    def on_finalized_text(self, text: str, stream_end: bool = False) -> None:
+        if text:
+            self.loop.call_soon_threadsafe(self.text_queue.put_nowait, text)
+        if stream_end:
+            self.loop.call_soon_threadsafe(self.text_queue.put_nowait, None)
+
 
 class InProcessInference(InferenceProviderWrapper):
     """Class for in process inference."""
 
+    model_id = MODEL_ID
+
+    def __init__(self):
+        self.prompt_template = get_prompt_template(config.CONFIG.prompt_template_id)
+        self.inference_executor = InferenceExecutor(
+            config.CONFIG.inference_executor_type,
+            config.CONFIG.inference_executor_max_workers,
+            initializer=configure_inference_worker,
+            initargs=(
+                self.get_pipeline_loader(),
+                config.CONFIG.inference_draft_model_id,
+                config.CONFIG.inference_num_assistant_tokens,
+                config.CONFIG.inference_compile_enabled,
+            ),
+        )
+        self.inference_batcher = InferenceBatcher(
+            _generate_batch,
+            self.inference_executor,
+            # assisted generation only supports one sequence at a time
+            (
+                1
+                if config.CONFIG.inference_draft_model_id
+                else config.CONFIG.inference_batch_max_size
+            ),
+            config.CONFIG.inference_batch_max_wait_ms,
+            config.CONFIG.inference_batch_max_queue_size,
+        )
+        # a session history needs caller turns the replies answer, not turns
+        # the model continues
+        self.session_kv_cache = (
+            SessionKVCache(
+                config.CONFIG.session_kv_cache_max_bytes,
+                config.CONFIG.session_kv_cache_idle_seconds,
+            )
+            if config.CONFIG.session_kv_cache_enabled
+            and not self.prompt_template.continues_instant_message
+            else None
+        )
+        self.ready = False
+        self._load_task: asyncio.Task = None
+        self._truncated_counter = get_counter(
+            "inference_deadline_truncations_total",
+            "Replies cut short by the inference deadline",
+        )
+
+    def get_pipeline_loader(self) -> callable:
+        """Get picklable function loading the pipeline on inference workers."""
+
+        return load_pipeline
+
+    @property
+    def generation_parameters(self) -> dict:
+        """Generation parameters that change the inference result."""
+
+        return {
+            "max_new_tokens": MAX_NEW_TOKENS,
+            "prompt_template_id": self.prompt_template_id,
+        }
+
+    @property
+    def prompt_template_id(self) -> str:
+        """Id of the prompt template used to build conversations."""
+
+        return self.prompt_template.template_id
+
+    @property
+    def supports_sessions(self) -> bool:
+        """Check if replies depend on the history of the caller session."""
+
+        return self.session_kv_cache is not None
+
+    async def start(self) -> None:
+        """Start loading the model in the background."""
+
+        self._load_task = asyncio.create_task(self._load_model())
+
+    def is_ready(self) -> bool:
+        """Check if the model is loaded and warmed up."""
+
+        return self.ready
+
+    def _get_warm_up_batch_sizes(self) -> list[int]:
+        if not config.CONFIG.inference_warm_up_enabled:
+            return []
+        # powers of two up to the largest batch, as batches rarely fill up
+        max_batch_size = self.inference_batcher.max_batch_size
+        return sorted(
+            {
+                min(2**power, max_batch_size)
+                for power in range(max_batch_size.bit_length())
+            }
+            | {max_batch_size}
+        )
+
+    async def _load_model(self) -> None:
+        logger = get_logger().bind(
+            model_id=MODEL_ID, compile_enabled=config.CONFIG.inference_compile_enabled
+        )
+        logger.info("Started load model")
+
+        started_at = time.monotonic()
+        batch_sizes = self._get_warm_up_batch_sizes()
+        try:
+            # started off the event loop, as starting the manager process blocks
+            await asyncio.to_thread(self.inference_executor.start)
+            # warm up every worker, as process workers load their own model
+            worker_timings = await asyncio.gather(
+                *[
+                    self.inference_executor.submit(
+                        _load_and_warm_up,
+                        self.prompt_template_id,
+                        batch_sizes,
+                        config.CONFIG.inference_warm_up_max_new_tokens,
+                    )
+                    for _ in range(self.inference_executor.max_workers)
+                ]
+            )
+        except Exception as error:
+            logger.error(
+                error,
+                stack_info=config.CONFIG.debug_mode,
+                exc_info=config.CONFIG.debug_mode,
+            )
+            return
+        self.ready = True
+
+        for worker, timings in enumerate(worker_timings):
+            # the first run at a batch size pays for compilation, the second does not
+            warm_up_seconds = sum(
+                seconds for name, seconds in timings.items() if name != "load_seconds"
+            )
+            compile_seconds = sum(
+                timings[f"batch_size_{batch_size}_first_seconds"]
+                - timings[f"batch_size_{batch_size}_steady_seconds"]
+                for batch_size in batch_sizes
+            )
+            logger.info(
+                "Completed warm up",
+                worker=worker,
+                batch_sizes=batch_sizes,
+                warm_up_seconds=warm_up_seconds,
+                compile_seconds=compile_seconds,
+                **timings,
+            )
+        logger.info(
+            "Completed load model", duration_seconds=time.monotonic() - started_at
+        )
+
     async def request_for_inference(
         self,
         instant_message: str,
-    ) -> str:
+        session_key: str | None = None,
+        deadline_seconds: float | None = None,
+        priority: InferencePriority = InferencePriority.INTERACTIVE,
+        caller_id: str | None = None,
+    ) -> InferenceResult:
         """Request for inference."""
 
-        logger = get_logger().bind(instant_message=instant_message)
+        logger = get_logger().bind(
+            instant_message=instant_message,
+            session_key=session_key,
+            deadline_seconds=deadline_seconds,
+            priority=priority,
+            caller_id=caller_id,
+        )
         logger.info("Started request for inference")
+        self._check_ready()
 
-        prompt = {
-            "role": "assistant",
-            # "content": f"You are a compassionate person who is trying very hard to help! {instant_message}",
-            "content": instant_message,
-        }
+        # the budget starts now, so time spent queued counts against it
+        deadline = time.time() + deadline_seconds if deadline_seconds else None
+        schedule_kwargs = {"priority": priority, "caller_id": caller_id}
+        if session_key and self.session_kv_cache:
+            # a turn builds on the history of the one before, so turns of a
+            # session wait for each other
+            async with self.session_kv_cache.turn(session_key):
+                result = await self._request_for_session_inference(
+                    instant_message, session_key, deadline, schedule_kwargs
+                )
+        else:
+            result = await self.inference_batcher.submit(
+                self.prompt_template.build_conversation(instant_message),
+                deadline=deadline,
+                **schedule_kwargs,
+                max_new_tokens=MAX_NEW_TOKENS,
+                template_id=self.prompt_template_id,
+            )
+        if result.truncated:
+            self._truncated_counter.inc()
+
+        logger.info(
+            "Completed request for inference",
+            queue_depth=self.inference_batcher.queue_depth,
+            truncated=result.truncated,
+        )
+        return result
+
+    async def _request_for_session_inference(
+        self,
+        instant_message: str,
+        session_key: str,
+        deadline: float | None,
+        schedule_kwargs: dict,
+    ) -> InferenceResult:
+        session_state = self.session_kv_cache.checkout(session_key)
+        conversation = self.prompt_template.build_conversation(
+            instant_message, session_state.messages
+        )
+        try:
+            if self.inference_executor.executor_type == InferenceExecutorType.PROCESS:
+                # attention state can not be shared with process workers, so only
+                # the history is kept
+                result = await self.inference_batcher.submit(
+                    conversation,
+                    deadline=deadline,
+                    **schedule_kwargs,
+                    max_new_tokens=MAX_NEW_TOKENS,
+                    template_id=self.prompt_template_id,
+                )
+                token_ids, past_key_values = None, None
+            else:
+                (
+                    result,
+                    token_ids,
+                    past_key_values,
+                    reused_tokens,
+                    prompt_tokens,
+                ) = await self.inference_batcher.submit_unbatched(
+                    _generate_with_session,
+                    conversation,
+                    session_state.token_ids,
+                    session_state.past_key_values,
+                    MAX_NEW_TOKENS,
+                    self.prompt_template_id,
+                    deadline,
+                    **schedule_kwargs,
+                )
+                self.session_kv_cache.record_prefill(reused_tokens, prompt_tokens)
+        except BaseException:
+            # the attention state may be half updated, so only keep the history
+            self.session_kv_cache.checkin(
+                session_key, SessionState(messages=session_state.messages)
+            )
+            raise
+
+        self.session_kv_cache.checkin(
+            session_key,
+            SessionState(
+                messages=session_state.messages
+                + [
+                    {"role": "user", "content": instant_message},
+                    {"role": "assistant", "content": result.text},
+                ],
+                token_ids=token_ids,
+                past_key_values=past_key_values,
+            ),
+        )
+        return result
+
+    async def stream_inference(
+        self,
+        instant_message: str,
+        deadline_seconds: float | None = None,
+        priority: InferencePriority = InferencePriority.INTERACTIVE,
+        caller_id: str | None = None,
+    ) -> AsyncIterator[str]:
+        """Stream inference."""
 
-        outputs = PIPELINE(
-            [prompt],
-            max_new_tokens=256,
+        logger = get_logger().bind(
+            instant_message=instant_message,
+            deadline_seconds=deadline_seconds,
+            priority=priority,
+            caller_id=caller_id,
         )
+        logger.info("Started stream inference")
+        self._check_ready()
+
+        conversation = self.prompt_template.build_conversation(instant_message)
+        deadline = time.time() + deadline_seconds if deadline_seconds else None
+        stop_event = self.inference_executor.create_event()
+        generation = None
+        try:
+            # streamers can not be handed over to process workers
+            if self.inference_executor.executor_type == InferenceExecutorType.PROCESS:
+                inference_result = await self.inference_batcher.submit(
+                    conversation,
+                    deadline=deadline,
+                    stop_event=stop_event,
+                    priority=priority,
+                    caller_id=caller_id,
+                    max_new_tokens=MAX_NEW_TOKENS,
+                    template_id=self.prompt_template_id,
+                )
+                if inference_result.truncated:
+                    self._truncated_counter.inc()
+                yield inference_result.text
+                logger.info("Completed stream inference as a single chunk")
+                return
+
+            text_queue: asyncio.Queue[str | None] = asyncio.Queue()
+            streamer = AsyncTextStreamer(
+                _get_pipeline().tokenizer, asyncio.get_running_loop(), text_queue
+            )
+            generation = asyncio.ensure_future(
+                self.inference_batcher.submit_unbatched(
+                    _generate_stream,
+                    conversation,
+                    streamer,
+                    max_new_tokens=MAX_NEW_TOKENS,
+                    template_id=self.prompt_template_id,
+                    deadline=deadline,
+                    stop_event=stop_event,
+                    priority=priority,
+                    caller_id=caller_id,
+                )
+            )
+
+            while True:
+                next_text = asyncio.ensure_future(text_queue.get())
+                await asyncio.wait(
+                    {next_text, generation}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if next_text.done():
+                    text = next_text.result()
+                else:
+                    # generation has finished or failed, so drain what is left
+                    next_text.cancel()
+                    generation.result()
+                    text = None if text_queue.empty() else text_queue.get_nowait()
+                if text is None:
+                    break
+                yield text
+            await generation
+        finally:
+            # a consumer that went away stops the worker at its next token, and
+            # generation that has not started yet is dropped from the queue
+            stop_event.set()
+            if generation:
+                generation.cancel()
+
+        logger.info("Completed stream inference")
+
+    async def close(self) -> None:
+        """Close inference provider."""
+
+        if self._load_task:
+            self._load_task.cancel()
+        await self.inference_batcher.close()
+        self.inference_executor.shutdown()
 
-        return outputs[0]["generated_text"][-1]["content"]
+    def _check_ready(self) -> None:
+        if not self.ready:
+            raise InferenceNotReadyError("Inference model is not loaded yet")
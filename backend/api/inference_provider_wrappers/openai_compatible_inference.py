@@ -0,0 +1,295 @@
+""" Module for openai compatible inference. """
+
+import asyncio
+import json
+import random
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, NoReturn
+
+import httpx
+from structlog import get_logger
+
+from backend.api import config
+from backend.api.enum import InferencePriority
+from backend.api.exceptions import InferenceRejectedError, InferenceUpstreamError
+from backend.api.inference_provider_wrapper import (
+    InferenceProviderWrapper,
+    InferenceResult,
+)
+from backend.api.metrics import get_counter, get_histogram
+from backend.api.prompt_templates import get_prompt_template
+
+REQUEST_SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# rate limited or overloaded model servers are worth another attempt
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class OpenAICompatibleInference(InferenceProviderWrapper):
+    """Class for inference on a remote openai compatible model server."""
+
+    def __init__(self):
+        self.model_id = config.CONFIG.openai_compatible_model_id
+        self.prompt_template = get_prompt_template(config.CONFIG.prompt_template_id)
+        self.max_tokens = config.CONFIG.openai_compatible_max_tokens
+        self.max_retries = config.CONFIG.openai_compatible_max_retries
+        self.retry_backoff_seconds = (
+            config.CONFIG.openai_compatible_retry_backoff_seconds
+        )
+        self.stream_enabled = config.CONFIG.openai_compatible_stream_enabled
+        # one long lived client, so connections to the model server are reused
+        self.client = httpx.AsyncClient(
+            base_url=config.CONFIG.openai_compatible_base_url,
+            headers=(
+                {"Authorization": f"Bearer {config.CONFIG.openai_compatible_api_key}"}
+                if config.CONFIG.openai_compatible_api_key
+                else None
+            ),
+            limits=httpx.Limits(
+                max_connections=config.CONFIG.openai_compatible_max_connections,
+                max_keepalive_connections=config.CONFIG.openai_compatible_max_connections,
+                keepalive_expiry=config.CONFIG.openai_compatible_keepalive_seconds,
+            ),
+            timeout=httpx.Timeout(
+                config.CONFIG.openai_compatible_timeout_seconds,
+                connect=config.CONFIG.openai_compatible_connect_timeout_seconds,
+            ),
+        )
+        self._requests_counter = get_counter(
+            "openai_compatible_requests_total",
+            "Requests sent to the openai compatible model server",
+        )
+        self._retries_counter = get_counter(
+            "openai_compatible_retries_total",
+            "Requests to the openai compatible model server that were retried",
+        )
+        self._failures_counter = get_counter(
+            "openai_compatible_failures_total",
+            "Inference requests that failed after all retries",
+        )
+        self._request_histogram = get_histogram(
+            "openai_compatible_request_seconds",
+            "Latency of completed requests to the openai compatible model server",
+            REQUEST_SECONDS_BUCKETS,
+        )
+
+    @property
+    def generation_parameters(self) -> dict:
+        """Generation parameters that change the inference result."""
+
+        return {
+            "max_tokens": self.max_tokens,
+            "prompt_template_id": self.prompt_template_id,
+        }
+
+    @property
+    def prompt_template_id(self) -> str:
+        """Id of the prompt template used to build conversations."""
+
+        return self.prompt_template.template_id
+
+    async def request_for_inference(
+        self,
+        instant_message: str,
+        session_key: str | None = None,
+        deadline_seconds: float | None = None,
+        priority: InferencePriority = InferencePriority.INTERACTIVE,
+        caller_id: str | None = None,
+    ) -> InferenceResult:
+        """Request for inference."""
+
+        logger = get_logger().bind(
+            instant_message=instant_message, deadline_seconds=deadline_seconds
+        )
+        logger.info("Started request for inference")
+
+        if deadline_seconds and self.stream_enabled:
+            # a partial answer can only be kept from a streamed reply
+            result = await self._request_for_streamed_inference(
+                instant_message, deadline_seconds
+            )
+            logger.info("Completed request for inference", truncated=result.truncated)
+            return result
+
+        try:
+            # retries and their backoff count against the deadline too
+            async with asyncio.timeout(deadline_seconds or None):
+                result = await self._request_chat_completion(instant_message)
+        except TimeoutError:
+            # a reply that is not streamed has no partial answer to keep
+            self._fail(
+                InferenceUpstreamError(f"No reply within {deadline_seconds} seconds"),
+                logger,
+            )
+        logger.info("Completed request for inference")
+        return result
+
+    async def stream_inference(
+        self,
+        instant_message: str,
+        deadline_seconds: float | None = None,
+        priority: InferencePriority = InferencePriority.INTERACTIVE,
+        caller_id: str | None = None,
+    ) -> AsyncIterator[str]:
+        """Stream inference."""
+
+        logger = get_logger().bind(
+            instant_message=instant_message, deadline_seconds=deadline_seconds
+        )
+        logger.info("Started stream inference")
+
+        if not self.stream_enabled:
+            inference_result = await self.request_for_inference(
+                instant_message, deadline_seconds=deadline_seconds
+            )
+            yield inference_result.text
+            logger.info("Completed stream inference as a single chunk")
+            return
+
+        deadline = time.monotonic() + deadline_seconds if deadline_seconds else None
+        async with aclosing(self._stream_chat_completion(instant_message)) as chunks:
+            async for text in chunks:
+                yield text
+                if deadline and time.monotonic() >= deadline:
+                    logger.info("Completed stream inference at the deadline")
+                    return
+
+        logger.info("Completed stream inference")
+
+    async def close(self) -> None:
+        """Close inference provider."""
+
+        await self.client.aclose()
+
+    async def _request_chat_completion(self, instant_message: str) -> InferenceResult:
+        payload = self._build_payload(instant_message, stream=False)
+        for attempt in range(self.max_retries + 1):
+            started_at = time.perf_counter()
+            self._requests_counter.inc()
+            try:
+                response = await self.client.post("/chat/completions", json=payload)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+                    self._request_histogram.observe(time.perf_counter() - started_at)
+                    result = response.json()["choices"][0]["message"]["content"]
+                    return InferenceResult(text=result)
+                error = httpx.HTTPStatusError(
+                    f"Retryable status code - {response.status_code}",
+                    request=response.request,
+                    response=response,
+                )
+            except httpx.HTTPStatusError as status_error:
+                # a rejected request would be rejected again
+                self._fail(
+                    InferenceRejectedError(str(status_error)),
+                    get_logger().bind(attempt=attempt),
+                )
+            except httpx.TransportError as transport_error:
+                error = transport_error
+            await self._wait_before_retry(error, attempt)
+
+    async def _request_for_streamed_inference(
+        self, instant_message: str, deadline_seconds: float
+    ) -> InferenceResult:
+        texts = []
+        try:
+            # retries and their backoff count against the deadline too
+            async with asyncio.timeout(deadline_seconds):
+                async with aclosing(
+                    self._stream_chat_completion(instant_message)
+                ) as chunks:
+                    async for text in chunks:
+                        texts.append(text)
+        except TimeoutError:
+            if not texts:
+                self._fail(
+                    InferenceUpstreamError(
+                        f"No reply within {deadline_seconds} seconds"
+                    ),
+                    get_logger(),
+                )
+            # leaving the stream closes the connection, so the model server
+            # stops generating
+            return InferenceResult(text="".join(texts), truncated=True)
+        return InferenceResult(text="".join(texts))
+
+    async def _stream_chat_completion(self, instant_message: str) -> AsyncIterator[str]:
+        payload = self._build_payload(instant_message, stream=True)
+        for attempt in range(self.max_retries + 1):
+            started_at = time.perf_counter()
+            self._requests_counter.inc()
+            streamed = False
+            try:
+                async with self.client.stream(
+                    "POST", "/chat/completions", json=payload
+                ) as response:
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        response.raise_for_status()
+                        async for text in self._iter_stream_text(response):
+                            streamed = True
+                            yield text
+                        self._request_histogram.observe(
+                            time.perf_counter() - started_at
+                        )
+                        return
+                    error = httpx.HTTPStatusError(
+                        f"Retryable status code - {response.status_code}",
+                        request=response.request,
+                        response=response,
+                    )
+            except httpx.HTTPStatusError as status_error:
+                # a rejected request would be rejected again
+                self._fail(
+                    InferenceRejectedError(str(status_error)),
+                    get_logger().bind(attempt=attempt),
+                )
+            except httpx.TransportError as transport_error:
+                # chunks already handed to the caller can not be taken back
+                if streamed:
+                    self._failures_counter.inc()
+                    raise InferenceUpstreamError(str(transport_error))
+                error = transport_error
+            await self._wait_before_retry(error, attempt)
+
+    def _build_payload(self, instant_message: str, stream: bool) -> dict:
+        return {
+            "model": self.model_id,
+            "messages": self.prompt_template.build_conversation(instant_message),
+            "max_tokens": self.max_tokens,
+            "stream": stream,
+        }
+
+    async def _iter_stream_text(self, response: httpx.Response) -> AsyncIterator[str]:
+        # server-sent events, each data line holds a json chunk with a delta
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line.removeprefix("data:").strip()
+            if data == "[DONE]":
+                return
+            choices = json.loads(data).get("choices") or [{}]
+            text = choices[0].get("delta", {}).get("content")
+            if text:
+                yield text
+
+    async def _wait_before_retry(self, error: Exception, attempt: int) -> None:
+        logger = get_logger().bind(attempt=attempt, max_retries=self.max_retries)
+        if attempt >= self.max_retries:
+            self._fail(error, logger)
+
+        # exponential backoff with full jitter, so retries of many callers spread out
+        delay_seconds = random.uniform(0, self.retry_backoff_seconds * 2**attempt)
+        logger.warning(error, delay_seconds=delay_seconds)
+        self._retries_counter.inc()
+        await asyncio.sleep(delay_seconds)
+
+    def _fail(self, error: Exception, logger) -> NoReturn:
+        self._failures_counter.inc()
+        logger.error(
+            error,
+            stack_info=config.CONFIG.debug_mode,
+            exc_info=config.CONFIG.debug_mode,
+        )
+        if isinstance(error, (InferenceUpstreamError, InferenceRejectedError)):
+            raise error
+        raise InferenceUpstreamError(str(error)) from error
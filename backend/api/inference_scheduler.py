@@ -0,0 +1,114 @@
+""" Module for inference scheduler. """
+
+import time
+from collections import OrderedDict, deque
+
+from backend.api.enum import InferencePriority
+from backend.api.metrics import get_gauge, get_histogram
+
+QUEUE_WAIT_SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class FairPriorityQueue:
+    """Class for queue serving priority classes in order and callers in turn."""
+
+    def __init__(self):
+        # callers of a class are served round robin, in the order of the dict
+        self._queues: dict[InferencePriority, OrderedDict[str, deque]] = {
+            priority: OrderedDict() for priority in InferencePriority
+        }
+        self._size = 0
+        self._depth_gauges = {
+            priority: get_gauge(
+                f"inference_scheduler_queue_depth_{priority}",
+                f"Inference requests of the {priority} class waiting to be scheduled",
+            )
+            for priority in InferencePriority
+        }
+        self._wait_histograms = {
+            priority: get_histogram(
+                f"inference_scheduler_wait_seconds_{priority}",
+                f"Time inference requests of the {priority} class waited to be scheduled",
+                QUEUE_WAIT_SECONDS_BUCKETS,
+            )
+            for priority in InferencePriority
+        }
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, item: any) -> None:
+        """Push item to the back of the queue of its caller."""
+
+        callers = self._queues[item.priority]
+        callers.setdefault(item.caller_id, deque()).append(item)
+        self._size += 1
+        self._depth_gauges[item.priority].inc()
+
+    def peek(self) -> any:
+        """Item that would be scheduled next."""
+
+        for callers in self._queues.values():
+            if callers:
+                return next(iter(callers.values()))[0]
+        return None
+
+    def pop_batch(self, max_batch_size: int, batch_key: tuple) -> list:
+        """Pop up to max batch size items with the batch key, by priority then caller."""
+
+        batch = []
+        now = time.monotonic()
+        for priority, callers in self._queues.items():
+            # take one item per caller per round, so a busy caller can not
+            # crowd out the others
+            taken = True
+            while taken and len(batch) < max_batch_size:
+                taken = False
+                for caller_id in list(callers):
+                    if len(batch) >= max_batch_size:
+                        break
+                    caller_items = callers[caller_id]
+                    if caller_items[0].batch_key != batch_key:
+                        continue
+                    item = caller_items.popleft()
+                    if caller_items:
+                        callers.move_to_end(caller_id)
+                    else:
+                        del callers[caller_id]
+                    self._size -= 1
+                    self._depth_gauges[priority].dec()
+                    self._wait_histograms[priority].observe(now - item.enqueued_at)
+                    batch.append(item)
+                    taken = True
+        return batch
+
+    def discard_done(self) -> None:
+        """Drop items whose caller gave up waiting."""
+
+        for priority, callers in self._queues.items():
+            for caller_id in list(callers):
+                caller_items = callers[caller_id]
+                pending = deque(item for item in caller_items if not item.future.done())
+                dropped = len(caller_items) - len(pending)
+                if dropped:
+                    self._size -= dropped
+                    self._depth_gauges[priority].dec(dropped)
+                if pending:
+                    callers[caller_id] = pending
+                else:
+                    del callers[caller_id]
+
+    def drain(self) -> list:
+        """Pop every item."""
+
+        items = [
+            item
+            for callers in self._queues.values()
+            for caller_items in callers.values()
+            for item in caller_items
+        ]
+        for priority, callers in self._queues.items():
+            callers.clear()
+            self._depth_gauges[priority].set(0)
+        self._size = 0
+        return items
@@ -0,0 +1,107 @@
+""" Module for keyed dispatcher. """
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from backend.api.exceptions import KeyedQueueFullError
+from backend.api.metrics import get_counter, get_gauge, get_histogram
+
+WAIT_SECONDS_BUCKETS = (0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+@dataclass
+class KeyedWork:
+    """Class for work waiting its turn behind earlier work of the same key."""
+
+    func: callable
+    future: asyncio.Future
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+class KeyedDispatcher:
+    """Class for running work one at a time per key, and different keys in parallel."""
+
+    def __init__(self, max_queue_size: int):
+        self.max_queue_size = max_queue_size
+        # only keys with work queued or running are kept, so memory follows
+        # the number of active keys and not of every key ever seen
+        self._queues: dict[str, deque[KeyedWork]] = {}
+        self._worker_tasks: dict[str, asyncio.Task] = {}
+        self._rejected_counter = get_counter(
+            "keyed_dispatcher_rejected_total",
+            "Work rejected as the queue of its key was full",
+        )
+        self._active_keys_gauge = get_gauge(
+            "keyed_dispatcher_active_keys", "Keys with work queued or running"
+        )
+        self._wait_histogram = get_histogram(
+            "keyed_dispatcher_wait_seconds",
+            "Time work waited for earlier work of the same key",
+            WAIT_SECONDS_BUCKETS,
+        )
+
+    async def run(self, key: str, func: callable) -> any:
+        """Run the async func after all work queued before it for the same key."""
+
+        # queued before the first await, so work runs in the order it arrived
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = deque()
+            self._queues[key] = queue
+        elif len(queue) >= self.max_queue_size:
+            self._rejected_counter.inc()
+            raise KeyedQueueFullError(f"Queue of {self.max_queue_size} is full")
+
+        keyed_work = KeyedWork(
+            func=func, future=asyncio.get_running_loop().create_future()
+        )
+        queue.append(keyed_work)
+        if key not in self._worker_tasks:
+            self._worker_tasks[key] = asyncio.create_task(self._run_worker(key))
+            self._active_keys_gauge.set(len(self._worker_tasks))
+        return await keyed_work.future
+
+    async def close(self) -> None:
+        """Stop running work, work still queued is cancelled."""
+
+        tasks = list(self._worker_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for queue in self._queues.values():
+            for keyed_work in queue:
+                keyed_work.future.cancel()
+        self._queues.clear()
+        self._worker_tasks.clear()
+        self._active_keys_gauge.set(0)
+
+    async def _run_worker(self, key: str) -> None:
+        queue = self._queues[key]
+        try:
+            while queue:
+                keyed_work = queue[0]
+                # the caller stopped waiting before its turn came
+                if not keyed_work.future.cancelled():
+                    self._wait_histogram.observe(
+                        time.monotonic() - keyed_work.queued_at
+                    )
+                    try:
+                        result = await keyed_work.func()
+                    except asyncio.CancelledError:
+                        keyed_work.future.cancel()
+                        raise
+                    except Exception as error:
+                        if not keyed_work.future.done():
+                            keyed_work.future.set_exception(error)
+                    else:
+                        if not keyed_work.future.done():
+                            keyed_work.future.set_result(result)
+                queue.popleft()
+        finally:
+            # the key is forgotten as soon as it is idle
+            if self._queues.get(key) is queue:
+                del self._queues[key]
+            self._worker_tasks.pop(key, None)
+            self._active_keys_gauge.set(len(self._worker_tasks))
@@ -1,19 +1,39 @@
 """ Module for command line interface (cli). """
 
+import asyncio
+import contextlib
 import dataclasses
+import functools
 import json
+import time
+from typing import AsyncIterator
 
+import numpy as np
 from structlog import get_logger
 
 from backend.api import config, provider
 from backend.api.entities import Caller, Chat, ChatInputModel
+from backend.api.enum import InferencePriority
+from backend.api.exceptions import InferenceRejectedError
+from backend.api.inference_provider_wrapper import InferenceResult
 from backend.api.lib import (
     configure_global_logging_level,
     log_config_settings,
+    now_utc,
     parse_cli_args_with_defaults,
     parse_env_vars_with_defaults,
 )
-from backend.api.provider import configure_providers
+from backend.api.messaging_provider_wrapper import IncomingMessage
+from backend.api.provider import (
+    close_providers,
+    configure_providers,
+    providers_ready,
+    start_providers,
+)
+from backend.api.reply_chunker import ReplyChunker
+from backend.api.request_coalescer import build_coalescing_key
+from backend.api.response_cache import build_cache_key, build_cache_scope
+from backend.api.webhook_queue import is_persisted
 
 
 async def get_caller(idp_id: str):
@@ -25,7 +45,68 @@ async def get_caller(idp_id: str):
 async def process_chat(chat_input: ChatInputModel, caller: Caller) -> Chat:
     """Process chat."""
 
-    logger = get_logger().bind(
+    logger = _bind_chat_logger(chat_input, caller)
+    logger.info("Starting process chat")
+
+    chat = _start_chat(chat_input, caller)
+    inference_started_at = time.monotonic()
+    inference_result = await request_for_inference(
+        chat.caller_chat_text,
+        bypass_cache=chat_input.bypass_cache,
+        # without a session id of its own, every chat of the caller would
+        # share the placeholder session
+        session_key=(
+            f"{chat.caller_id}:{chat.caller_session_id}"
+            if "caller_session_id" in chat_input.model_fields_set
+            and chat_input.caller_session_id
+            else None
+        ),
+        deadline_seconds=chat.inference_deadline_seconds,
+        priority=InferencePriority.INTERACTIVE,
+        caller_id=str(chat.caller_id),
+    )
+    chat.inference_duration_seconds = time.monotonic() - inference_started_at
+    _complete_chat(chat, inference_result)
+
+    logger.info("Completed process chat", truncated=inference_result.truncated)
+    return inference_result.text
+
+
+async def stream_chat(chat_input: ChatInputModel, caller: Caller) -> AsyncIterator[str]:
+    """Stream chat."""
+
+    logger = _bind_chat_logger(chat_input, caller)
+    logger.info("Starting stream chat")
+
+    chat = _start_chat(chat_input, caller)
+    inference_started_at = time.monotonic()
+    chunks = []
+    async for chunk in stream_inference(
+        chat.caller_chat_text,
+        bypass_cache=chat_input.bypass_cache,
+        deadline_seconds=chat.inference_deadline_seconds,
+        priority=InferencePriority.INTERACTIVE,
+        caller_id=str(chat.caller_id),
+    ):
+        chunks.append(chunk)
+        yield chunk
+    chat.inference_duration_seconds = time.monotonic() - inference_started_at
+    _complete_chat(
+        chat,
+        InferenceResult(
+            text="".join(chunks),
+            truncated=bool(
+                chat.inference_deadline_seconds
+                and chat.inference_duration_seconds >= chat.inference_deadline_seconds
+            ),
+        ),
+    )
+
+    logger.info("Completed stream chat")
+
+
+def _bind_chat_logger(chat_input: ChatInputModel, caller: Caller):
+    return get_logger().bind(
         job_request=(
             chat_input.model_dump(exclude=chat_input.get_exclude_fields_for_logging())
             if chat_input
@@ -41,16 +122,39 @@ async def process_chat(chat_input: ChatInputModel, caller: Caller) -> Chat:
             else None
         ),
     )
-    logger.info("Starting process chat")
 
-    chat_input = Chat(**chat_input.model_dump())
-    chat_input.caller_id = caller.caller_id
-    chat_output = await request_for_inference(chat_input.caller_chat_text)
 
-    # provider.PROVIDERS.data_repository.save_job(chat_output, caller=caller)
+def _start_chat(chat_input: ChatInputModel, caller: Caller) -> Chat:
+    chat = Chat(**chat_input.model_dump(exclude={"bypass_cache"}))
+    chat.caller_id = caller.caller_id
+    chat.inference_provider_type = config.CONFIG.inference_provider_type
+    chat.prompt_template = (
+        provider.PROVIDERS.inference_provider_wrapper.prompt_template_id
+    )
+    chat.inference_deadline_seconds = get_inference_deadline_seconds(caller)
+    chat.start_time = now_utc()
+    return chat
+
 
-    logger.info("Completed process chat")
-    return chat_output
+def _complete_chat(chat: Chat, inference_result: InferenceResult) -> None:
+    chat.response_chat_text = inference_result.text
+    chat.response_truncated = inference_result.truncated
+    chat.end_time = now_utc()
+    chat.total_duration_seconds = (chat.end_time - chat.start_time).total_seconds()
+
+    # provider.PROVIDERS.data_repository.save_job(chat)
+
+
+def get_inference_deadline_seconds(caller: Caller | None) -> float | None:
+    """Get inference latency budget of caller, or the global one if not overridden."""
+
+    deadline_seconds = (
+        caller.inference_deadline_seconds
+        if caller and caller.inference_deadline_seconds is not None
+        else config.CONFIG.inference_deadline_seconds
+    )
+    # zero turns the deadline off
+    return deadline_seconds or None
 
 
 async def process_initial_connection(
@@ -75,32 +179,379 @@ async def process_initial_connection(
     return None
 
 
-async def process_incoming_message(body: dict) -> dict:
-    """Process incomging message."""
-
-    instant_message = (
-        await provider.PROVIDERS.messaging_provider_wrapper.extract_incomging_message(
-            body
+async def receive_incoming_message(body: dict) -> dict:
+    """Receive incoming messages, each queued as a job of its own if enabled."""
+
+    messaging_provider_wrapper = provider.PROVIDERS.messaging_provider_wrapper
+    incoming_messages = await messaging_provider_wrapper.extract_incoming_messages(body)
+    # only text messages are replied to
+    incoming_messages = [
+        incoming_message
+        for incoming_message in incoming_messages
+        if incoming_message.text
+    ]
+    if not incoming_messages:
+        # status callbacks and the like have nothing to reply to
+        return {"status": "ignored"}
+
+    webhook_queue = provider.PROVIDERS.webhook_queue
+    # one job per message, so a retry only redoes the message that failed
+    webhook_jobs = [
+        (
+            webhook_queue.create_job(dataclasses.asdict(incoming_message))
+            if webhook_queue
+            else None
+        )
+        for incoming_message in incoming_messages
+    ]
+
+    message_deduplicator = provider.PROVIDERS.message_deduplicator
+    if message_deduplicator:
+        # each job is persisted along with the claim on its message, so a crash
+        # in between can not leave a message claimed but never processed
+        claimed = await asyncio.gather(
+            *[
+                message_deduplicator.claim(incoming_message.message_id, webhook_job)
+                for incoming_message, webhook_job in zip(
+                    incoming_messages, webhook_jobs
+                )
+            ]
         )
+        # messages of a redelivery that were already taken care of are dropped
+        incoming_messages, webhook_jobs = [
+            [item for item, is_claimed in zip(items, claimed) if is_claimed]
+            for items in (incoming_messages, webhook_jobs)
+        ]
+        if not incoming_messages:
+            get_logger().info("Skipped duplicate messages")
+            return {"status": "duplicate"}
+
+    if not webhook_queue:
+        return await process_incoming_messages(incoming_messages)
+
+    for index, webhook_job in enumerate(webhook_jobs):
+        try:
+            await webhook_queue.enqueue(webhook_job)
+        except BaseException:
+            # the sender redelivers messages that failed, those not persisted
+            # have to get through
+            await _release_claims(
+                [
+                    incoming_message
+                    for incoming_message, remaining_job in zip(
+                        incoming_messages[index:], webhook_jobs[index:]
+                    )
+                    if not is_persisted(remaining_job)
+                ]
+            )
+            raise
+    # acknowledged once persisted, so the sender does not time out and redeliver
+    return {"status": "accepted"}
+
+
+async def process_incoming_messages(
+    incoming_messages: list[IncomingMessage],
+) -> dict:
+    """Process incomging messages, replying to them concurrently."""
+
+    semaphore = asyncio.Semaphore(config.CONFIG.messaging_max_concurrent_messages)
+    # every message is seen through, so one failing does not cut the others
+    # short in the middle of a reply
+    results = await asyncio.gather(
+        *[
+            _reply_in_order(incoming_message, semaphore)
+            for incoming_message in incoming_messages
+        ],
+        return_exceptions=True,
     )
+    failed = [
+        (incoming_message, result)
+        for incoming_message, result in zip(incoming_messages, results)
+        if isinstance(result, BaseException)
+    ]
+    if failed:
+        # only the messages that failed are processed again when redelivered,
+        # unless their request was rejected and would be rejected again
+        await _release_claims(
+            [
+                incoming_message
+                for incoming_message, error in failed
+                if not isinstance(error, InferenceRejectedError)
+            ]
+        )
+        raise failed[0][1]
+    return {"status": "success"}
+
+
+async def process_queued_message(body: dict) -> dict:
+    """Process incoming message queued as a job of its own."""
+
+    return await _reply_in_order(IncomingMessage(**body))
 
-    reply_message = None
-    if instant_message:
-        reply_message = await request_for_inference(instant_message)
-        # reply_message = f"Echo: {instant_message}"
 
-    return await provider.PROVIDERS.messaging_provider_wrapper.reply_outgoing_message(
-        reply_message, body
+async def _reply_in_order(
+    incoming_message: IncomingMessage, semaphore: asyncio.Semaphore | None = None
+) -> dict:
+    async def reply() -> dict:
+        async with semaphore or contextlib.nullcontext():
+            return await _reply_incoming_message(incoming_message)
+
+    message_dispatcher = provider.PROVIDERS.message_dispatcher
+    if not message_dispatcher:
+        return await reply()
+    # messages of one sender are replied to in order, one at a time
+    return await message_dispatcher.run(incoming_message.sender_id, reply)
+
+
+async def _release_claims(incoming_messages: list[IncomingMessage]) -> None:
+    message_deduplicator = provider.PROVIDERS.message_deduplicator
+    if message_deduplicator:
+        for incoming_message in incoming_messages:
+            await message_deduplicator.release(incoming_message.message_id)
+
+
+async def _reply_incoming_message(incoming_message: IncomingMessage) -> dict:
+    messaging_provider_wrapper = provider.PROVIDERS.messaging_provider_wrapper
+    progressive_replies_enabled = config.CONFIG.messaging_progressive_replies_enabled
+    # the read receipt goes out while the reply is generated
+    await messaging_provider_wrapper.mark_incoming_message_read(
+        incoming_message, show_typing_indicator=progressive_replies_enabled
+    )
+    if progressive_replies_enabled:
+        return await _reply_incoming_message_progressively(incoming_message)
+
+    inference_result = await request_for_inference(
+        incoming_message.text,
+        deadline_seconds=get_inference_deadline_seconds(None),
+        priority=InferencePriority.MESSAGING,
+        caller_id=incoming_message.sender_id,
+    )
+    reply_message = inference_result.text
+    # reply_message = f"Echo: {incoming_message.text}"
+
+    return await messaging_provider_wrapper.reply_outgoing_message(
+        reply_message, incoming_message
     )
 
 
-async def request_for_inference(prompt_text: str) -> str:
+async def _reply_incoming_message_progressively(
+    incoming_message: IncomingMessage,
+) -> dict:
+    messaging_provider_wrapper = provider.PROVIDERS.messaging_provider_wrapper
+    reply_chunker = ReplyChunker(
+        config.CONFIG.messaging_progressive_reply_min_chars,
+        messaging_provider_wrapper.max_message_chars,
+    )
+    # each paragraph or sentence is sent as soon as it is generated, only the
+    # first one quoting the incoming message
+    replies_sent = 0
+    async for reply_message in reply_chunker.chunk(
+        stream_inference(
+            incoming_message.text,
+            deadline_seconds=get_inference_deadline_seconds(None),
+            priority=InferencePriority.MESSAGING,
+            caller_id=incoming_message.sender_id,
+        )
+    ):
+        await messaging_provider_wrapper.reply_outgoing_message(
+            reply_message, incoming_message, quote_incoming_message=replies_sent == 0
+        )
+        replies_sent += 1
+    return {"status": "success"}
+
+
+async def request_for_inference(
+    prompt_text: str,
+    bypass_cache: bool = False,
+    session_key: str | None = None,
+    deadline_seconds: float | None = None,
+    priority: InferencePriority = InferencePriority.INTERACTIVE,
+    caller_id: str | None = None,
+) -> InferenceResult:
     """Request for inference."""
 
-    return await provider.PROVIDERS.inference_provider_wrapper.request_for_inference(
-        prompt_text
+    inference_provider_wrapper = provider.PROVIDERS.inference_provider_wrapper
+    if session_key and inference_provider_wrapper.supports_sessions:
+        # replies depend on the session history, so they can not be cached
+        async with _admit_for_inference():
+            return await inference_provider_wrapper.request_for_inference(
+                prompt_text,
+                session_key=session_key,
+                deadline_seconds=deadline_seconds,
+                priority=priority,
+                caller_id=caller_id,
+            )
+
+    cache_lookup = await _lookup_caches(prompt_text, bypass_cache)
+    if cache_lookup.response_text is not None:
+        return InferenceResult(text=cache_lookup.response_text)
+
+    request_and_store = functools.partial(
+        _request_and_store_in_caches,
+        prompt_text,
+        cache_lookup,
+        deadline_seconds,
+        priority,
+        caller_id,
+    )
+    request_coalescer = provider.PROVIDERS.request_coalescer
+    if not request_coalescer:
+        return await request_and_store()
+    # identical prompts already being generated share that generation
+    return await request_coalescer.run(
+        build_coalescing_key(
+            prompt_text, cache_lookup.cache_scope, deadline_seconds, priority
+        ),
+        request_and_store,
+    )
+
+
+async def stream_inference(
+    prompt_text: str,
+    bypass_cache: bool = False,
+    deadline_seconds: float | None = None,
+    priority: InferencePriority = InferencePriority.INTERACTIVE,
+    caller_id: str | None = None,
+) -> AsyncIterator[str]:
+    """Stream inference."""
+
+    cache_lookup = await _lookup_caches(prompt_text, bypass_cache)
+    if cache_lookup.response_text is not None:
+        yield cache_lookup.response_text
+        return
+
+    inference_provider_wrapper = provider.PROVIDERS.inference_provider_wrapper
+    started_at = time.monotonic()
+    chunks = []
+    async with _admit_for_inference():
+        async for chunk in inference_provider_wrapper.stream_inference(
+            prompt_text,
+            deadline_seconds=deadline_seconds,
+            priority=priority,
+            caller_id=caller_id,
+        ):
+            chunks.append(chunk)
+            yield chunk
+
+    # only a stream finished within the deadline is known not to be cut short
+    if not deadline_seconds or time.monotonic() - started_at < deadline_seconds:
+        await _store_in_caches(cache_lookup, "".join(chunks))
+
+
+@dataclasses.dataclass
+class CacheLookup:
+    """Class for the outcome of looking up a prompt in the response caches."""
+
+    cache_key: str | None = None
+    cache_scope: str | None = None
+    embedding: np.ndarray | None = None
+    response_text: str | None = None
+
+
+async def _lookup_caches(prompt_text: str, bypass_cache: bool) -> CacheLookup:
+    inference_provider_wrapper = provider.PROVIDERS.inference_provider_wrapper
+    response_cache = provider.PROVIDERS.response_cache
+    semantic_cache = provider.PROVIDERS.semantic_cache
+    cache_lookup = CacheLookup(
+        cache_scope=build_cache_scope(
+            inference_provider_wrapper.model_id,
+            inference_provider_wrapper.generation_parameters,
+        )
     )
 
+    if response_cache:
+        cache_lookup.cache_key = build_cache_key(prompt_text, cache_lookup.cache_scope)
+        if not bypass_cache:
+            cache_lookup.response_text = await response_cache.get(
+                cache_lookup.cache_key
+            )
+            if cache_lookup.response_text is not None:
+                return cache_lookup
+
+    if semantic_cache:
+        cache_lookup.embedding = await semantic_cache.embed(prompt_text)
+        if cache_lookup.embedding is not None and not bypass_cache:
+            cache_lookup.response_text = semantic_cache.get(
+                cache_lookup.embedding, cache_lookup.cache_scope
+            )
+
+    return cache_lookup
+
+
+async def _store_in_caches(cache_lookup: CacheLookup, response_text: str) -> None:
+    if cache_lookup.cache_key:
+        await provider.PROVIDERS.response_cache.set(
+            cache_lookup.cache_key,
+            provider.PROVIDERS.inference_provider_wrapper.model_id,
+            response_text,
+        )
+    if cache_lookup.embedding is not None:
+        await provider.PROVIDERS.semantic_cache.set(
+            cache_lookup.embedding, cache_lookup.cache_scope, response_text
+        )
+
+
+async def _request_and_store_in_caches(
+    prompt_text: str,
+    cache_lookup: CacheLookup,
+    deadline_seconds: float | None,
+    priority: InferencePriority,
+    caller_id: str | None,
+) -> InferenceResult:
+    inference_provider_wrapper = provider.PROVIDERS.inference_provider_wrapper
+    async with _admit_for_inference():
+        inference_result = await inference_provider_wrapper.request_for_inference(
+            prompt_text,
+            deadline_seconds=deadline_seconds,
+            priority=priority,
+            caller_id=caller_id,
+        )
+
+    # partial answers cut short by the deadline are not worth serving again
+    if not inference_result.truncated:
+        await _store_in_caches(cache_lookup, inference_result.text)
+    return inference_result
+
+
+def _admit_for_inference() -> contextlib.AbstractAsyncContextManager:
+    # rejects work early when it would wait longer than the latency objective
+    admission_controller = provider.PROVIDERS.admission_controller
+    if not admission_controller:
+        return contextlib.nullcontext()
+    return admission_controller.admit()
+
+
+async def startup() -> None:
+    """Start up providers in the background."""
+
+    logger = get_logger()
+    logger.info("Starting startup from main")
+
+    await start_providers()
+    if provider.PROVIDERS.webhook_queue:
+        await provider.PROVIDERS.webhook_queue.start(
+            process_queued_message, providers_ready
+        )
+
+    logger.info("Completed startup from main")
+
+
+def is_ready() -> bool:
+    """Check if ready to serve requests."""
+
+    return providers_ready()
+
+
+async def shutdown() -> None:
+    """Shutdown gracefully."""
+
+    logger = get_logger()
+    logger.info("Starting shutdown from main")
+
+    await close_providers()
+
+    logger.info("Completed shutdown from main")
+
 
 def init() -> None:
     """Entry point if called as an executable."""
@@ -0,0 +1,159 @@
+""" Module for message deduplicator. """
+
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from structlog import get_logger
+
+from backend.api import config
+from backend.api.data_repository import DataRepository
+from backend.api.entities import WebhookJob
+from backend.api.lib import now_utc
+from backend.api.metrics import get_counter, get_gauge
+
+
+class MessageDeduplicator:
+    """Class for recognizing redelivered messages so they are processed only once."""
+
+    def __init__(
+        self,
+        data_repository: DataRepository | None,
+        ttl_seconds: float,
+        max_entries: int,
+        compaction_interval_seconds: float,
+    ):
+        self.data_repository = data_repository
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.compaction_interval_seconds = compaction_interval_seconds
+        # message id to monotonic expiry, least recently seen first
+        self._entries: OrderedDict[str, float] = OrderedDict()
+        self._compaction_task: asyncio.Task = None
+        self._claimed_counter = get_counter(
+            "message_dedup_claimed_total", "Messages seen for the first time"
+        )
+        self._duplicates_counter = get_counter(
+            "message_dedup_duplicates_total",
+            "Redelivered messages acknowledged without processing",
+        )
+        self._evicted_counter = get_counter(
+            "message_dedup_evicted_total",
+            "Message ids evicted from memory to stay within the maximum entries",
+        )
+        self._compacted_counter = get_counter(
+            "message_dedup_compacted_total",
+            "Expired message ids deleted from the data repository",
+        )
+        self._entries_gauge = get_gauge(
+            "message_dedup_entries", "Message ids remembered in memory"
+        )
+
+    async def claim(
+        self, message_id: str, webhook_job: WebhookJob | None = None
+    ) -> bool:
+        """Claim message for processing, false if it was already claimed.
+
+        A webhook job given is persisted along with the claim.
+        """
+
+        now = time.monotonic()
+        expires_at = self._entries.get(message_id)
+        if expires_at is not None and expires_at > now:
+            self._entries.move_to_end(message_id)
+            self._duplicates_counter.inc()
+            return False
+
+        # another worker, or this one before a restart, may have seen it
+        claimed = True
+        if self.data_repository:
+            try:
+                claimed = await self.data_repository.insert_processed_message(
+                    message_id,
+                    now_utc() + timedelta(seconds=self.ttl_seconds),
+                    webhook_job,
+                )
+            except Exception as error:
+                # the in memory layer still catches redeliveries to this worker,
+                # and the job, rolled back, is left to be enqueued on its own
+                self._log_error(error)
+
+        self._remember(message_id, now + self.ttl_seconds)
+        if not claimed:
+            self._duplicates_counter.inc()
+            return False
+        self._claimed_counter.inc()
+        return True
+
+    async def release(self, message_id: str) -> None:
+        """Release claim on message that failed, so a redelivery is processed."""
+
+        self._entries.pop(message_id, None)
+        self._entries_gauge.set(len(self._entries))
+        if self.data_repository:
+            await self.data_repository.delete_processed_message(message_id)
+
+    async def start(self) -> None:
+        """Start periodic compaction of expired message ids."""
+
+        self._compaction_task = asyncio.create_task(self._run_compaction())
+
+    async def close(self) -> None:
+        """Stop periodic compaction."""
+
+        if self._compaction_task:
+            self._compaction_task.cancel()
+            await asyncio.gather(self._compaction_task, return_exceptions=True)
+            self._compaction_task = None
+
+    async def compact(self) -> None:
+        """Delete expired message ids from memory and data repository."""
+
+        logger = get_logger()
+        logger.info("Started compact message ids")
+
+        now = time.monotonic()
+        expired_ids = [
+            message_id
+            for message_id, expires_at in self._entries.items()
+            if expires_at <= now
+        ]
+        for message_id in expired_ids:
+            del self._entries[message_id]
+        self._entries_gauge.set(len(self._entries))
+
+        compacted = 0
+        if self.data_repository:
+            compacted = await self.data_repository.delete_expired_processed_messages()
+            self._compacted_counter.inc(compacted)
+
+        logger.info(
+            "Completed compact message ids",
+            expired_in_memory=len(expired_ids),
+            compacted=compacted,
+        )
+
+    def _remember(self, message_id: str, expires_at: float) -> None:
+        self._entries[message_id] = expires_at
+        self._entries.move_to_end(message_id)
+        # evicted ids are still recognized by the data repository
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evicted_counter.inc()
+        self._entries_gauge.set(len(self._entries))
+
+    async def _run_compaction(self) -> None:
+        while True:
+            await asyncio.sleep(self.compaction_interval_seconds)
+            try:
+                await self.compact()
+            except Exception as error:
+                self._log_error(error)
+
+    def _log_error(self, error: Exception) -> None:
+        get_logger().error(
+            error,
+            stack_info=config.CONFIG.debug_mode,
+            exc_info=config.CONFIG.debug_mode,
+        )
@@ -1,11 +1,27 @@
 """ Module for messaging provider wrapper. """
 
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+
+@dataclass
+class IncomingMessage:
+    """Class for incoming message."""
+
+    # the same on every redelivery of the message
+    message_id: str
+    sender_id: str
+    business_phone_number_id: str
+    # only set for text messages
+    text: str | None = None
 
 
 class MessagingProviderWrapper(ABC):
     """Class for messaging provider wrapper."""
 
+    # longest text a single outgoing message may have, if limited
+    max_message_chars: int | None = None
+
     @abstractmethod
     async def process_initial_connection(
         self,
@@ -14,16 +30,27 @@ class MessagingProviderWrapper(ABC):
         """Process initial connection."""
 
     @abstractmethod
-    async def extract_incomging_message(
+    async def extract_incoming_messages(
         self,
         body: dict,
-    ) -> str:
-        """Extract incoming message."""
+    ) -> list[IncomingMessage]:
+        """Extract incoming messages."""
 
     @abstractmethod
     async def reply_outgoing_message(
         self,
         reply_message: str,
-        body: dict,
+        incoming_message: IncomingMessage,
+        quote_incoming_message: bool = True,
     ) -> dict:
         """Reply outgoing message."""
+
+    async def mark_incoming_message_read(
+        self,
+        incoming_message: IncomingMessage,
+        show_typing_indicator: bool = False,
+    ) -> None:
+        """Mark incoming message as read, if the provider supports it."""
+
+    async def close(self) -> None:
+        """Close messaging provider."""
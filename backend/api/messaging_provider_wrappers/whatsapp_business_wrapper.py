@@ -1,17 +1,73 @@
 """ Module for whatsapp for business wrapper. """
 
 import json
+import time
 
 import httpx
 from structlog import get_logger
 
 from backend.api import config
-from backend.api.messaging_provider_wrapper import MessagingProviderWrapper
+from backend.api.messaging_provider_wrapper import (
+    IncomingMessage,
+    MessagingProviderWrapper,
+)
+from backend.api.metrics import get_counter, get_histogram
+from backend.api.outbound_dispatcher import OutboundDispatcher
+
+REQUEST_SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
 
 
 class WhatsappForBusinessWrapper(MessagingProviderWrapper):
     """Class for whatsapp for business wrapper."""
 
+    max_message_chars = 4096
+
+    def __init__(self):
+        # one long lived client, so connections to the graph api are reused
+        self.client = httpx.AsyncClient(
+            base_url=config.CONFIG.whatsapp_for_business_api_base_url,
+            headers={
+                "Authorization": f"Bearer {config.CONFIG.whatsapp_for_business_api_token}"
+            },
+            http2=config.CONFIG.whatsapp_for_business_http2_enabled,
+            limits=httpx.Limits(
+                max_connections=config.CONFIG.whatsapp_for_business_max_connections,
+                max_keepalive_connections=config.CONFIG.whatsapp_for_business_max_connections,
+                keepalive_expiry=config.CONFIG.whatsapp_for_business_keepalive_seconds,
+            ),
+            timeout=httpx.Timeout(
+                config.CONFIG.whatsapp_for_business_timeout_seconds,
+                connect=config.CONFIG.whatsapp_for_business_connect_timeout_seconds,
+            ),
+        )
+        # sends are rate limited per business phone number, matching the
+        # throughput tier meta assigned to it
+        self.outbound_dispatcher = OutboundDispatcher(
+            self._post,
+            config.CONFIG.whatsapp_for_business_messages_per_second,
+            config.CONFIG.whatsapp_for_business_burst_size,
+            config.CONFIG.whatsapp_for_business_max_attempts,
+            config.CONFIG.whatsapp_for_business_retry_backoff_seconds,
+            config.CONFIG.whatsapp_for_business_max_retry_queue_size,
+        )
+        self._requests_counter = get_counter(
+            "whatsapp_for_business_requests_total",
+            "Requests sent to the whatsapp for business graph api",
+        )
+        self._connections_opened_counter = get_counter(
+            "whatsapp_for_business_connections_opened_total",
+            "Requests to the graph api that had to open a new connection",
+        )
+        self._connections_reused_counter = get_counter(
+            "whatsapp_for_business_connections_reused_total",
+            "Requests to the graph api sent over a pooled connection",
+        )
+        self._request_histogram = get_histogram(
+            "whatsapp_for_business_request_seconds",
+            "Latency of requests to the whatsapp for business graph api",
+            REQUEST_SECONDS_BUCKETS,
+        )
+
     async def process_initial_connection(
         self,
         body: dict,
@@ -30,95 +86,125 @@ class WhatsappForBusinessWrapper(MessagingProviderWrapper):
             return token, challenge
         return token, None
 
-    async def extract_incomging_message(
+    async def extract_incoming_messages(
         self,
         body: dict,
-    ) -> str:
-        """Extract incoming message."""
-
-        logger = get_logger().bind(body=json.dumps(body, indent=2))
-        logger.info("Started extract incoming message")
+    ) -> list[IncomingMessage]:
+        """Extract incoming messages."""
+
+        logger = get_logger()
+        logger.info("Started extract incoming messages")
+
+        # one delivery batches messages and status callbacks of several entries
+        incoming_messages = []
+        for entry in body.get("entry", []):
+            for change in entry.get("changes", []):
+                value = change.get("value", {})
+                messages = value.get("messages")
+                if not messages:
+                    # status callbacks carry no messages
+                    continue
+                business_phone_number_id = value.get("metadata", {}).get(
+                    "phone_number_id"
+                )
+                for message in messages:
+                    incoming_messages.append(
+                        IncomingMessage(
+                            message_id=message.get("id"),
+                            sender_id=message.get("from"),
+                            business_phone_number_id=business_phone_number_id,
+                            text=(
+                                message.get("text", {}).get("body")
+                                if message.get("type") == "text"
+                                else None
+                            ),
+                        )
+                    )
 
-        messages = (
-            body.get("entry", [])[0]
-            .get("changes", [])[0]
-            .get("value", {})
-            .get("messages", [])
+        logger.info(
+            "Completed extract incoming messages", messages=len(incoming_messages)
         )
-
-        instant_message = None
-        if messages and len(messages) > 0 and messages[0].get("type") == "text":
-            instant_message = messages[0].get("text", {}).get("body")
-
-        logger.info("Completed extract incoming message")
-        return instant_message
+        return incoming_messages
 
     async def reply_outgoing_message(
         self,
         reply_message: str,
-        body: dict,
+        incoming_message: IncomingMessage,
+        quote_incoming_message: bool = True,
     ) -> dict:
         """Reply outgoing message."""
 
         logger = get_logger().bind(
-            reply_message=reply_message, body=json.dumps(body, indent=2)
+            reply_message=reply_message, message_id=incoming_message.message_id
         )
         logger.info("Started Reply outgoing message")
 
         if reply_message:
-            messages = (
-                body.get("entry", [])[0]
-                .get("changes", [])[0]
-                .get("value", {})
-                .get("messages", [])
+            payload = {
+                "messaging_product": "whatsapp",
+                "to": incoming_message.sender_id,
+                "text": {"body": reply_message},
+            }
+            if quote_incoming_message:
+                # Shows the message as a reply to the original user message
+                payload["context"] = {"message_id": incoming_message.message_id}
+            await self.outbound_dispatcher.dispatch(
+                incoming_message.business_phone_number_id,
+                f"/{incoming_message.business_phone_number_id}/messages",
+                payload,
             )
-            if messages and len(messages) > 0 and messages[0].get("type") == "text":
-                message = messages[0]
-                business_phone_number_id = (
-                    body.get("entry", [])[0]
-                    .get("changes", [])[0]
-                    .get("value", {})
-                    .get("metadata", {})
-                    .get("phone_number_id")
-                )
-
-                reply_url = f"https://graph.facebook.com/v20.0/{business_phone_number_id}/messages"
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        reply_url,
-                        headers={
-                            "Authorization": f"Bearer {config.CONFIG.whatsapp_for_business_api_token}"
-                        },
-                        json={
-                            "messaging_product": "whatsapp",
-                            "to": message.get("from"),
-                            "text": {
-                                # "body": f"Echo: {message.get('text', {}).get('body')}"
-                                "body": reply_message
-                            },
-                            "context": {
-                                "message_id": message.get(
-                                    "id"
-                                )  # Shows the message as a reply to the original user message
-                            },
-                        },
-                    )
-                    if response.status_code != 200:
-                        logger.info("Completed process incoming message")
-                        raise Exception("Failed to send reply message")
-
-                    read_url = f"https://graph.facebook.com/v20.0/{business_phone_number_id}/messages"
-                    await client.post(
-                        read_url,
-                        headers={
-                            "Authorization": f"Bearer {config.CONFIG.whatsapp_for_business_api_token}"
-                        },
-                        json={
-                            "messaging_product": "whatsapp",
-                            "status": "read",
-                            "message_id": message.get("id"),
-                        },
-                    )
 
         logger.info("Completed process incoming message")
         return {"status": "success"}
+
+    async def mark_incoming_message_read(
+        self,
+        incoming_message: IncomingMessage,
+        show_typing_indicator: bool = False,
+    ) -> None:
+        """Mark incoming message as read, without waiting for it to be sent."""
+
+        payload = {
+            "messaging_product": "whatsapp",
+            "status": "read",
+            "message_id": incoming_message.message_id,
+        }
+        if show_typing_indicator:
+            # shown until the first reply is sent, or for at most 25 seconds
+            payload["typing_indicator"] = {"type": "text"}
+        future = self.outbound_dispatcher.submit(
+            incoming_message.business_phone_number_id,
+            f"/{incoming_message.business_phone_number_id}/messages",
+            payload,
+        )
+        # the dispatcher logs failures, and a missing read receipt is harmless
+        future.add_done_callback(
+            lambda future: future.cancelled() or future.exception()
+        )
+
+    async def close(self) -> None:
+        """Close messaging provider."""
+
+        await self.outbound_dispatcher.close()
+        await self.client.aclose()
+
+    async def _post(self, url: str, payload: dict) -> httpx.Response:
+        opened_connection = False
+
+        async def trace(event_name: str, _info: dict) -> None:
+            # connection events only fire when the pool has no idle connection
+            nonlocal opened_connection
+            if event_name.startswith("connection.connect_tcp"):
+                opened_connection = True
+
+        started_at = time.perf_counter()
+        self._requests_counter.inc()
+        response = await self.client.post(
+            url, json=payload, extensions={"trace": trace}
+        )
+        self._request_histogram.observe(time.perf_counter() - started_at)
+        if opened_connection:
+            self._connections_opened_counter.inc()
+        else:
+            self._connections_reused_counter.inc()
+        return response
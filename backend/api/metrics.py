@@ -0,0 +1,121 @@
+""" Module for metrics. """
+
+import threading
+
+
+class Counter:
+    """Class for counter metric."""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        """Increment counter."""
+
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> dict:
+        """Snapshot of counter."""
+
+        return {"type": "counter", "description": self.description, "value": self.value}
+
+
+class Gauge:
+    """Class for gauge metric."""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        """Set gauge."""
+
+        with self._lock:
+            self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        """Increment gauge."""
+
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        """Decrement gauge."""
+
+        with self._lock:
+            self.value -= amount
+
+    def snapshot(self) -> dict:
+        """Snapshot of gauge."""
+
+        return {"type": "gauge", "description": self.description, "value": self.value}
+
+
+class Histogram:
+    """Class for histogram metric."""
+
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...]):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Observe value."""
+
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            for index, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    self.bucket_counts[index] += 1
+
+    def snapshot(self) -> dict:
+        """Snapshot of histogram."""
+
+        return {
+            "type": "histogram",
+            "description": self.description,
+            "buckets": {
+                str(bucket): count
+                for bucket, count in zip(self.buckets, self.bucket_counts)
+            },
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+METRICS: dict[str, Counter | Gauge | Histogram] = {}
+
+
+def get_counter(name: str, description: str) -> Counter:
+    """Get or create counter metric."""
+
+    return METRICS.setdefault(name, Counter(name, description))
+
+
+def get_gauge(name: str, description: str) -> Gauge:
+    """Get or create gauge metric."""
+
+    return METRICS.setdefault(name, Gauge(name, description))
+
+
+def get_histogram(name: str, description: str, buckets: tuple[float, ...]) -> Histogram:
+    """Get or create histogram metric."""
+
+    return METRICS.setdefault(name, Histogram(name, description, buckets))
+
+
+def get_metrics_snapshot() -> dict[str, dict]:
+    """Get snapshot of all metrics."""
+
+    return {name: metric.snapshot() for name, metric in sorted(METRICS.items())}
@@ -0,0 +1,252 @@
+""" Module for outbound dispatcher. """
+
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass, field
+
+import httpx
+from structlog import get_logger
+
+from backend.api import config
+from backend.api.exceptions import OutboundMessageError
+from backend.api.metrics import get_counter, get_gauge, get_histogram
+
+SEND_SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Class for token bucket refilled at a steady rate up to its burst size."""
+
+    def __init__(self, rate_per_second: float, burst_size: int):
+        self.rate_per_second = rate_per_second
+        self.burst_size = burst_size
+        self.tokens = float(burst_size)
+        self._updated_at = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token, returning the seconds to wait until it is earned."""
+
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst_size,
+            self.tokens + (now - self._updated_at) * self.rate_per_second,
+        )
+        self._updated_at = now
+        # tokens go negative while reserved, so waiters are served in order
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate_per_second
+
+
+@dataclass
+class OutboundMessage:
+    """Class for message waiting to be sent."""
+
+    key: str
+    url: str
+    payload: dict
+    future: asyncio.Future
+    submitted_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+class OutboundDispatcher:
+    """Class for sending messages rate limited per key, retrying rejected sends."""
+
+    def __init__(
+        self,
+        send: callable,
+        rate_per_second: float,
+        burst_size: int,
+        max_attempts: int,
+        retry_backoff_seconds: float,
+        max_retry_queue_size: int,
+    ):
+        self.send = send
+        self.rate_per_second = rate_per_second
+        self.burst_size = burst_size
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.max_retry_queue_size = max_retry_queue_size
+        self._buckets: dict[str, TokenBucket] = {}
+        self._retry_queue: asyncio.PriorityQueue = None
+        self._retry_added: asyncio.Event = None
+        self._retry_task: asyncio.Task = None
+        self._send_tasks: set[asyncio.Task] = set()
+        # breaks ties between retries due at the same time
+        self._sequence = itertools.count()
+        self._sent_counter = get_counter(
+            "outbound_dispatcher_sent_total", "Outbound messages sent successfully"
+        )
+        self._throttled_counter = get_counter(
+            "outbound_dispatcher_throttled_total",
+            "Outbound messages held back by the rate limit of their sender",
+        )
+        self._retries_counter = get_counter(
+            "outbound_dispatcher_retries_total",
+            "Outbound messages queued to be retried after a rejected send",
+        )
+        self._failed_counter = get_counter(
+            "outbound_dispatcher_failed_total",
+            "Outbound messages given up on",
+        )
+        self._retry_queue_gauge = get_gauge(
+            "outbound_dispatcher_retry_queue_depth",
+            "Outbound messages waiting to be retried",
+        )
+        self._throttle_histogram = get_histogram(
+            "outbound_dispatcher_throttle_seconds",
+            "Time outbound messages waited for the rate limit of their sender",
+            SEND_SECONDS_BUCKETS,
+        )
+        self._send_histogram = get_histogram(
+            "outbound_dispatcher_send_seconds",
+            "Time from submitting an outbound message to it being sent",
+            SEND_SECONDS_BUCKETS,
+        )
+
+    def submit(self, key: str, url: str, payload: dict) -> asyncio.Future:
+        """Submit message for sending, the future resolves to the final response."""
+
+        if self._retry_task is None:
+            self._retry_queue = asyncio.PriorityQueue()
+            self._retry_added = asyncio.Event()
+            self._retry_task = asyncio.create_task(self._run_retries())
+        outbound_message = OutboundMessage(
+            key=key,
+            url=url,
+            payload=payload,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self._start_send(outbound_message)
+        return outbound_message.future
+
+    async def dispatch(self, key: str, url: str, payload: dict) -> httpx.Response:
+        """Send message, waiting for its final response."""
+
+        return await self.submit(key, url, payload)
+
+    async def close(self) -> None:
+        """Stop sending, messages still waiting fail."""
+
+        tasks = list(self._send_tasks)
+        if self._retry_task:
+            tasks.append(self._retry_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        while self._retry_queue and not self._retry_queue.empty():
+            _, _, outbound_message = self._retry_queue.get_nowait()
+            outbound_message.future.cancel()
+        self._retry_task = None
+        self._retry_queue_gauge.set(0)
+
+    def _start_send(self, outbound_message: OutboundMessage) -> None:
+        task = asyncio.create_task(self._send(outbound_message))
+        self._send_tasks.add(task)
+        task.add_done_callback(self._send_tasks.discard)
+
+    async def _send(self, outbound_message: OutboundMessage) -> None:
+        try:
+            bucket = self._buckets.get(outbound_message.key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate_per_second, self.burst_size)
+                self._buckets[outbound_message.key] = bucket
+            wait_seconds = bucket.reserve()
+            if wait_seconds > 0:
+                self._throttled_counter.inc()
+                self._throttle_histogram.observe(wait_seconds)
+                await asyncio.sleep(wait_seconds)
+
+            outbound_message.attempts += 1
+            try:
+                response = await self.send(
+                    outbound_message.url, outbound_message.payload
+                )
+            except httpx.TransportError as error:
+                self._retry_or_fail(outbound_message, error, None)
+                return
+            if not response.is_success:
+                error = OutboundMessageError(
+                    f"Messaging provider responded {response.status_code}",
+                    response.status_code,
+                )
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    self._retry_or_fail(outbound_message, error, response)
+                else:
+                    self._fail(outbound_message, error)
+                return
+        except asyncio.CancelledError:
+            outbound_message.future.cancel()
+            raise
+        except Exception as error:
+            self._fail(outbound_message, error)
+            return
+
+        self._sent_counter.inc()
+        self._send_histogram.observe(time.monotonic() - outbound_message.submitted_at)
+        if not outbound_message.future.done():
+            outbound_message.future.set_result(response)
+
+    def _retry_or_fail(
+        self,
+        outbound_message: OutboundMessage,
+        error: Exception,
+        response: httpx.Response | None,
+    ) -> None:
+        if (
+            outbound_message.attempts >= self.max_attempts
+            or self._retry_queue.qsize() >= self.max_retry_queue_size
+        ):
+            self._fail(outbound_message, error)
+            return
+
+        # exponential backoff, longer if the graph api asked to wait
+        delay_seconds = self.retry_backoff_seconds * 2 ** (
+            outbound_message.attempts - 1
+        )
+        if response is not None:
+            try:
+                delay_seconds = max(
+                    delay_seconds, float(response.headers.get("Retry-After", 0))
+                )
+            except ValueError:
+                pass
+        self._retries_counter.inc()
+        self._retry_queue.put_nowait(
+            (time.monotonic() + delay_seconds, next(self._sequence), outbound_message)
+        )
+        self._retry_queue_gauge.set(self._retry_queue.qsize())
+        self._retry_added.set()
+
+    def _fail(self, outbound_message: OutboundMessage, error: Exception) -> None:
+        self._failed_counter.inc()
+        get_logger().error(
+            error,
+            stack_info=config.CONFIG.debug_mode,
+            exc_info=config.CONFIG.debug_mode,
+        )
+        if not outbound_message.future.done():
+            outbound_message.future.set_exception(error)
+
+    async def _run_retries(self) -> None:
+        while True:
+            item = await self._retry_queue.get()
+            wait_seconds = item[0] - time.monotonic()
+            if wait_seconds > 0:
+                # woken early by a new retry, as it may be due sooner, and unlike
+                # wait_for a timeout scope never swallows a cancellation that
+                # races with a retry being added
+                self._retry_added.clear()
+                try:
+                    async with asyncio.timeout(wait_seconds):
+                        await self._retry_added.wait()
+                except TimeoutError:
+                    pass
+                self._retry_queue.put_nowait(item)
+                continue
+            self._retry_queue_gauge.set(self._retry_queue.qsize())
+            self._start_send(item[2])
@@ -0,0 +1,70 @@
+""" Module for prompt templates. """
+
+from pydantic.dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """Class for prompt template with a fixed system prompt prefix."""
+
+    template_id: str
+    system_prompt: str | None
+    user_role: str = "user"
+
+    @property
+    def prefix_messages(self) -> list[dict]:
+        """Fixed messages every conversation using the template starts with."""
+
+        if not self.system_prompt:
+            return []
+        return [{"role": "system", "content": self.system_prompt}]
+
+    @property
+    def continues_instant_message(self) -> bool:
+        """Check if the model continues the instant message instead of replying to it."""
+
+        return self.user_role == "assistant"
+
+    @property
+    def chat_template_kwargs(self) -> dict:
+        """Chat template arguments, the same on every generation path."""
+
+        return {
+            "add_generation_prompt": not self.continues_instant_message,
+            "continue_final_message": self.continues_instant_message,
+        }
+
+    def build_conversation(
+        self, instant_message: str, history: list[dict] | None = None
+    ) -> list[dict]:
+        """Build conversation from the fixed prefix, history and instant message."""
+
+        return (
+            self.prefix_messages
+            + (history or [])
+            + [{"role": self.user_role, "content": instant_message}]
+        )
+
+
+PROMPT_TEMPLATES: dict[str, PromptTemplate] = {
+    template.template_id: template
+    for template in (
+        PromptTemplate(
+            template_id="default",
+            system_prompt=None,
+            user_role="assistant",
+        ),
+        PromptTemplate(
+            template_id="compassionate_assistant",
+            system_prompt="You are a compassionate person who is trying very hard to help!",
+        ),
+    )
+}
+
+
+def get_prompt_template(template_id: str) -> PromptTemplate:
+    """Get prompt template by id."""
+
+    if template_id not in PROMPT_TEMPLATES:
+        raise ValueError(f"Unknown prompt template - {template_id}")
+    return PROMPT_TEMPLATES[template_id]
@@ -5,6 +5,7 @@ from pydantic.dataclasses import dataclass
 from structlog import get_logger
 
 from backend.api import config
+from backend.api.admission_controller import AdmissionController
 from backend.api.data_repositories.mongo_db import MongoDB
 from backend.api.data_repositories.sqlite import SQLite
 from backend.api.data_repository import DataRepository
@@ -14,13 +15,25 @@ from backend.api.enum import (
     MessagingProviderType,
 )
 from backend.api.inference_provider_wrapper import InferenceProviderWrapper
+from backend.api.inference_provider_wrappers.in_process_cpu_quantized_inference import (
+    InProcessCPUQuantizedInference,
+)
 from backend.api.inference_provider_wrappers.in_process_inference import (
     InProcessInference,
 )
+from backend.api.inference_provider_wrappers.openai_compatible_inference import (
+    OpenAICompatibleInference,
+)
+from backend.api.keyed_dispatcher import KeyedDispatcher
+from backend.api.message_deduplicator import MessageDeduplicator
 from backend.api.messaging_provider_wrapper import MessagingProviderWrapper
 from backend.api.messaging_provider_wrappers.whatsapp_business_wrapper import (
     WhatsappForBusinessWrapper,
 )
+from backend.api.request_coalescer import RequestCoalescer
+from backend.api.response_cache import ResponseCache
+from backend.api.semantic_cache import SemanticCache
+from backend.api.webhook_queue import WebhookQueue
 
 
 @dataclass(config=ConfigDict(arbitrary_types_allowed=True))
@@ -30,13 +43,22 @@ class Providers:
     data_repository: DataRepository
     messaging_provider_wrapper: MessagingProviderWrapper
     inference_provider_wrapper: InferenceProviderWrapper
+    admission_controller: AdmissionController | None
+    request_coalescer: RequestCoalescer | None
+    response_cache: ResponseCache | None
+    semantic_cache: SemanticCache | None
+    webhook_queue: WebhookQueue | None
+    message_deduplicator: MessageDeduplicator | None
+    message_dispatcher: KeyedDispatcher | None
 
 
 PROVIDERS: Providers = None
 
 
-def configure_providers() -> None:
-    """Configure providers."""
+def configure_providers(
+    inference_provider_wrapper: InferenceProviderWrapper | None = None,
+) -> None:
+    """Configure providers, optionally with an already built inference provider."""
 
     logger = get_logger().bind(
         DataRepositoryType=config.CONFIG.data_repository_type,
@@ -44,19 +66,79 @@ def configure_providers() -> None:
     )
     logger.info("Starting configure providers")
     global PROVIDERS
+    data_repository = _get_data_repository(config.CONFIG.data_repository_type)
     PROVIDERS = Providers(
-        data_repository=_get_data_repository(config.CONFIG.data_repository_type),
+        data_repository=data_repository,
         messaging_provider_wrapper=_get_messaging_provider_wrapper(
             config.CONFIG.messaging_provider_type
         ),
-        inference_provider_wrapper=_get_inference_provider_wrapper(
-            config.CONFIG.inference_provider_type
+        inference_provider_wrapper=(
+            inference_provider_wrapper
+            or _get_inference_provider_wrapper(config.CONFIG.inference_provider_type)
+        ),
+        admission_controller=_get_admission_controller(),
+        request_coalescer=(
+            RequestCoalescer() if config.CONFIG.request_coalescing_enabled else None
+        ),
+        response_cache=_get_response_cache(data_repository),
+        semantic_cache=_get_semantic_cache(),
+        webhook_queue=_get_webhook_queue(data_repository),
+        message_deduplicator=_get_message_deduplicator(data_repository),
+        message_dispatcher=(
+            KeyedDispatcher(config.CONFIG.message_ordering_max_queue_size)
+            if config.CONFIG.message_ordering_enabled
+            else None
         ),
     )
 
     logger.info("Completed configure providers")
 
 
+async def start_providers() -> None:
+    """Start providers."""
+
+    logger = get_logger()
+    logger.info("Starting start providers")
+
+    await PROVIDERS.inference_provider_wrapper.start()
+    if PROVIDERS.semantic_cache:
+        await PROVIDERS.semantic_cache.start()
+    if PROVIDERS.message_deduplicator:
+        await PROVIDERS.message_deduplicator.start()
+
+    logger.info("Completed start providers")
+
+
+def providers_ready() -> bool:
+    """Check if providers are ready to serve requests."""
+
+    return PROVIDERS is not None and PROVIDERS.inference_provider_wrapper.is_ready()
+
+
+async def close_providers() -> None:
+    """Close providers."""
+
+    logger = get_logger()
+    logger.info("Starting close providers")
+
+    if PROVIDERS:
+        # stop taking jobs first, they still need the other providers
+        if PROVIDERS.webhook_queue:
+            await PROVIDERS.webhook_queue.close()
+        if PROVIDERS.message_dispatcher:
+            await PROVIDERS.message_dispatcher.close()
+        await PROVIDERS.messaging_provider_wrapper.close()
+        await PROVIDERS.inference_provider_wrapper.close()
+        if PROVIDERS.semantic_cache:
+            await PROVIDERS.semantic_cache.close()
+        if PROVIDERS.message_deduplicator:
+            await PROVIDERS.message_deduplicator.close()
+        # last, as closing the providers above may still write to it
+        await PROVIDERS.data_repository.close()
+
+    logger.info("Completed close providers")
+
+
 def _get_data_repository(enum_type: DataRepositoryType) -> DataRepository:
     match enum_type:
         case DataRepositoryType.SQLITE:
@@ -79,3 +161,78 @@ def _get_inference_provider_wrapper(
     match enum_type:
         case InferenceProviderType.IN_PROCESS:
             return InProcessInference()
+        case InferenceProviderType.IN_PROCESS_CPU_QUANTIZED:
+            return InProcessCPUQuantizedInference()
+        case InferenceProviderType.OPENAI_COMPATIBLE:
+            return OpenAICompatibleInference()
+
+
+def _get_admission_controller() -> AdmissionController | None:
+    if not config.CONFIG.admission_control_enabled:
+        return None
+    return AdmissionController(
+        config.CONFIG.admission_control_max_wait_seconds,
+        config.CONFIG.admission_control_ewma_alpha,
+    )
+
+
+def _get_response_cache(data_repository: DataRepository) -> ResponseCache | None:
+    if not config.CONFIG.response_cache_enabled:
+        return None
+    return ResponseCache(
+        config.CONFIG.response_cache_max_entries,
+        config.CONFIG.response_cache_ttl_seconds,
+        (
+            data_repository
+            if config.CONFIG.response_cache_persistent
+            and config.CONFIG.data_repository_type == DataRepositoryType.SQLITE
+            else None
+        ),
+    )
+
+
+def _get_semantic_cache() -> SemanticCache | None:
+    if not config.CONFIG.semantic_cache_enabled:
+        return None
+    return SemanticCache(
+        config.CONFIG.semantic_cache_model_id,
+        config.CONFIG.semantic_cache_similarity_threshold,
+        config.CONFIG.semantic_cache_max_entries,
+        config.CONFIG.semantic_cache_path,
+    )
+
+
+def _get_webhook_queue(data_repository: DataRepository) -> WebhookQueue | None:
+    # the queue is a table of the local sqlite database
+    if (
+        not config.CONFIG.webhook_queue_enabled
+        or config.CONFIG.data_repository_type != DataRepositoryType.SQLITE
+    ):
+        return None
+    return WebhookQueue(
+        data_repository,
+        config.CONFIG.webhook_queue_workers,
+        config.CONFIG.webhook_queue_visibility_timeout_seconds,
+        config.CONFIG.webhook_queue_max_attempts,
+        config.CONFIG.webhook_queue_retry_backoff_seconds,
+        config.CONFIG.webhook_queue_poll_interval_seconds,
+    )
+
+
+def _get_message_deduplicator(
+    data_repository: DataRepository,
+) -> MessageDeduplicator | None:
+    if not config.CONFIG.message_dedup_enabled:
+        return None
+    # shared across workers through the local sqlite database, otherwise only
+    # redeliveries to this worker are recognized
+    return MessageDeduplicator(
+        (
+            data_repository
+            if config.CONFIG.data_repository_type == DataRepositoryType.SQLITE
+            else None
+        ),
+        config.CONFIG.message_dedup_ttl_seconds,
+        config.CONFIG.message_dedup_max_entries,
+        config.CONFIG.message_dedup_compaction_interval_seconds,
+    )
@@ -0,0 +1,80 @@
+""" Module for reply chunker. """
+
+import re
+from typing import AsyncIterator
+
+PARAGRAPH_END = re.compile(r"\n\s*\n")
+# closing quotes and brackets stay with their sentence, and a following space
+# keeps numbers like 3.5 together
+SENTENCE_END = re.compile(r"[.!?…][\"'”’)\]]*\s+")
+WHITESPACE = re.compile(r"\s+")
+
+
+class ReplyChunker:
+    """Class for splitting a streamed reply into paragraph or sentence sized messages."""
+
+    def __init__(self, min_chars: int, max_chars: int | None):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        """Add streamed text, returning the messages it completes."""
+
+        self._buffer += text
+        messages = []
+        while (cut := self._find_cut()) is not None:
+            messages.extend(self._take(cut))
+        return messages
+
+    def flush(self) -> list[str]:
+        """Return the rest of the reply as messages."""
+
+        messages = []
+        while self.max_chars and len(self._buffer.strip()) > self.max_chars:
+            messages.extend(self._take(self._find_cut()))
+        messages.extend(self._take(len(self._buffer)))
+        return messages
+
+    async def chunk(self, texts: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Chunk streamed texts into messages as soon as each is complete."""
+
+        async for text in texts:
+            for message in self.feed(text):
+                yield message
+        for message in self.flush():
+            yield message
+
+    def _find_cut(self) -> int | None:
+        buffer = self._buffer.lstrip()
+        offset = len(self._buffer) - len(buffer)
+        if self.max_chars and len(buffer) > self.max_chars:
+            # too long for one message, so break at the last boundary that fits,
+            # preferring one that does not leave a tiny message
+            window = buffer[: self.max_chars + 1]
+            for min_chars in (self.min_chars, 1):
+                for pattern in (PARAGRAPH_END, SENTENCE_END, WHITESPACE):
+                    cut = self._last_boundary(pattern, window, min_chars)
+                    if cut is not None:
+                        return offset + cut
+            return offset + self.max_chars
+
+        for pattern in (PARAGRAPH_END, SENTENCE_END):
+            cut = self._last_boundary(pattern, buffer, self.min_chars)
+            if cut is not None:
+                return offset + cut
+        return None
+
+    def _last_boundary(
+        self, pattern: re.Pattern, text: str, min_chars: int
+    ) -> int | None:
+        cut = None
+        for match in pattern.finditer(text):
+            if match.start() >= min_chars:
+                cut = match.end()
+        return cut
+
+    def _take(self, cut: int) -> list[str]:
+        message = self._buffer[:cut].strip()
+        self._buffer = self._buffer[cut:]
+        return [message] if message else []
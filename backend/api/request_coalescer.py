@@ -0,0 +1,95 @@
+""" Module for request coalescer. """
+
+import asyncio
+import json
+from dataclasses import dataclass
+
+from backend.api.enum import InferencePriority
+from backend.api.metrics import get_counter, get_gauge
+from backend.api.response_cache import build_cache_key
+
+
+def build_coalescing_key(
+    prompt_text: str,
+    cache_scope: str,
+    deadline_seconds: float | None,
+    priority: InferencePriority,
+) -> str:
+    """Build coalescing key, as only requests that would get the same reply match."""
+
+    # the deadline can cut a reply short and the priority decides how long it
+    # queues, so both have to match as well
+    return build_cache_key(
+        prompt_text,
+        json.dumps(
+            {
+                "cache_scope": cache_scope,
+                "deadline_seconds": deadline_seconds,
+                "priority": priority,
+            },
+            sort_keys=True,
+        ),
+    )
+
+
+@dataclass
+class InFlightCall:
+    """Class for a call shared by the requests waiting for it."""
+
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class RequestCoalescer:
+    """Class for sharing one in flight call between concurrent identical requests."""
+
+    def __init__(self):
+        self._in_flight: dict[str, InFlightCall] = {}
+        self._calls_counter = get_counter(
+            "request_coalescer_calls_total",
+            "Calls started for requests with no identical request in flight",
+        )
+        self._coalesced_counter = get_counter(
+            "request_coalescer_coalesced_total",
+            "Requests served by an identical request already in flight",
+        )
+        self._abandoned_counter = get_counter(
+            "request_coalescer_abandoned_total",
+            "Calls cancelled as every request waiting for them gave up",
+        )
+        self._in_flight_gauge = get_gauge(
+            "request_coalescer_in_flight", "Distinct calls in flight"
+        )
+
+    async def run(self, key: str, func: callable) -> any:
+        """Await the call in flight for key, or start it by calling the async func."""
+
+        in_flight_call = self._in_flight.get(key)
+        if in_flight_call:
+            self._coalesced_counter.inc()
+        else:
+            in_flight_call = InFlightCall(task=asyncio.ensure_future(func()))
+            in_flight_call.task.add_done_callback(
+                lambda _task: self._forget(key, in_flight_call)
+            )
+            self._in_flight[key] = in_flight_call
+            self._in_flight_gauge.set(len(self._in_flight))
+            self._calls_counter.inc()
+
+        in_flight_call.waiters += 1
+        try:
+            # shielded, so one waiter giving up does not cancel the call for the others
+            return await asyncio.shield(in_flight_call.task)
+        finally:
+            in_flight_call.waiters -= 1
+            if in_flight_call.waiters == 0 and not in_flight_call.task.done():
+                # nobody wants the result any more, so stop generating it
+                self._forget(key, in_flight_call)
+                in_flight_call.task.cancel()
+                self._abandoned_counter.inc()
+
+    def _forget(self, key: str, in_flight_call: InFlightCall) -> None:
+        # a newer call may have taken the key after this one was abandoned
+        if self._in_flight.get(key) is in_flight_call:
+            del self._in_flight[key]
+            self._in_flight_gauge.set(len(self._in_flight))
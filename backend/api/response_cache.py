@@ -0,0 +1,141 @@
+""" Module for response cache. """
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from structlog import get_logger
+
+from backend.api import config
+from backend.api.data_repository import DataRepository
+from backend.api.entities import ResponseCacheEntry
+from backend.api.lib import now_utc
+from backend.api.metrics import get_counter, get_gauge
+
+
+def normalize_prompt(prompt_text: str) -> str:
+    """Normalize prompt text so trivially different prompts share a cache entry."""
+
+    return " ".join(prompt_text.split()).casefold()
+
+
+def build_cache_scope(model_id: str, generation_parameters: dict) -> str:
+    """Build cache scope, as only responses of the same model and parameters match."""
+
+    return json.dumps(
+        {"model_id": model_id, "generation_parameters": generation_parameters},
+        sort_keys=True,
+    )
+
+
+def build_cache_key(prompt_text: str, cache_scope: str) -> str:
+    """Build cache key from normalized prompt and cache scope."""
+
+    key_source = json.dumps(
+        {"prompt": normalize_prompt(prompt_text), "cache_scope": cache_scope},
+        sort_keys=True,
+    )
+    return hashlib.sha256(key_source.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Class for in memory lru response cache with an optional persistent tier."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: int,
+        data_repository: DataRepository = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.data_repository = data_repository
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._hits_counter = get_counter(
+            "response_cache_hits_total", "Response cache hits"
+        )
+        self._persistent_hits_counter = get_counter(
+            "response_cache_persistent_hits_total",
+            "Response cache hits served by the persistent tier",
+        )
+        self._misses_counter = get_counter(
+            "response_cache_misses_total", "Response cache misses"
+        )
+        self._evictions_counter = get_counter(
+            "response_cache_evictions_total",
+            "Response cache entries evicted by the size cap",
+        )
+        self._expirations_counter = get_counter(
+            "response_cache_expirations_total",
+            "Response cache entries dropped after their ttl",
+        )
+        self._size_gauge = get_gauge(
+            "response_cache_size", "Response cache entries held in memory"
+        )
+
+    async def get(self, cache_key: str) -> str | None:
+        """Get cached response."""
+
+        entry = self._entries.get(cache_key)
+        if entry:
+            response_text, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(cache_key)
+                self._hits_counter.inc()
+                return response_text
+            del self._entries[cache_key]
+            self._expirations_counter.inc()
+            self._size_gauge.set(len(self._entries))
+
+        if self.data_repository:
+            try:
+                persistent_entry = await self.data_repository.load_response_cache_entry(
+                    cache_key
+                )
+            except Exception as error:
+                self._log_persistent_error(error)
+                persistent_entry = None
+            if persistent_entry:
+                self._put_in_memory(cache_key, persistent_entry.response_chat_text)
+                self._hits_counter.inc()
+                self._persistent_hits_counter.inc()
+                return persistent_entry.response_chat_text
+
+        self._misses_counter.inc()
+        return None
+
+    async def set(self, cache_key: str, model_id: str, response_text: str) -> None:
+        """Set cached response."""
+
+        self._put_in_memory(cache_key, response_text)
+
+        if self.data_repository:
+            try:
+                await self.data_repository.save_response_cache_entry(
+                    ResponseCacheEntry(
+                        cache_key=cache_key,
+                        model_id=model_id,
+                        response_chat_text=response_text,
+                        expires_at=now_utc() + timedelta(seconds=self.ttl_seconds),
+                    )
+                )
+            except Exception as error:
+                self._log_persistent_error(error)
+
+    def _put_in_memory(self, cache_key: str, response_text: str) -> None:
+        self._entries[cache_key] = (response_text, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions_counter.inc()
+        self._size_gauge.set(len(self._entries))
+
+    def _log_persistent_error(self, error: Exception) -> None:
+        # the persistent tier is best effort, so fall back to the memory tier
+        get_logger().warning(
+            error,
+            stack_info=config.CONFIG.debug_mode,
+            exc_info=config.CONFIG.debug_mode,
+        )
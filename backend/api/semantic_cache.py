@@ -0,0 +1,284 @@
+""" Module for semantic cache. """
+
+import asyncio
+import json
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+import torch
+import transformers
+from structlog import get_logger
+
+from backend.api import config
+from backend.api.metrics import get_counter, get_gauge, get_histogram
+from backend.api.response_cache import normalize_prompt
+
+LOOKUP_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+
+def vector_checksum(vector: np.ndarray) -> int:
+    """Checksum of an embedding, as stored in the vectors file."""
+
+    return zlib.crc32(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+
+
+class SemanticCache:
+    """Class for caching responses of prompts with similar embeddings."""
+
+    def __init__(
+        self,
+        model_id: str,
+        similarity_threshold: float,
+        max_entries: int,
+        path: str,
+    ):
+        self.model_id = model_id
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.vectors_path = f"{path}.vectors"
+        self.entries_path = f"{path}.jsonl"
+        self.ready = False
+        self._tokenizer: transformers.PreTrainedTokenizerBase = None
+        self._model: transformers.PreTrainedModel = None
+        self._vectors: np.memmap = None
+        self._scope_ids = np.full(max_entries, -1, dtype=np.int32)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._responses: list[str | None] = [None] * max_entries
+        self._scopes: dict[str, int] = {}
+        self._size = 0
+        self._entries_file = None
+        self._entries_lines = 0
+        self._load_task: asyncio.Task = None
+        self._embed_lock = threading.Lock()
+        # file writes run off the event loop, one at a time
+        self._write_lock = asyncio.Lock()
+        self._hits_counter = get_counter(
+            "semantic_cache_hits_total", "Semantic cache hits"
+        )
+        self._misses_counter = get_counter(
+            "semantic_cache_misses_total", "Semantic cache misses"
+        )
+        self._evictions_counter = get_counter(
+            "semantic_cache_evictions_total",
+            "Semantic cache entries evicted as the index was full",
+        )
+        self._hit_ratio_gauge = get_gauge(
+            "semantic_cache_hit_ratio", "Semantic cache hits out of all lookups"
+        )
+        self._size_gauge = get_gauge(
+            "semantic_cache_size", "Semantic cache entries in the index"
+        )
+        self._lookup_histogram = get_histogram(
+            "semantic_cache_lookup_seconds",
+            "Semantic cache lookup latency including the prompt embedding",
+            LOOKUP_SECONDS_BUCKETS,
+        )
+
+    async def start(self) -> None:
+        """Start loading the embedding model and index in the background."""
+
+        self._load_task = asyncio.create_task(self._load())
+
+    async def embed(self, prompt_text: str) -> np.ndarray | None:
+        """Embed prompt, or none while the embedding model is loading."""
+
+        if not self.ready:
+            return None
+        return await asyncio.to_thread(self._embed, prompt_text)
+
+    def get(self, embedding: np.ndarray, scope: str) -> str | None:
+        """Get response of the most similar cached prompt within the same scope."""
+
+        started_at = time.perf_counter()
+        scope_id = self._scopes.get(scope)
+        response_text = None
+        if scope_id is not None and self._size > 0:
+            similarities = self._vectors[: self._size] @ embedding
+            similarities[self._scope_ids[: self._size] != scope_id] = -np.inf
+            slot = int(np.argmax(similarities))
+            if similarities[slot] >= self.similarity_threshold:
+                self._last_used[slot] = time.time()
+                response_text = self._responses[slot]
+        self._lookup_histogram.observe(time.perf_counter() - started_at)
+
+        if response_text is None:
+            self._misses_counter.inc()
+        else:
+            self._hits_counter.inc()
+        self._hit_ratio_gauge.set(
+            self._hits_counter.value
+            / (self._hits_counter.value + self._misses_counter.value)
+        )
+        return response_text
+
+    async def set(self, embedding: np.ndarray, scope: str, response_text: str) -> None:
+        """Append response to the index, evicting the least recently used if full."""
+
+        async with self._write_lock:
+            if self._size < self.max_entries:
+                slot = self._size
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._evictions_counter.inc()
+                # hidden from lookups while its vector is overwritten
+                self._scope_ids[slot] = -1
+
+            entry = {
+                "slot": slot,
+                "scope": scope,
+                "response_text": response_text,
+                "last_used": time.time(),
+                "checksum": vector_checksum(embedding),
+            }
+            await asyncio.to_thread(self._write_entry, entry, embedding)
+            self._set_slot(entry)
+            self._size = max(self._size, slot + 1)
+            self._entries_lines += 1
+            self._size_gauge.set(self._size)
+
+            if self._entries_lines > 2 * self.max_entries:
+                await asyncio.to_thread(self._compact_entries)
+
+    async def close(self) -> None:
+        """Flush the index to disk."""
+
+        if self._load_task:
+            self._load_task.cancel()
+        async with self._write_lock:
+            await asyncio.to_thread(self._flush_and_close)
+
+    async def _load(self) -> None:
+        logger = get_logger().bind(model_id=self.model_id)
+        logger.info("Started load semantic cache")
+
+        try:
+            await asyncio.to_thread(self._load_model_and_index)
+        except Exception as error:
+            logger.error(
+                error,
+                stack_info=config.CONFIG.debug_mode,
+                exc_info=config.CONFIG.debug_mode,
+            )
+            return
+        self.ready = True
+        self._size_gauge.set(self._size)
+
+        logger.info("Completed load semantic cache", size=self._size)
+
+    def _load_model_and_index(self) -> None:
+        self._tokenizer = transformers.AutoTokenizer.from_pretrained(self.model_id)
+        self._model = transformers.AutoModel.from_pretrained(self.model_id).eval()
+        dimensions = self._model.config.hidden_size
+
+        # the vectors file has a fixed capacity, so only reuse it if it fits
+        os.makedirs(os.path.dirname(self.vectors_path) or ".", exist_ok=True)
+        expected_bytes = self.max_entries * dimensions * np.dtype(np.float32).itemsize
+        reuse = (
+            os.path.exists(self.vectors_path)
+            and os.path.getsize(self.vectors_path) == expected_bytes
+            and os.path.exists(self.entries_path)
+        )
+        self._vectors = np.memmap(
+            self.vectors_path,
+            dtype=np.float32,
+            mode="r+" if reuse else "w+",
+            shape=(self.max_entries, dimensions),
+        )
+        if reuse:
+            checksums = {}
+            with open(self.entries_path, encoding="utf-8") as entries_file:
+                for line in entries_file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # a line cut short by a crash while it was appended
+                        continue
+                    if entry["slot"] < self.max_entries:
+                        self._set_slot(entry)
+                        checksums[entry["slot"]] = entry.get("checksum")
+                        self._size = max(self._size, entry["slot"] + 1)
+            # a crash between appending an entry and writing its vector leaves
+            # the vector of the previous entry in the slot, so it is dropped
+            for slot, checksum in checksums.items():
+                if checksum != vector_checksum(self._vectors[slot]):
+                    self._clear_slot(slot)
+            self._compact_entries()
+        else:
+            self._entries_file = open(self.entries_path, "w", encoding="utf-8")
+
+    def _embed(self, prompt_text: str) -> np.ndarray:
+        inputs = self._tokenizer(
+            [normalize_prompt(prompt_text)],
+            padding=True,
+            truncation=True,
+            max_length=256,
+            return_tensors="pt",
+        )
+        with self._embed_lock, torch.inference_mode():
+            output = self._model(**inputs)
+
+        # mean pooling over real tokens, normalized so dot product is cosine
+        mask = inputs["attention_mask"].unsqueeze(-1).float()
+        embedding = (output.last_hidden_state * mask).sum(1) / mask.sum(1).clamp(
+            min=1e-9
+        )
+        embedding = torch.nn.functional.normalize(embedding, dim=1)
+        return embedding[0].numpy().astype(np.float32)
+
+    def _write_entry(self, entry: dict, embedding: np.ndarray) -> None:
+        # the entry goes first, so its checksum tells on load whether the
+        # vector was written too
+        self._entries_file.write(json.dumps(entry) + "\n")
+        self._entries_file.flush()
+        self._vectors[entry["slot"]] = embedding
+
+    def _flush_and_close(self) -> None:
+        if self._vectors is not None:
+            self._vectors.flush()
+        if self._entries_file:
+            self._entries_file.close()
+
+    def _set_slot(self, entry: dict) -> None:
+        slot = entry["slot"]
+        self._scope_ids[slot] = self._scopes.setdefault(
+            entry["scope"], len(self._scopes)
+        )
+        self._responses[slot] = entry["response_text"]
+        self._last_used[slot] = entry["last_used"]
+
+    def _clear_slot(self, slot: int) -> None:
+        # an empty slot is never matched and is the first to be reused
+        self._scope_ids[slot] = -1
+        self._responses[slot] = None
+        self._last_used[slot] = 0
+
+    def _compact_entries(self) -> None:
+        # rewrite the append only entries file with only the live entries
+        scopes = {scope_id: scope for scope, scope_id in self._scopes.items()}
+        compacted_path = f"{self.entries_path}.compacted"
+        entries_lines = 0
+        with open(compacted_path, "w", encoding="utf-8") as compacted_file:
+            for slot in range(self._size):
+                if self._scope_ids[slot] == -1:
+                    continue
+                compacted_file.write(
+                    json.dumps(
+                        {
+                            "slot": slot,
+                            "scope": scopes[int(self._scope_ids[slot])],
+                            "response_text": self._responses[slot],
+                            "last_used": float(self._last_used[slot]),
+                            "checksum": vector_checksum(self._vectors[slot]),
+                        }
+                    )
+                    + "\n"
+                )
+                entries_lines += 1
+        if self._entries_file:
+            self._entries_file.close()
+        os.replace(compacted_path, self.entries_path)
+        self._entries_file = open(self.entries_path, "a", encoding="utf-8")
+        self._entries_lines = entries_lines
@@ -0,0 +1,140 @@
+""" Module for session kv cache. """
+
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+import torch
+import transformers
+from structlog import get_logger
+
+from backend.api.metrics import get_counter, get_gauge
+
+
+@dataclass
+class SessionState:
+    """Class for conversation history and attention state of a caller session."""
+
+    messages: list[dict] = field(default_factory=list)
+    token_ids: torch.Tensor | None = None
+    past_key_values: transformers.Cache | None = None
+    last_used: float = field(default_factory=time.monotonic)
+
+    @property
+    def size_bytes(self) -> int:
+        """Memory held by the attention state."""
+
+        if self.past_key_values is None:
+            return 0
+        return sum(
+            tensor.numel() * tensor.element_size()
+            for tensor in self.past_key_values.key_cache
+            + self.past_key_values.value_cache
+        )
+
+
+class SessionKVCache:
+    """Class for lru store of session states bounded by memory and idle time."""
+
+    def __init__(self, max_bytes: int, idle_seconds: int):
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._sessions: OrderedDict[str, SessionState] = OrderedDict()
+        self._total_bytes = 0
+        # lock and number of turns holding or waiting for it, per session
+        self._turn_locks: dict[str, list] = {}
+        self._bytes_gauge = get_gauge(
+            "session_kv_cache_bytes", "Memory held by cached session attention state"
+        )
+        self._sessions_gauge = get_gauge(
+            "session_kv_cache_sessions", "Caller sessions held in the kv cache"
+        )
+        self._idle_evictions_counter = get_counter(
+            "session_kv_cache_idle_evictions_total",
+            "Sessions evicted after being idle",
+        )
+        self._memory_evictions_counter = get_counter(
+            "session_kv_cache_memory_evictions_total",
+            "Sessions evicted under memory pressure",
+        )
+        self._reused_tokens_counter = get_counter(
+            "session_kv_cache_reused_tokens_total",
+            "Prompt tokens served from cached session attention state",
+        )
+        self._prefill_tokens_counter = get_counter(
+            "session_kv_cache_prefill_tokens_total",
+            "Prompt tokens of session turns, reused or prefilled",
+        )
+
+    @asynccontextmanager
+    async def turn(self, session_key: str) -> AsyncIterator[None]:
+        """Hold session for a turn, so concurrent turns run one after the other."""
+
+        turn_lock = self._turn_locks.get(session_key)
+        if turn_lock is None:
+            turn_lock = self._turn_locks[session_key] = [asyncio.Lock(), 0]
+        turn_lock[1] += 1
+        try:
+            async with turn_lock[0]:
+                yield
+        finally:
+            turn_lock[1] -= 1
+            if turn_lock[1] == 0:
+                del self._turn_locks[session_key]
+
+    def checkout(self, session_key: str) -> SessionState:
+        """Take session state out of the store while a turn is generated."""
+
+        self.evict_idle()
+        session_state = self._sessions.pop(session_key, None)
+        if session_state is None:
+            return SessionState()
+        self._total_bytes -= session_state.size_bytes
+        self._update_gauges()
+        return session_state
+
+    def checkin(self, session_key: str, session_state: SessionState) -> None:
+        """Put session state back into the store after a turn is generated."""
+
+        session_state.last_used = time.monotonic()
+        if session_state.size_bytes > self.max_bytes:
+            # too big to ever fit, so only keep the history
+            session_state.token_ids = None
+            session_state.past_key_values = None
+        self._sessions[session_key] = session_state
+        self._total_bytes += session_state.size_bytes
+
+        while self._total_bytes > self.max_bytes:
+            evicted_key, evicted_state = self._sessions.popitem(last=False)
+            self._total_bytes -= evicted_state.size_bytes
+            self._memory_evictions_counter.inc()
+            get_logger().bind(session_key=evicted_key).debug(
+                "Evicted session under memory pressure"
+            )
+        self._update_gauges()
+
+    def record_prefill(self, reused_tokens: int, prompt_tokens: int) -> None:
+        """Record how many prompt tokens of a turn were reused."""
+
+        self._reused_tokens_counter.inc(reused_tokens)
+        self._prefill_tokens_counter.inc(prompt_tokens)
+
+    def evict_idle(self) -> None:
+        """Evict sessions idle for longer than the idle timeout."""
+
+        idle_before = time.monotonic() - self.idle_seconds
+        while self._sessions:
+            session_key, session_state = next(iter(self._sessions.items()))
+            if session_state.last_used > idle_before:
+                break
+            del self._sessions[session_key]
+            self._total_bytes -= session_state.size_bytes
+            self._idle_evictions_counter.inc()
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        self._bytes_gauge.set(self._total_bytes)
+        self._sessions_gauge.set(len(self._sessions))
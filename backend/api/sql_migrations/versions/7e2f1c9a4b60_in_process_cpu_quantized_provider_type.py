@@ -0,0 +1,46 @@
+"""in process cpu quantized provider type
+
+Revision ID: 7e2f1c9a4b60
+Revises: 5c0d3a8e71f4
+Create Date: 2026-10-18 09:12:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7e2f1c9a4b60"
+down_revision: Union[str, None] = "5c0d3a8e71f4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.alter_column(
+            "inference_provider_type",
+            existing_type=sa.Enum("IN_PROCESS", name="inferenceprovidertype"),
+            type_=sa.Enum(
+                "IN_PROCESS",
+                "IN_PROCESS_CPU_QUANTIZED",
+                name="inferenceprovidertype",
+            ),
+            existing_nullable=False,
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.alter_column(
+            "inference_provider_type",
+            existing_type=sa.Enum(
+                "IN_PROCESS",
+                "IN_PROCESS_CPU_QUANTIZED",
+                name="inferenceprovidertype",
+            ),
+            type_=sa.Enum("IN_PROCESS", name="inferenceprovidertype"),
+            existing_nullable=False,
+        )
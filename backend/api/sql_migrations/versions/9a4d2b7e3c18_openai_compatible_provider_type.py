@@ -0,0 +1,56 @@
+"""openai compatible provider type
+
+Revision ID: 9a4d2b7e3c18
+Revises: 7e2f1c9a4b60
+Create Date: 2026-10-18 11:40:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9a4d2b7e3c18"
+down_revision: Union[str, None] = "7e2f1c9a4b60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.alter_column(
+            "inference_provider_type",
+            existing_type=sa.Enum(
+                "IN_PROCESS",
+                "IN_PROCESS_CPU_QUANTIZED",
+                name="inferenceprovidertype",
+            ),
+            type_=sa.Enum(
+                "IN_PROCESS",
+                "IN_PROCESS_CPU_QUANTIZED",
+                "OPENAI_COMPATIBLE",
+                name="inferenceprovidertype",
+            ),
+            existing_nullable=False,
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("chat") as batch_op:
+        batch_op.alter_column(
+            "inference_provider_type",
+            existing_type=sa.Enum(
+                "IN_PROCESS",
+                "IN_PROCESS_CPU_QUANTIZED",
+                "OPENAI_COMPATIBLE",
+                name="inferenceprovidertype",
+            ),
+            type_=sa.Enum(
+                "IN_PROCESS",
+                "IN_PROCESS_CPU_QUANTIZED",
+                name="inferenceprovidertype",
+            ),
+            existing_nullable=False,
+        )
@@ -0,0 +1,240 @@
+""" Module for webhook queue. """
+
+import asyncio
+import json
+from datetime import UTC, timedelta
+from uuid import uuid4
+
+from structlog import get_logger
+
+from backend.api import config
+from backend.api.data_repository import DataRepository
+from backend.api.entities import WebhookJob
+from backend.api.enum import WebhookJobStatus
+from backend.api.exceptions import InferenceRejectedError, InferenceUnavailableError
+from backend.api.lib import now_utc
+from backend.api.metrics import get_counter, get_histogram
+
+JOB_SECONDS_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def is_persisted(webhook_job: WebhookJob) -> bool:
+    """Check if webhook job was persisted, which generates its id."""
+
+    return webhook_job.webhook_job_id is not None
+
+
+class WebhookQueue:
+    """Class for durable queue of webhook payloads drained by background workers."""
+
+    def __init__(
+        self,
+        data_repository: DataRepository,
+        num_workers: int,
+        visibility_timeout_seconds: float,
+        max_attempts: int,
+        retry_backoff_seconds: float,
+        poll_interval_seconds: float,
+    ):
+        self.data_repository = data_repository
+        self.num_workers = num_workers
+        self.visibility_timeout_seconds = visibility_timeout_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        # claims are held per instance, so instances sharing the data repository
+        # only ever complete or release the jobs they claimed
+        self.instance_id = uuid4().hex
+        self._job_added: asyncio.Event = None
+        self._worker_tasks: list[asyncio.Task] = []
+        self._enqueued_counter = get_counter(
+            "webhook_queue_enqueued_total", "Webhook payloads persisted to the queue"
+        )
+        self._completed_counter = get_counter(
+            "webhook_queue_completed_total", "Webhook jobs processed successfully"
+        )
+        self._retries_counter = get_counter(
+            "webhook_queue_retries_total", "Webhook jobs released to be retried"
+        )
+        self._failed_counter = get_counter(
+            "webhook_queue_failed_total",
+            "Webhook jobs given up on after all attempts",
+        )
+        self._released_counter = get_counter(
+            "webhook_queue_released_total",
+            "Webhook jobs released unfinished when the queue stopped",
+        )
+        self._claims_lost_counter = get_counter(
+            "webhook_queue_claims_lost_total",
+            "Webhook jobs whose claim expired before they completed",
+        )
+        self._job_histogram = get_histogram(
+            "webhook_queue_job_seconds",
+            "Time from persisting a webhook payload to completing its job",
+            JOB_SECONDS_BUCKETS,
+        )
+
+    def create_job(self, body: dict) -> WebhookJob:
+        """Create job for the body, to be persisted by enqueue or a message claim."""
+
+        return WebhookJob(body=json.dumps(body), visible_at=now_utc())
+
+    async def enqueue(self, webhook_job: WebhookJob) -> None:
+        """Persist job for a worker to process, unless already persisted."""
+
+        if not is_persisted(webhook_job):
+            await self.data_repository.save_webhook_job(webhook_job)
+        self._enqueued_counter.inc()
+        if self._job_added:
+            self._job_added.set()
+
+    async def start(self, handler: callable, is_ready: callable) -> None:
+        """Start workers calling the async handler."""
+
+        logger = get_logger().bind(
+            num_workers=self.num_workers, instance_id=self.instance_id
+        )
+        logger.info("Started start webhook queue")
+
+        # jobs claimed by an instance that crashed reappear once their claim,
+        # no longer extended, expires
+        self._job_added = asyncio.Event()
+        self._worker_tasks = [
+            asyncio.create_task(self._run_worker(handler, is_ready))
+            for _ in range(self.num_workers)
+        ]
+
+        logger.info("Completed start webhook queue")
+
+    async def close(self) -> None:
+        """Stop workers, releasing their unfinished jobs for other instances."""
+
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+        try:
+            released = await self.data_repository.release_claimed_webhook_jobs(
+                self.instance_id
+            )
+            self._released_counter.inc(released)
+        except Exception as error:
+            self._log_error(error)
+
+    async def _run_worker(self, handler: callable, is_ready: callable) -> None:
+        while True:
+            try:
+                # jobs wait in the queue while the model is still loading
+                webhook_job = (
+                    await self.data_repository.claim_webhook_job(
+                        self.visibility_timeout_seconds,
+                        self.instance_id,
+                        self.max_attempts,
+                    )
+                    if is_ready()
+                    else None
+                )
+                if webhook_job is None:
+                    # done while idle, jobs out of attempts are never claimed
+                    await self._fail_exhausted_jobs()
+                    await self._wait_for_job()
+                    continue
+                await self._process(webhook_job, handler)
+            except Exception as error:
+                # a claimed job left behind reappears after its visibility timeout
+                self._log_error(error)
+                await self._wait_for_job()
+
+    async def _wait_for_job(self) -> None:
+        self._job_added.clear()
+        # unlike wait_for, a timeout scope never swallows a cancellation that
+        # races with the event being set
+        try:
+            async with asyncio.timeout(self.poll_interval_seconds):
+                await self._job_added.wait()
+        except TimeoutError:
+            pass
+
+    async def _process(self, webhook_job: WebhookJob, handler: callable) -> None:
+        logger = get_logger().bind(
+            webhook_job_id=webhook_job.webhook_job_id, attempts=webhook_job.attempts
+        )
+        logger.info("Started process webhook job")
+
+        heartbeat_task = asyncio.create_task(self._extend_claim(webhook_job))
+        try:
+            await handler(json.loads(webhook_job.body))
+        except Exception as error:
+            await self._release_for_retry(webhook_job, error)
+            return
+        finally:
+            heartbeat_task.cancel()
+
+        await self.data_repository.delete_webhook_job(webhook_job)
+        self._completed_counter.inc()
+        # sqlite hands datetimes back without a timezone
+        self._job_histogram.observe(
+            (now_utc() - webhook_job.first_created.replace(tzinfo=UTC)).total_seconds()
+        )
+
+        logger.info("Completed process webhook job")
+
+    async def _release_for_retry(
+        self, webhook_job: WebhookJob, error: Exception
+    ) -> None:
+        self._log_error(error)
+        # a rejected request would be rejected again
+        if webhook_job.attempts >= self.max_attempts or isinstance(
+            error, InferenceRejectedError
+        ):
+            self._failed_counter.inc()
+            status, delay_seconds = WebhookJobStatus.FAILED, 0
+        else:
+            self._retries_counter.inc()
+            status = WebhookJobStatus.PENDING
+            # exponential backoff, longer if inference asked callers to wait
+            delay_seconds = self.retry_backoff_seconds * 2 ** (webhook_job.attempts - 1)
+            if isinstance(error, InferenceUnavailableError):
+                delay_seconds = max(delay_seconds, error.retry_after_seconds)
+        await self.data_repository.release_webhook_job(
+            webhook_job,
+            status,
+            now_utc() + timedelta(seconds=delay_seconds),
+            repr(error),
+        )
+
+    async def _fail_exhausted_jobs(self) -> None:
+        failed = await self.data_repository.fail_exhausted_webhook_jobs(
+            self.max_attempts, "Claim expired on the last attempt"
+        )
+        if failed:
+            self._failed_counter.inc(failed)
+            get_logger().warning("Failed exhausted webhook jobs", failed=failed)
+
+    async def _extend_claim(self, webhook_job: WebhookJob) -> None:
+        # keeps a job that runs longer than the visibility timeout from being
+        # picked up again by another worker
+        while True:
+            await asyncio.sleep(self.visibility_timeout_seconds / 3)
+            try:
+                extended = await self.data_repository.extend_webhook_job_claim(
+                    webhook_job, self.visibility_timeout_seconds
+                )
+            except Exception as error:
+                self._log_error(error)
+                continue
+            if not extended:
+                self._claims_lost_counter.inc()
+                get_logger().warning(
+                    "Lost claim on webhook job",
+                    webhook_job_id=webhook_job.webhook_job_id,
+                )
+                return
+
+    def _log_error(self, error: Exception) -> None:
+        get_logger().error(
+            error,
+            stack_info=config.CONFIG.debug_mode,
+            exc_info=config.CONFIG.debug_mode,
+        )
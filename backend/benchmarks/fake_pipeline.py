@@ -0,0 +1,198 @@
+""" Module for fake text generation pipeline with configurable latency. """
+
+import time
+import zlib
+from types import SimpleNamespace
+
+import torch
+import transformers
+
+PAD_TOKEN_ID = 0
+EOS_TOKEN_ID = 1
+NUM_SPECIAL_TOKENS = 2
+VOCAB_SIZE = 32000
+
+
+class FakeTokenizer:
+    """Class for tokenizer turning every word into one token."""
+
+    def __init__(self):
+        self.pad_token_id = PAD_TOKEN_ID
+        self.eos_token_id = EOS_TOKEN_ID
+        self.padding_side = "left"
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> list[int]:
+        """Encode text as one token per word."""
+
+        return [
+            zlib.crc32(word.encode()) % (VOCAB_SIZE - NUM_SPECIAL_TOKENS)
+            + NUM_SPECIAL_TOKENS
+            for word in text.split()
+        ]
+
+    def decode(self, token_ids: list[int] | torch.Tensor, **_kwargs) -> str:
+        """Decode tokens as words, each followed by a space."""
+
+        if isinstance(token_ids, torch.Tensor):
+            token_ids = token_ids.tolist()
+        return "".join(
+            f"w{token_id} " for token_id in token_ids if token_id >= NUM_SPECIAL_TOKENS
+        )
+
+    def batch_decode(self, sequences: torch.Tensor, **kwargs) -> list[str]:
+        """Decode every row of sequences."""
+
+        return [self.decode(sequence, **kwargs) for sequence in sequences]
+
+    def apply_chat_template(
+        self,
+        conversation: list[dict],
+        add_generation_prompt: bool = False,
+        continue_final_message: bool = False,
+        return_tensors: str | None = None,
+    ) -> list[int] | torch.Tensor:
+        """Encode the role and content of every message."""
+
+        token_ids = [
+            token_id
+            for message in conversation
+            for token_id in self.encode(f"{message['role']} {message['content']}")
+        ]
+        if add_generation_prompt:
+            token_ids += self.encode("assistant")
+        if return_tensors == "pt":
+            return torch.tensor([token_ids])
+        return token_ids
+
+
+class FakeModel:
+    """Class for model sleeping a fixed time per decoding step."""
+
+    def __init__(self, seconds_per_token: float, reply_tokens: int):
+        self.seconds_per_token = seconds_per_token
+        self.reply_tokens = reply_tokens
+        self.device = torch.device("cpu")
+        self.dtype = torch.float32
+        self.config = SimpleNamespace(eos_token_id=EOS_TOKEN_ID)
+        self.generation_config = transformers.GenerationConfig(
+            eos_token_id=EOS_TOKEN_ID, pad_token_id=PAD_TOKEN_ID
+        )
+
+    def __call__(self, *_args, **_kwargs) -> None:
+        # prefilling leaves the attention state empty, there is nothing to attend to
+        return None
+
+    def generate(
+        self,
+        input_ids: torch.Tensor,
+        max_new_tokens: int,
+        stopping_criteria: transformers.StoppingCriteriaList | None = None,
+        streamer: transformers.TextStreamer | None = None,
+        return_dict_in_generate: bool = False,
+        **_kwargs,
+    ) -> torch.Tensor | SimpleNamespace:
+        """Generate up to reply tokens per row, one decoding step at a time."""
+
+        if streamer:
+            streamer.put(input_ids.cpu())
+        batch_size = input_ids.shape[0]
+        sequences = input_ids
+        finished = torch.zeros(batch_size, dtype=torch.bool)
+        for step in range(min(max_new_tokens, self.reply_tokens)):
+            # a batched decoding step costs about the same as a single one
+            time.sleep(self.seconds_per_token)
+            next_token_ids = torch.where(
+                finished,
+                torch.full((batch_size,), EOS_TOKEN_ID),
+                torch.full((batch_size,), NUM_SPECIAL_TOKENS + step),
+            )
+            sequences = torch.cat([sequences, next_token_ids[:, None]], dim=-1)
+            if streamer:
+                streamer.put(next_token_ids)
+            if stopping_criteria:
+                finished |= stopping_criteria(sequences, None)
+            if finished.all():
+                break
+        if streamer:
+            streamer.end()
+
+        if return_dict_in_generate:
+            return SimpleNamespace(
+                sequences=sequences, past_key_values=transformers.DynamicCache()
+            )
+        return sequences
+
+
+class FakePipeline:
+    """Class for text generation pipeline backed by a fake model."""
+
+    def __init__(self, seconds_per_token: float, reply_tokens: int):
+        self.tokenizer = FakeTokenizer()
+        self.model = FakeModel(seconds_per_token, reply_tokens)
+
+    def __call__(
+        self,
+        conversations: list[dict] | list[list[dict]],
+        max_new_tokens: int,
+        return_full_text: bool = True,
+        continue_final_message: bool | None = None,
+        **generate_kwargs,
+    ) -> list:
+        """Generate a reply per conversation in the text generation pipeline format."""
+
+        generate_kwargs.pop("batch_size", None)
+        single = isinstance(conversations[0], dict)
+        if single:
+            conversations = [conversations]
+        input_ids = [
+            self.tokenizer.apply_chat_template(
+                conversation,
+                add_generation_prompt=not (
+                    conversation[-1]["role"] == "assistant"
+                    if continue_final_message is None
+                    else continue_final_message
+                ),
+            )
+            for conversation in conversations
+        ]
+        prompt_length = max(len(token_ids) for token_ids in input_ids)
+        sequences = self.model.generate(
+            torch.tensor(
+                [
+                    [PAD_TOKEN_ID] * (prompt_length - len(token_ids)) + token_ids
+                    for token_ids in input_ids
+                ]
+            ),
+            max_new_tokens,
+            **generate_kwargs,
+        )
+
+        outputs = [
+            [
+                {
+                    "generated_text": (
+                        conversation
+                        + [
+                            {
+                                "role": "assistant",
+                                "content": self.tokenizer.decode(
+                                    sequence[prompt_length:]
+                                ),
+                            }
+                        ]
+                        if return_full_text
+                        else self.tokenizer.decode(sequence[prompt_length:])
+                    )
+                }
+            ]
+            for conversation, sequence in zip(conversations, sequences)
+        ]
+        return outputs[0] if single else outputs
+
+
+def load_fake_pipeline(
+    seconds_per_token: float = 0.02, reply_tokens: int = 64
+) -> FakePipeline:
+    """Load fake pipeline, a drop in for the text generation pipeline."""
+
+    return FakePipeline(seconds_per_token, reply_tokens)
@@ -0,0 +1,327 @@
+""" Module for benchmark of in process inference latency under concurrency. """
+
+import argparse
+import asyncio
+import dataclasses
+import functools
+import json
+import logging
+import time
+from uuid import uuid4
+
+import numpy as np
+import structlog
+import torch
+import transformers
+
+from backend.api import config, provider
+from backend.api.entities import Caller, ChatInputModel
+from backend.api.enum import InferenceExecutorType
+from backend.api.exceptions import InferenceRejectedError, InferenceUnavailableError
+from backend.api.inference_provider_wrappers.in_process_inference import (
+    InProcessInference,
+)
+from backend.api.lib import CLIArgs, now_utc, parse_env_vars_with_defaults
+from backend.api.main import get_inference_deadline_seconds, process_chat, stream_chat
+from backend.benchmarks.fake_pipeline import load_fake_pipeline
+from backend.benchmarks.tiny_llama import load_tiny_llama_pipeline
+
+PROMPT_TEXTS = (
+    "Remind me to call the dentist on monday.",
+    "What should I cook tonight with rice and beans?",
+    "Summarise my plans for the weekend in one sentence.",
+    "Suggest a name for a grey cat.",
+)
+PERCENTILES = (50, 95, 99)
+
+
+class BenchmarkInference(InProcessInference):
+    """Class for in process inference with a benchmark pipeline."""
+
+    def __init__(self, backend: str, pipeline_loader: callable):
+        self.model_id = f"benchmark#{backend}"
+        self._pipeline_loader = pipeline_loader
+        super().__init__()
+
+    def get_pipeline_loader(self) -> callable:
+        """Get picklable function loading the pipeline on inference workers."""
+
+        return self._pipeline_loader
+
+
+@dataclasses.dataclass
+class RequestTiming:
+    """Class for timings of one benchmark request."""
+
+    latency_seconds: float
+    time_to_first_token_seconds: float
+    generated_tokens: int
+
+
+def _get_pipeline_loader(args: argparse.Namespace) -> callable:
+    if args.backend == "fake":
+        return functools.partial(
+            load_fake_pipeline, args.seconds_per_token, args.reply_tokens
+        )
+    return functools.partial(
+        load_tiny_llama_pipeline, args.hidden_size, args.num_hidden_layers
+    )
+
+
+def _configure(args: argparse.Namespace) -> None:
+    env_vars = dataclasses.asdict(parse_env_vars_with_defaults())
+    # credentials are not used, and nothing is persisted
+    for name in (
+        "auth0_public_key",
+        "auth0_issuer",
+        "auth0_audience",
+        "whatsapp_for_business_api_token",
+    ):
+        env_vars[name] = env_vars[name] or ""
+    config.CONFIG = config.Config(
+        **env_vars
+        | dataclasses.asdict(CLIArgs(run_db_migrations=False))
+        | {
+            "sqlite_connection_string": "sqlite+aiosqlite:///:memory:",
+            "prompt_template_id": args.prompt_template_id,
+            "inference_deadline_seconds": args.deadline_seconds,
+            "inference_executor_type": args.executor_type,
+            "inference_executor_max_workers": args.max_workers,
+            "inference_batch_max_size": args.batch_max_size,
+            "inference_batch_max_wait_ms": args.batch_max_wait_ms,
+            "inference_batch_max_queue_size": args.max_queue_size,
+            "session_kv_cache_enabled": args.sessions,
+            "inference_draft_model_id": None,
+            "inference_compile_enabled": args.compile,
+            "response_cache_enabled": False,
+            "semantic_cache_enabled": False,
+        }
+    )
+
+
+async def _wait_until_ready(timeout_seconds: float) -> float:
+    started_at = time.monotonic()
+    await provider.start_providers()
+    while not provider.providers_ready():
+        if time.monotonic() - started_at > timeout_seconds:
+            raise TimeoutError(f"Model not loaded within {timeout_seconds} seconds")
+        await asyncio.sleep(0.05)
+    return time.monotonic() - started_at
+
+
+async def _send_request(
+    args: argparse.Namespace, caller: Caller, prompt_text: str
+) -> tuple[str, float | None]:
+    # returns the reply and the seconds until its first chunk, if streamed
+    started_at = time.perf_counter()
+    time_to_first_token = None
+    if args.target == "chat":
+        chat_input = ChatInputModel(
+            caller_session_id=caller.idp_id,
+            caller_chat_text=prompt_text,
+            bypass_cache=True,
+        )
+        if not args.stream:
+            return await process_chat(chat_input, caller), None
+        chunks = stream_chat(chat_input, caller)
+    else:
+        inference_provider_wrapper = provider.PROVIDERS.inference_provider_wrapper
+        deadline_seconds = get_inference_deadline_seconds(caller)
+        if not args.stream:
+            inference_result = await inference_provider_wrapper.request_for_inference(
+                prompt_text,
+                session_key=caller.idp_id if args.sessions else None,
+                deadline_seconds=deadline_seconds,
+                caller_id=str(caller.caller_id),
+            )
+            return inference_result.text, None
+        chunks = inference_provider_wrapper.stream_inference(
+            prompt_text,
+            deadline_seconds=deadline_seconds,
+            caller_id=str(caller.caller_id),
+        )
+
+    texts = []
+    async for text in chunks:
+        if time_to_first_token is None:
+            time_to_first_token = time.perf_counter() - started_at
+        texts.append(text)
+    return "".join(texts), time_to_first_token
+
+
+async def _run_client(
+    args: argparse.Namespace,
+    client: int,
+    tokenizer: any,
+    timings: list[RequestTiming],
+) -> int:
+    caller = Caller(
+        caller_id=uuid4(),
+        name=f"benchmark client {client}",
+        idp_id=f"benchmark-{client}",
+        email=f"benchmark-{client}@example.com",
+    )
+    failed_requests = 0
+    for request in range(args.requests_per_client):
+        prompt_text = PROMPT_TEXTS[(client + request) % len(PROMPT_TEXTS)]
+        started_at = time.perf_counter()
+        try:
+            reply_text, time_to_first_token = await _send_request(
+                args, caller, prompt_text
+            )
+        except (InferenceRejectedError, InferenceUnavailableError):
+            failed_requests += 1
+            continue
+        latency = time.perf_counter() - started_at
+        timings.append(
+            RequestTiming(
+                latency_seconds=latency,
+                # without streaming the first token arrives with the whole reply
+                time_to_first_token_seconds=(
+                    latency if time_to_first_token is None else time_to_first_token
+                ),
+                generated_tokens=len(
+                    tokenizer.encode(reply_text, add_special_tokens=False)
+                ),
+            )
+        )
+    return failed_requests
+
+
+def _summarize(values: list[float]) -> dict:
+    if not values:
+        return {}
+    return {
+        "mean": round(float(np.mean(values)), 4),
+        **{
+            f"p{percentile}": round(float(np.percentile(values, percentile)), 4)
+            for percentile in PERCENTILES
+        },
+    }
+
+
+async def _run_concurrency(
+    args: argparse.Namespace, concurrency: int, tokenizer: any
+) -> dict:
+    timings: list[RequestTiming] = []
+    started_at = time.perf_counter()
+    failed_requests = await asyncio.gather(
+        *[
+            _run_client(args, client, tokenizer, timings)
+            for client in range(concurrency)
+        ]
+    )
+    duration = time.perf_counter() - started_at
+
+    generated_tokens = sum(timing.generated_tokens for timing in timings)
+    return {
+        "concurrency": concurrency,
+        "completed_requests": len(timings),
+        "failed_requests": sum(failed_requests),
+        "duration_seconds": round(duration, 4),
+        "requests_per_second": round(len(timings) / duration, 2),
+        "generated_tokens": generated_tokens,
+        "tokens_per_second": round(generated_tokens / duration, 2),
+        "time_to_first_token_seconds": _summarize(
+            [timing.time_to_first_token_seconds for timing in timings]
+        ),
+        "latency_seconds": _summarize([timing.latency_seconds for timing in timings]),
+        "tokens_per_second_per_request": _summarize(
+            [timing.generated_tokens / timing.latency_seconds for timing in timings]
+        ),
+    }
+
+
+async def _run(args: argparse.Namespace) -> dict:
+    pipeline_loader = _get_pipeline_loader(args)
+    provider.configure_providers(
+        inference_provider_wrapper=BenchmarkInference(args.backend, pipeline_loader)
+    )
+    # replies are counted in tokens of the same tokenizer the workers use
+    tokenizer = pipeline_loader().tokenizer
+    try:
+        load_seconds = await _wait_until_ready(args.load_timeout_seconds)
+        runs = [
+            await _run_concurrency(args, concurrency, tokenizer)
+            for concurrency in args.concurrency
+        ]
+    finally:
+        await provider.close_providers()
+
+    return {
+        "started_at": now_utc().isoformat(),
+        "backend": args.backend,
+        "target": args.target,
+        "stream": args.stream,
+        "settings": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("backend", "target", "stream", "concurrency", "output")
+        },
+        "versions": {
+            "torch": torch.__version__,
+            "transformers": transformers.__version__,
+        },
+        "load_seconds": round(load_seconds, 4),
+        "runs": runs,
+    }
+
+
+def main() -> None:
+    """Run benchmark and print results as json."""
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark in process inference latency under concurrency"
+    )
+    parser.add_argument("--backend", choices=("fake", "tiny_llama"), default="fake")
+    parser.add_argument(
+        "--target",
+        choices=("provider", "chat"),
+        default="provider",
+        help="Call the inference provider directly or go through process chat",
+    )
+    parser.add_argument(
+        "--stream", action="store_true", help="Stream replies to measure first token"
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests-per-client", type=int, default=8)
+    parser.add_argument("--seconds-per-token", type=float, default=0.02)
+    parser.add_argument("--reply-tokens", type=int, default=64)
+    parser.add_argument("--hidden-size", type=int, default=256)
+    parser.add_argument("--num-hidden-layers", type=int, default=4)
+    parser.add_argument("--prompt-template-id", default="default")
+    parser.add_argument("--deadline-seconds", type=float, default=0)
+    parser.add_argument(
+        "--executor-type",
+        type=InferenceExecutorType,
+        choices=list(InferenceExecutorType),
+        default=InferenceExecutorType.THREAD,
+    )
+    parser.add_argument("--max-workers", type=int, default=1)
+    parser.add_argument("--max-queue-size", type=int, default=512)
+    parser.add_argument("--batch-max-size", type=int, default=8)
+    parser.add_argument("--batch-max-wait-ms", type=int, default=10)
+    parser.add_argument("--sessions", action="store_true")
+    parser.add_argument(
+        "--compile", action="store_true", help="Compile the model with a static cache"
+    )
+    parser.add_argument("--load-timeout-seconds", type=float, default=300)
+    parser.add_argument("--output", help="Also write the json results to this file")
+    args = parser.parse_args()
+
+    # request logs would drown the results
+    structlog.configure(
+        wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING)
+    )
+    _configure(args)
+    results = asyncio.run(_run(args))
+
+    output = json.dumps(results, indent=2, default=str)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
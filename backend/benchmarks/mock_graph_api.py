@@ -0,0 +1,144 @@
+""" Module for local stand in of the whatsapp for business graph api. """
+
+import argparse
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator
+from uuid import uuid4
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class GraphApiCall:
+    """Class for call received by the mock graph api."""
+
+    received_at: float
+    phone_number_id: str
+    payload: dict
+    status_code: int
+
+
+class MockGraphApi:
+    """Class for mock graph api recording calls, with injected latency and errors."""
+
+    def __init__(
+        self,
+        latency_seconds: float = 0.05,
+        latency_jitter_seconds: float = 0.02,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after_seconds: int = 1,
+        seed: int = 0,
+    ):
+        self.latency_seconds = latency_seconds
+        self.latency_jitter_seconds = latency_jitter_seconds
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_seconds = retry_after_seconds
+        self.calls: list[GraphApiCall] = []
+        self._random = random.Random(seed)
+        self.app = FastAPI(title="Mock Graph API")
+        self.app.post("/{api_version}/{phone_number_id}/messages")(self.post_messages)
+
+    async def post_messages(
+        self, api_version: str, phone_number_id: str, request: Request
+    ) -> JSONResponse:
+        """Post messages, replying like the graph api or with an injected error."""
+
+        payload = await request.json()
+        await asyncio.sleep(
+            max(
+                self.latency_seconds
+                + self._random.uniform(
+                    -self.latency_jitter_seconds, self.latency_jitter_seconds
+                ),
+                0,
+            )
+        )
+
+        roll = self._random.random()
+        if roll < self.error_rate:
+            response = JSONResponse(
+                {"error": {"message": "Injected error", "code": 1}}, status_code=500
+            )
+        elif roll < self.error_rate + self.rate_limit_rate:
+            response = JSONResponse(
+                {"error": {"message": "Injected rate limit", "code": 130429}},
+                status_code=429,
+                headers={"Retry-After": str(self.retry_after_seconds)},
+            )
+        elif payload.get("status") == "read":
+            response = JSONResponse({"success": True})
+        else:
+            response = JSONResponse(
+                {
+                    "messaging_product": "whatsapp",
+                    "contacts": [
+                        {"input": payload.get("to"), "wa_id": payload.get("to")}
+                    ],
+                    "messages": [{"id": f"wamid.{uuid4().hex}"}],
+                }
+            )
+
+        self.calls.append(
+            GraphApiCall(
+                received_at=time.monotonic(),
+                phone_number_id=phone_number_id,
+                payload=payload,
+                status_code=response.status_code,
+            )
+        )
+        return response
+
+    @asynccontextmanager
+    async def serve(self, port: int) -> AsyncIterator[str]:
+        """Serve on localhost for the duration of the context, yielding its base url."""
+
+        server = uvicorn.Server(
+            uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning")
+        )
+        task = asyncio.create_task(server.serve())
+        while not server.started:
+            if task.done():
+                # raises what stopped the server from starting
+                await task
+            await asyncio.sleep(0.01)
+        try:
+            yield f"http://127.0.0.1:{port}/v20.0"
+        finally:
+            server.should_exit = True
+            await task
+
+
+def main() -> None:
+    """Run mock graph api until interrupted."""
+
+    parser = argparse.ArgumentParser(
+        description="Serve a local stand in of the whatsapp graph api"
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-seconds", type=float, default=0.05)
+    parser.add_argument("--latency-jitter-seconds", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mock_graph_api = MockGraphApi(
+        args.latency_seconds,
+        args.latency_jitter_seconds,
+        args.error_rate,
+        args.rate_limit_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(mock_graph_api.app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
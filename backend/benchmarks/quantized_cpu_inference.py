@@ -0,0 +1,116 @@
+""" Module for benchmark of cpu quantized inference against bfloat16 inference. """
+
+import argparse
+import json
+import multiprocessing
+import resource
+import time
+
+import torch
+
+from backend.api.inference_provider_wrappers.in_process_cpu_quantized_inference import (
+    load_quantized_pipeline,
+)
+from backend.api.inference_provider_wrappers.in_process_inference import load_pipeline
+
+# https://huggingface.co/HuggingFaceTB/SmolLM2-135M-Instruct
+SMALL_MODEL_ID = "HuggingFaceTB/SmolLM2-135M-Instruct"
+PROMPT_TEXT = "Write a short note reminding me to water the plants tomorrow."
+
+
+def _run_variant(
+    variant: str,
+    model_id: str,
+    max_new_tokens: int,
+    runs: int,
+    intra_op_threads: int,
+    inter_op_threads: int,
+) -> dict:
+    started_at = time.perf_counter()
+    if variant == "bfloat16":
+        pipeline = load_pipeline(model_id)
+    else:
+        pipeline = load_quantized_pipeline(model_id, intra_op_threads, inter_op_threads)
+    load_seconds = time.perf_counter() - started_at
+
+    inputs = pipeline.tokenizer.apply_chat_template(
+        [{"role": "user", "content": PROMPT_TEXT}],
+        add_generation_prompt=True,
+        return_tensors="pt",
+        return_dict=True,
+    ).to(pipeline.model.device)
+    generate_kwargs = {
+        "max_new_tokens": max_new_tokens,
+        # every run generates the same number of tokens, so variants compare fairly
+        "min_new_tokens": max_new_tokens,
+        "do_sample": False,
+        "pad_token_id": pipeline.model.config.eos_token_id,
+    }
+
+    with torch.inference_mode():
+        pipeline.model.generate(
+            inputs["input_ids"],
+            attention_mask=inputs["attention_mask"],
+            **generate_kwargs,
+        )
+        generate_seconds = []
+        for _ in range(runs):
+            started_at = time.perf_counter()
+            pipeline.model.generate(
+                inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                **generate_kwargs,
+            )
+            generate_seconds.append(time.perf_counter() - started_at)
+
+    return {
+        "variant": variant,
+        "model_id": model_id,
+        "load_seconds": round(load_seconds, 3),
+        "tokens_per_second": round(max_new_tokens * runs / sum(generate_seconds), 2),
+        "mean_generate_seconds": round(sum(generate_seconds) / runs, 3),
+        # linux reports the peak resident set size in kibibytes
+        "peak_rss_mib": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "num_threads": torch.get_num_threads(),
+    }
+
+
+def _run_variant_in_process(variant: str, args: argparse.Namespace) -> dict:
+    # every variant runs in a fresh process, so peak memory is not shared
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(
+            _run_variant,
+            (
+                variant,
+                args.model_id,
+                args.max_new_tokens,
+                args.runs,
+                args.intra_op_threads,
+                args.inter_op_threads,
+            ),
+        )
+
+
+def main() -> None:
+    """Run benchmark and print results as json."""
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark cpu quantized inference against bfloat16 inference"
+    )
+    parser.add_argument("--model-id", default=SMALL_MODEL_ID)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--intra-op-threads", type=int, default=0)
+    parser.add_argument("--inter-op-threads", type=int, default=0)
+    parser.add_argument("--variants", nargs="+", default=["bfloat16", "dynamic_int8"])
+    args = parser.parse_args()
+
+    results = [_run_variant_in_process(variant, args) for variant in args.variants]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+""" Module for benchmark of assisted generation with a draft model. """
+
+import argparse
+import json
+import time
+
+import torch
+
+from backend.api.inference_provider_wrappers.in_process_inference import (
+    load_draft_model,
+    load_pipeline,
+)
+
+# https://huggingface.co/HuggingFaceTB/SmolLM2-360M-Instruct
+SMALL_MODEL_ID = "HuggingFaceTB/SmolLM2-360M-Instruct"
+# https://huggingface.co/HuggingFaceTB/SmolLM2-135M-Instruct
+SMALL_DRAFT_MODEL_ID = "HuggingFaceTB/SmolLM2-135M-Instruct"
+PROMPT_TEXTS = (
+    "Write a short note reminding me to water the plants tomorrow.",
+    "List three things to pack for a weekend trip to the beach.",
+    "Explain in two sentences why sleep matters.",
+)
+
+
+class ForwardCounter:
+    """Class for counting forward passes of a model."""
+
+    def __init__(self, model: torch.nn.Module):
+        self.count = 0
+        self._handle = model.register_forward_hook(self._on_forward)
+
+    def _on_forward(self, *_args) -> None:
+        self.count += 1
+
+    def remove(self) -> None:
+        """Stop counting."""
+
+        self._handle.remove()
+
+
+def _run_variant(
+    pipeline, generate_kwargs: dict, input_ids_list: list, runs: int
+) -> tuple[dict, list]:
+    model = pipeline.model
+    assistant_model = generate_kwargs.get("assistant_model")
+    model_counter = ForwardCounter(model)
+    draft_counter = ForwardCounter(assistant_model) if assistant_model else None
+
+    generated_tokens, generate_seconds, sequences = 0, 0.0, []
+    with torch.inference_mode():
+        for run in range(runs):
+            for input_ids in input_ids_list:
+                started_at = time.perf_counter()
+                output = model.generate(
+                    input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    **generate_kwargs,
+                )
+                generate_seconds += time.perf_counter() - started_at
+                generated_tokens += output.shape[-1] - input_ids.shape[-1]
+                if run == 0:
+                    sequences.append(output[0].tolist())
+
+    result = {
+        "tokens_per_second": round(generated_tokens / generate_seconds, 2),
+        "generated_tokens": generated_tokens,
+        "model_forward_passes": model_counter.count,
+    }
+    model_counter.remove()
+    if draft_counter:
+        # every model pass verifies the proposed tokens and adds one of its own
+        accepted_tokens = generated_tokens - model_counter.count
+        result["draft_forward_passes"] = draft_counter.count
+        result["acceptance_rate"] = round(
+            accepted_tokens / max(draft_counter.count, 1), 3
+        )
+        draft_counter.remove()
+    return result, sequences
+
+
+def main() -> None:
+    """Run benchmark and print results as json."""
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark assisted generation with a draft model"
+    )
+    parser.add_argument("--model-id", default=SMALL_MODEL_ID)
+    parser.add_argument("--draft-model-id", default=SMALL_DRAFT_MODEL_ID)
+    parser.add_argument("--num-assistant-tokens", type=int, default=5)
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--runs", type=int, default=2)
+    args = parser.parse_args()
+
+    pipeline = load_pipeline(args.model_id)
+    draft_model = load_draft_model(args.draft_model_id, pipeline.model)
+    input_ids_list = [
+        pipeline.tokenizer.apply_chat_template(
+            [{"role": "user", "content": prompt_text}],
+            add_generation_prompt=True,
+            return_tensors="pt",
+        ).to(pipeline.model.device)
+        for prompt_text in PROMPT_TEXTS
+    ]
+    # greedy decoding, so both variants must produce the same tokens
+    generate_kwargs = {
+        "max_new_tokens": args.max_new_tokens,
+        "do_sample": False,
+        "pad_token_id": pipeline.model.config.eos_token_id,
+    }
+
+    # warm up both models before measuring
+    with torch.inference_mode():
+        pipeline.model.generate(
+            input_ids_list[0],
+            attention_mask=torch.ones_like(input_ids_list[0]),
+            assistant_model=draft_model,
+            **(generate_kwargs | {"max_new_tokens": 8}),
+        )
+
+    baseline, baseline_sequences = _run_variant(
+        pipeline, generate_kwargs, input_ids_list, args.runs
+    )
+    assisted, assisted_sequences = _run_variant(
+        pipeline,
+        generate_kwargs
+        | {
+            "assistant_model": draft_model,
+            "num_assistant_tokens": args.num_assistant_tokens,
+            "num_assistant_tokens_schedule": "constant",
+        },
+        input_ids_list,
+        args.runs,
+    )
+
+    results = {
+        "model_id": args.model_id,
+        "draft_model_id": args.draft_model_id,
+        "num_assistant_tokens": args.num_assistant_tokens,
+        "without_draft_model": baseline,
+        "with_draft_model": assisted,
+        "speedup": round(
+            assisted["tokens_per_second"] / baseline["tokens_per_second"], 3
+        ),
+        "outputs_match": baseline_sequences == assisted_sequences,
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+""" Module for stub inference provider for benchmarks without a model. """
+
+import asyncio
+from typing import AsyncIterator
+
+from backend.api.enum import InferencePriority
+from backend.api.inference_provider_wrapper import (
+    InferenceProviderWrapper,
+    InferenceResult,
+)
+
+
+class StubInference(InferenceProviderWrapper):
+    """Class for inference provider generating canned words at a fixed pace."""
+
+    def __init__(self, seconds_per_token: float, reply_tokens: int, max_workers: int):
+        self.model_id = "benchmark#stub"
+        self.prompt_template_id = "default"
+        self.seconds_per_token = seconds_per_token
+        self.reply_tokens = reply_tokens
+        # like a model server, only so many replies are generated at once
+        self._workers = asyncio.Semaphore(max_workers)
+
+    async def request_for_inference(
+        self,
+        instant_message: str,
+        session_key: str | None = None,
+        deadline_seconds: float | None = None,
+        priority: InferencePriority = InferencePriority.INTERACTIVE,
+        caller_id: str | None = None,
+    ) -> InferenceResult:
+        """Request for inference."""
+
+        chunks = [
+            chunk
+            async for chunk in self.stream_inference(
+                instant_message, deadline_seconds, priority, caller_id
+            )
+        ]
+        return InferenceResult(text="".join(chunks))
+
+    async def stream_inference(
+        self,
+        instant_message: str,
+        deadline_seconds: float | None = None,
+        priority: InferencePriority = InferencePriority.INTERACTIVE,
+        caller_id: str | None = None,
+    ) -> AsyncIterator[str]:
+        """Stream inference, a sentence of canned words every ten tokens."""
+
+        async with self._workers:
+            for token in range(self.reply_tokens):
+                await asyncio.sleep(self.seconds_per_token)
+                yield "word. " if token % 10 == 9 else "word "
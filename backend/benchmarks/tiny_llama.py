@@ -0,0 +1,64 @@
+""" Module for tiny randomly initialized llama pipeline for cpu benchmarks. """
+
+import string
+
+import torch
+import transformers
+from tokenizers import Tokenizer, models, pre_tokenizers
+
+SPECIAL_TOKENS = ("<pad>", "<s>", "</s>", "<unk>")
+CHAT_TEMPLATE = (
+    "{% for message in messages %}"
+    "<{{ message['role'] }}>{{ message['content'] }}</s>"
+    "{% endfor %}"
+    "{% if add_generation_prompt %}<assistant>{% endif %}"
+)
+
+
+def _build_tokenizer() -> transformers.PreTrainedTokenizerFast:
+    # one token per character, so no tokenizer has to be downloaded
+    vocab = {token: token_id for token_id, token in enumerate(SPECIAL_TOKENS)}
+    for character in string.printable:
+        vocab.setdefault(character, len(vocab))
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Split("", "isolated")
+    pretrained_tokenizer = transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        bos_token="<s>",
+        eos_token="</s>",
+        unk_token="<unk>",
+        pad_token="<pad>",
+    )
+    pretrained_tokenizer.chat_template = CHAT_TEMPLATE
+    return pretrained_tokenizer
+
+
+def load_tiny_llama_pipeline(
+    hidden_size: int = 256,
+    num_hidden_layers: int = 4,
+    seed: int = 0,
+) -> transformers.Pipeline:
+    """Load float32 text generation pipeline with a tiny random llama on cpu."""
+
+    tokenizer = _build_tokenizer()
+    torch.manual_seed(seed)
+    model = transformers.LlamaForCausalLM(
+        transformers.LlamaConfig(
+            vocab_size=len(tokenizer),
+            hidden_size=hidden_size,
+            intermediate_size=hidden_size * 4,
+            num_hidden_layers=num_hidden_layers,
+            num_attention_heads=max(hidden_size // 64, 1),
+            num_key_value_heads=max(hidden_size // 128, 1),
+            max_position_embeddings=2048,
+            bos_token_id=tokenizer.bos_token_id,
+            eos_token_id=tokenizer.eos_token_id,
+            pad_token_id=tokenizer.pad_token_id,
+        )
+    ).eval()
+    # random weights may end a reply at any token, suppressing end of sequence
+    # keeps replies at the maximum length so runs stay comparable
+    model.generation_config.suppress_tokens = [tokenizer.eos_token_id]
+    return transformers.pipeline(
+        "text-generation", model=model, tokenizer=tokenizer, device="cpu"
+    )
@@ -0,0 +1,378 @@
+""" Module for load test of the webhook against a mock graph api. """
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from uuid import uuid4
+
+import httpx
+import numpy as np
+import structlog
+
+from backend.api import config, conversation_api, provider
+from backend.api.lib import CLIArgs, now_utc, parse_env_vars_with_defaults
+from backend.api.main import shutdown, startup
+from backend.api.metrics import get_metrics_snapshot
+from backend.benchmarks.mock_graph_api import MockGraphApi
+from backend.benchmarks.stub_inference import StubInference
+
+PHONE_NUMBER_ID = "100000000000001"
+WHATSAPP_BUSINESS_ACCOUNT_ID = "200000000000002"
+PROMPT_TEXTS = (
+    "Remind me to call the dentist on monday.",
+    "What should I cook tonight with rice and beans?",
+    "Summarise my plans for the weekend in one sentence.",
+    "Suggest a name for a grey cat.",
+)
+PERCENTILES = (50, 95, 99)
+METRIC_PREFIXES = (
+    "webhook_queue_",
+    "message_dedup_",
+    "outbound_dispatcher_",
+    "keyed_dispatcher_",
+    "admission_control_",
+)
+
+
+class WebhookPayloadFactory:
+    """Class for webhook payloads shaped like the ones meta delivers."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self._random = random.Random(args.seed)
+        self._senders = [f"3161{index:07d}" for index in range(args.senders)]
+        self._delivered: list[dict] = []
+
+    def next_payload(self) -> tuple[dict, list[str]]:
+        """Next payload, with the ids of text messages delivered for the first time."""
+
+        roll = self._random.random()
+        if self._delivered and roll < self.args.redelivery_rate:
+            # meta delivers the same payload again if it saw no timely success
+            return self._random.choice(self._delivered), []
+        if roll < self.args.redelivery_rate + self.args.status_rate:
+            return self._build_payload({"statuses": [self._build_status()]}), []
+
+        messages = [
+            self._build_message()
+            for _ in range(self._random.randint(1, self.args.max_messages_per_payload))
+        ]
+        payload = self._build_payload(
+            {
+                "contacts": [
+                    {
+                        "profile": {"name": f"Sender {message['from']}"},
+                        "wa_id": message["from"],
+                    }
+                    for message in messages
+                ],
+                "messages": messages,
+            }
+        )
+        self._delivered.append(payload)
+        return payload, [
+            message["id"] for message in messages if message["type"] == "text"
+        ]
+
+    def _build_payload(self, value: dict) -> dict:
+        return {
+            "object": "whatsapp_business_account",
+            "entry": [
+                {
+                    "id": WHATSAPP_BUSINESS_ACCOUNT_ID,
+                    "changes": [
+                        {
+                            "value": {
+                                "messaging_product": "whatsapp",
+                                "metadata": {
+                                    "display_phone_number": "15550000000",
+                                    "phone_number_id": PHONE_NUMBER_ID,
+                                },
+                            }
+                            | value,
+                            "field": "messages",
+                        }
+                    ],
+                }
+            ],
+        }
+
+    def _build_message(self) -> dict:
+        message = {
+            "from": self._random.choice(self._senders),
+            "id": f"wamid.{uuid4().hex}",
+            "timestamp": str(int(time.time())),
+        }
+        if self._random.random() < self.args.non_text_rate:
+            return message | {"type": "image", "image": {"id": uuid4().hex}}
+        return message | {
+            "type": "text",
+            "text": {"body": self._random.choice(PROMPT_TEXTS)},
+        }
+
+    def _build_status(self) -> dict:
+        return {
+            "id": f"wamid.{uuid4().hex}",
+            "status": self._random.choice(("sent", "delivered", "read")),
+            "timestamp": str(int(time.time())),
+            "recipient_id": self._random.choice(self._senders),
+        }
+
+
+@dataclasses.dataclass
+class WebhookTiming:
+    """Class for timing of one webhook delivery."""
+
+    status_code: int
+    latency_seconds: float
+
+
+def _configure(args: argparse.Namespace, sqlite_path: str) -> None:
+    env_vars = dataclasses.asdict(parse_env_vars_with_defaults())
+    # credentials are not used, and the graph api is the local mock
+    for name in ("auth0_public_key", "auth0_issuer", "auth0_audience"):
+        env_vars[name] = env_vars[name] or ""
+    config.CONFIG = config.Config(
+        **env_vars
+        | dataclasses.asdict(CLIArgs())
+        | {
+            "sqlite_connection_string": f"sqlite+aiosqlite:///{sqlite_path}",
+            "whatsapp_for_business_api_token": "benchmark",
+            "whatsapp_for_business_api_base_url": f"http://127.0.0.1:{args.port}/v20.0",
+            "webhook_queue_enabled": args.webhook_queue,
+            "webhook_queue_workers": args.webhook_queue_workers,
+            "message_dedup_enabled": args.dedup,
+            "message_ordering_enabled": args.ordering,
+            "messaging_progressive_replies_enabled": args.progressive,
+            "inference_deadline_seconds": 0,
+            "response_cache_enabled": False,
+            "semantic_cache_enabled": False,
+        }
+    )
+
+
+async def _post_webhook(
+    client: httpx.AsyncClient,
+    payload: dict,
+    message_ids: list[str],
+    sent_at: dict[str, float],
+    timings: list[WebhookTiming],
+) -> None:
+    started_at = time.monotonic()
+    for message_id in message_ids:
+        sent_at[message_id] = started_at
+    try:
+        response = await client.post("/webhook", json=payload)
+        status_code = response.status_code
+    except httpx.HTTPError:
+        status_code = 0
+    timings.append(
+        WebhookTiming(
+            status_code=status_code, latency_seconds=time.monotonic() - started_at
+        )
+    )
+    if status_code != 200:
+        # the message is not expected to be answered
+        for message_id in message_ids:
+            del sent_at[message_id]
+
+
+async def _generate_load(
+    args: argparse.Namespace,
+    client: httpx.AsyncClient,
+    sent_at: dict[str, float],
+    timings: list[WebhookTiming],
+) -> float:
+    factory = WebhookPayloadFactory(args)
+    arrivals = random.Random(args.seed + 1)
+    tasks = []
+    started_at = time.monotonic()
+    next_at = started_at
+    # open loop, deliveries arrive at the target rate however slow replies get
+    while next_at - started_at < args.duration_seconds:
+        await asyncio.sleep(max(next_at - time.monotonic(), 0))
+        payload, message_ids = factory.next_payload()
+        tasks.append(
+            asyncio.create_task(
+                _post_webhook(client, payload, message_ids, sent_at, timings)
+            )
+        )
+        next_at += arrivals.expovariate(args.rate)
+    await asyncio.gather(*tasks)
+    return time.monotonic() - started_at
+
+
+def _get_first_replies(mock_graph_api: MockGraphApi) -> dict[str, float]:
+    # the first reply to a message quotes it, later chunks do not
+    first_replies = {}
+    for call in mock_graph_api.calls:
+        message_id = call.payload.get("context", {}).get("message_id")
+        if call.status_code == 200 and message_id and "text" in call.payload:
+            first_replies.setdefault(message_id, call.received_at)
+    return first_replies
+
+
+async def _wait_for_replies(
+    mock_graph_api: MockGraphApi, sent_at: dict[str, float], timeout_seconds: float
+) -> None:
+    started_at = time.monotonic()
+    while time.monotonic() - started_at < timeout_seconds:
+        if set(sent_at) <= set(_get_first_replies(mock_graph_api)):
+            return
+        await asyncio.sleep(0.1)
+
+
+def _summarize(values: list[float]) -> dict:
+    if not values:
+        return {}
+    return {
+        "mean": round(float(np.mean(values)), 4),
+        **{
+            f"p{percentile}": round(float(np.percentile(values, percentile)), 4)
+            for percentile in PERCENTILES
+        },
+    }
+
+
+def _summarize_graph_api_calls(mock_graph_api: MockGraphApi) -> dict:
+    calls = mock_graph_api.calls
+    return {
+        "calls": len(calls),
+        "replies": sum(1 for call in calls if "text" in call.payload),
+        "read_receipts": sum(
+            1 for call in calls if call.payload.get("status") == "read"
+        ),
+        "typing_indicators": sum(
+            1 for call in calls if "typing_indicator" in call.payload
+        ),
+        "status_codes": dict(Counter(call.status_code for call in calls)),
+    }
+
+
+async def _run(args: argparse.Namespace, mock_graph_api: MockGraphApi) -> dict:
+    sent_at: dict[str, float] = {}
+    timings: list[WebhookTiming] = []
+    async with mock_graph_api.serve(args.port):
+        # what the lifespan of the conversation api would do
+        await startup()
+        try:
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=conversation_api.app),
+                base_url="http://conversation-api",
+                timeout=args.webhook_timeout_seconds,
+            ) as client:
+                duration = await _generate_load(args, client, sent_at, timings)
+            await _wait_for_replies(mock_graph_api, sent_at, args.drain_timeout_seconds)
+        finally:
+            await shutdown()
+
+    first_replies = _get_first_replies(mock_graph_api)
+    reply_latencies = [
+        first_replies[message_id] - started_at
+        for message_id, started_at in sent_at.items()
+        if message_id in first_replies
+    ]
+    failed_webhooks = sum(1 for timing in timings if timing.status_code != 200)
+    return {
+        "started_at": now_utc().isoformat(),
+        "settings": {
+            key: value for key, value in vars(args).items() if key != "output"
+        },
+        "duration_seconds": round(duration, 4),
+        "webhook": {
+            "deliveries": len(timings),
+            "deliveries_per_second": round(len(timings) / duration, 2),
+            "status_codes": dict(Counter(timing.status_code for timing in timings)),
+            "error_rate": round(failed_webhooks / max(len(timings), 1), 4),
+            "latency_seconds": _summarize(
+                [timing.latency_seconds for timing in timings]
+            ),
+        },
+        "replies": {
+            "expected": len(sent_at),
+            "received": len(reply_latencies),
+            "missing_rate": round(1 - len(reply_latencies) / max(len(sent_at), 1), 4),
+            "latency_seconds": _summarize(reply_latencies),
+        },
+        "graph_api": _summarize_graph_api_calls(mock_graph_api),
+        "metrics": {
+            name: snapshot
+            for name, snapshot in get_metrics_snapshot().items()
+            if name.startswith(METRIC_PREFIXES)
+        },
+    }
+
+
+def main() -> None:
+    """Run webhook load test and print results as json."""
+
+    parser = argparse.ArgumentParser(
+        description="Load test the webhook against a mock graph api"
+    )
+    parser.add_argument("--rate", type=float, default=20, help="Deliveries per second")
+    parser.add_argument("--duration-seconds", type=float, default=10)
+    parser.add_argument("--senders", type=int, default=200)
+    parser.add_argument("--max-messages-per-payload", type=int, default=3)
+    parser.add_argument("--status-rate", type=float, default=0.3)
+    parser.add_argument("--redelivery-rate", type=float, default=0.05)
+    parser.add_argument("--non-text-rate", type=float, default=0.05)
+    parser.add_argument("--seconds-per-token", type=float, default=0.005)
+    parser.add_argument("--reply-tokens", type=int, default=64)
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--graph-latency-seconds", type=float, default=0.05)
+    parser.add_argument("--graph-latency-jitter-seconds", type=float, default=0.02)
+    parser.add_argument("--graph-error-rate", type=float, default=0.0)
+    parser.add_argument("--graph-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--webhook-queue", type=json.loads, default=True, help="true or false"
+    )
+    parser.add_argument("--webhook-queue-workers", type=int, default=4)
+    parser.add_argument("--dedup", type=json.loads, default=True, help="true or false")
+    parser.add_argument(
+        "--ordering", type=json.loads, default=True, help="true or false"
+    )
+    parser.add_argument("--progressive", action="store_true")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--webhook-timeout-seconds", type=float, default=30)
+    parser.add_argument("--drain-timeout-seconds", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the json results to this file")
+    args = parser.parse_args()
+
+    # request logs would drown the results
+    structlog.configure(
+        wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING)
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        _configure(args, os.path.join(directory, "webhook_load.sqlite3"))
+        # migrations run while configuring, outside of the event loop
+        provider.configure_providers(
+            inference_provider_wrapper=StubInference(
+                args.seconds_per_token, args.reply_tokens, args.max_workers
+            )
+        )
+        mock_graph_api = MockGraphApi(
+            args.graph_latency_seconds,
+            args.graph_latency_jitter_seconds,
+            args.graph_error_rate,
+            args.graph_rate_limit_rate,
+            seed=args.seed,
+        )
+        results = asyncio.run(_run(args, mock_graph_api))
+
+    output = json.dumps(results, indent=2, default=str)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
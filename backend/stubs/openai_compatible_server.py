@@ -0,0 +1,121 @@
+""" Module for stub openai compatible model server. """
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import AsyncIterator
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+
+class StubSettings(BaseModel):
+    """Class for stub model server settings."""
+
+    seconds_per_token: float = 0.01
+    failure_rate: float = 0.0
+
+
+class ChatCompletionRequest(BaseModel):
+    """Class for chat completion request."""
+
+    model: str
+    messages: list[dict]
+    max_tokens: int = 256
+    stream: bool = False
+
+
+SETTINGS = StubSettings()
+
+app = FastAPI(title="Stub OpenAI Compatible Model Server")
+
+
+def _build_reply_tokens(request: ChatCompletionRequest) -> list[str]:
+    # echo the last message word by word, so replies are deterministic
+    words = f"Echo: {request.messages[-1]['content']}".split()
+    return [word if i == 0 else f" {word}" for i, word in enumerate(words)][
+        : request.max_tokens
+    ]
+
+
+@app.get("/v1/models")
+async def get_models() -> dict:
+    """Get models."""
+
+    return {"object": "list", "data": [{"id": "stub", "object": "model"}]}
+
+
+@app.post("/v1/chat/completions")
+async def post_chat_completions(request: ChatCompletionRequest):
+    """Post chat completions."""
+
+    if random.random() < SETTINGS.failure_rate:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Stub failure"
+        )
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    tokens = _build_reply_tokens(request)
+
+    if not request.stream:
+        await asyncio.sleep(SETTINGS.seconds_per_token * len(tokens))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": request.model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": sum(
+                    len(message["content"].split()) for message in request.messages
+                ),
+                "completion_tokens": len(tokens),
+            },
+        }
+
+    async def events() -> AsyncIterator[str]:
+        for token in tokens:
+            await asyncio.sleep(SETTINGS.seconds_per_token)
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": request.model,
+                "choices": [
+                    {"index": 0, "delta": {"content": token}, "finish_reason": None}
+                ],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def init() -> None:
+    """Entry point if called as an executable."""
+
+    parser = argparse.ArgumentParser(description="Stub openai compatible model server")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--seconds-per-token", type=float, default=0.01)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    SETTINGS.seconds_per_token = args.seconds_per_token
+    SETTINGS.failure_rate = args.failure_rate
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    init()